@@ -1,79 +1,140 @@
+import os
+import functools
+import numpy as np
 import pandas as pd
 
-def calculate_manure_n(row):
+# Excretion rates, life cycles and yield conversion factors, one set per version
+COEFFICIENTS_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), '../datasets/ns_coefficients.csv')
+COEFFICIENTS_VERSION = 'ifews-1'
+
+@functools.lru_cache(maxsize=None)
+def _coefficient_table(path):
+    return pd.read_csv(path)
+
+@functools.lru_cache(maxsize=None)
+def load_coefficients(version=COEFFICIENTS_VERSION, path=COEFFICIENTS_PATH):
+    """
+    Load one version of the nitrogen budget coefficients.
+
+    The returned Series is shared between calls; copy it before changing values.
+
+    Parameters:
+    - version (str): Value of the version column of the table.
+    - path (str): Coefficient table with version, parameter, value, unit and description columns.
+
+    Returns:
+    - coefficients (Series): Values indexed by parameter, in table order.
+    """
+    table = _coefficient_table(path)
+    table = table[table['version'] == version]
+    if table.empty:
+        raise ValueError(f'No coefficients for version {version!r} in {path}')
+    return table.set_index('parameter')['value'].astype(float)
+
+def _row_coefficients(coefficients=None):
+    """
+    Coefficients with Python float values for the row-wise functions.
+
+    DataFrame.apply(axis=1) hands them Python floats; np.float64 coefficients would turn the results into
+    np.float64, whose round() breaks ties differently from round() on Python floats.
+    """
+    if coefficients is None:
+        return _default_row_coefficients()
+    return coefficients.astype(object)
+
+@functools.lru_cache(maxsize=None)
+def _default_row_coefficients():
+    return load_coefficients().astype(object)
+
+def manure_terms(coefficients, budget='manure'):
+    """
+    Animal groups of a manure budget with their excretion rate and life cycle, in table order.
+
+    Parameters:
+    - coefficients (Series): Output of load_coefficients.
+    - budget (str): 'manure' (with storage loss) or 'manure_old' (previous IFEWs version).
+
+    Returns:
+    - terms (list): (population column, kg N/animal/day, days/year) tuples.
+    """
+    animals = [name.split('.')[1] for name in coefficients.index if name.startswith(f'{budget}.')]
+    return [(animal, coefficients[f'{budget}.{animal}.excretion'], coefficients[f'{budget}.{animal}.days'])
+            for animal in dict.fromkeys(animals)]
+
+def _old_populations(get):
+    """
+    Populations of the previous IFEWs manure budget; young cattle are split evenly between its two groups.
+    """
+    young = get('cattle') - (get('beef') + get('milk'))
+    return {'hogs': get('hogs'), 'milk': get('milk'), 'beef': get('beef'),
+            'heifer_steers': young * 0.5, 'slaughter_cattle': young * 0.5}
+
+def manure_n(get, coefficients, budget='manure'):
+    """
+    Manure N in kg/ha from a column getter, for a row (scalars) or a table (arrays) alike.
+    """
+    populations = _old_populations(get) if budget == 'manure_old' else None
+    manure_n = 0
+    for animal, excretion, days in manure_terms(coefficients, budget):
+        manure_n = manure_n + (populations[animal] if populations else get(animal)) * excretion * days
+    return manure_n / (0.404686 * (get('soy_pa') + get('corng_pa')))
+
+def fix_n(get, coefficients):
+    """
+    Fixation N in kg/ha from a column getter.
+    """
+    # soybeans_yield / 15 because the FN equation provided by Barry et al. (1993) gives FN in tons/ha. Hence, for soybeans 1bu/ac = 0.06725tons/ha = 1/15
+    return (((get('soy_y') / coefficients['fix.bu_per_ton']) * coefficients['fix.slope'] - coefficients['fix.intercept'])
+            * (get('soy_pa') / (get('soy_pa') + get('corng_pa'))))
+
+def grain_n(get, coefficients):
+    """
+    Grain N in kg/ha from a column getter.
+    """
+    return ((get('soy_y') * coefficients['grain.soy_kg_per_bu'] * coefficients['grain.soy_n_pct'] / 100 * get('soy_ha') * 0.404686) +
+            (get('corng_y') * coefficients['grain.corn_kg_per_bu'] * coefficients['grain.corn_n_pct'] / 100 * get('corng_ha') * 0.404686)) / (0.404686 * (get('soy_ha') + get('corng_ha')))
+
+def calculate_manure_n(row, coefficients=None):
     """
     Calculate Manure Nitrogen (ManureN_kg_ha) for each row considering storage loss.
 
     Parameters:
     - row (Series): A pandas Series containing the data for one row.
+    - coefficients (Series): Coefficients from load_coefficients; the default version when None.
 
     Returns:
     - manure_n (float): Calculated manure nitrogen in kg/ha.
     """
-    hogs_sows = row['hogs_sow']
-    hogs_boars = row['hogs_boars']
-    hogs_fin = row['hogs_fin']
-    milk_cows = row['milk']
-    beef_cows = row['beef']
-    milk_cows_150 = row['dairy_150']
-    milk_cows_440 = row['dairy_400']
-    beef_bulls = row['bulls']
-    calf = row['steers']
-    cattle_fin = row['fin_cattle']
-    soybeans_acres = row['soy_pa']
-    corn_acres = row['corng_pa']
-    
-    # Calculate manure nitrogen based on various animal categories
-    manure_n = (hogs_sows * 0.036 * 365 +
-                hogs_boars * 0.022 * 365 +
-                hogs_fin * 0.028 * 180 +
-                milk_cows * 0.2 * 365 +
-                beef_cows * 0.029 * 365 +
-                milk_cows_150 * 0.031 * 200 +
-                milk_cows_440 * 0.060 * 365 +
-                beef_bulls * 0.029 * 365 +
-                calf * 0.019 * 365 +
-                cattle_fin * 0.089 * 365) / (0.404686 * (soybeans_acres + corn_acres))
-        
-    return round(manure_n, 1)
-
-def calculate_fix_n(row):
+    coefficients = _row_coefficients(coefficients)
+    return round(manure_n(row.__getitem__, coefficients), 1)
+
+def calculate_fix_n(row, coefficients=None):
     """
     Calculate fixation nitrogen (FixN_kg_ha) for each row.
 
     Parameters:
     - row (Series): A pandas Series containing the data for one row.
+    - coefficients (Series): Coefficients from load_coefficients; the default version when None.
 
     Returns:
     - fix_n (float): Calculated fixation nitrogen in kg/ha.
     """
-    soybeans_yield = row['soy_y']
-    soybeans_acres = row['soy_pa']
-    corn_acres = row['corng_pa']
-    
-    fix_n = ((soybeans_yield / 15) * 81.1 - 98.5) * (soybeans_acres / (soybeans_acres + corn_acres)) #soybeans_yield / 15 because the FN equation provided by Barry et al. (1993) gives FN in tons/ha. Hence, for soybeans 1bu/ac = 0.06725tons/ha = 1/15
-    
-    return round(fix_n, 1)
+    coefficients = _row_coefficients(coefficients)
+    return round(fix_n(row.__getitem__, coefficients), 1)
 
-def calculate_grain_n(row):
+def calculate_grain_n(row, coefficients=None):
     """
     Calculate grain nitrogen (GrainN_kg_ha) for each row.
 
     Parameters:
     - row (Series): A pandas Series containing the data for one row.
+    - coefficients (Series): Coefficients from load_coefficients; the default version when None.
 
     Returns:
     - grain_n (float): Calculated grain nitrogen in kg/ha.
     """
-    soybeans_yield = row['soy_y']
-    corn_yield = row['corng_y']
-    soybeans_acres_h = row['soy_ha']
-    corn_acres_h = row['corng_ha']
-    
-    grain_n = ((soybeans_yield * 67.25 * 6.4 / 100 * soybeans_acres_h * 0.404686) +
-               (corn_yield * 62.77 * 1.18 / 100 * corn_acres_h * 0.404686)) / (0.404686 * (soybeans_acres_h + corn_acres_h))
-    
-    return round(grain_n, 1)
+    coefficients = _row_coefficients(coefficients)
+    return round(grain_n(row.__getitem__, coefficients), 1)
 
 def calculate_ns(row):
     """
@@ -89,34 +150,137 @@ def calculate_ns(row):
     manure = row['MN']
     grain = row['GN']
     fix = row['FN']
-    
+
     ns = commercial + manure + fix - grain
-    
+
     return round(ns, 1)
 
-def calculate_manure_n_no_storage_loss(row):
+def calculate_manure_n_no_storage_loss(row, coefficients=None):
     """
     Calculate Manure Nitrogen (ManureN_kg_ha) for each row without considering storage loss. Previous IFEWs version.
 
     Parameters:
     - row (Series): A pandas Series containing the data for one row.
+    - coefficients (Series): Coefficients from load_coefficients; the default version when None.
 
     Returns:
     - manure_n (float): Calculated manure nitrogen in kg/ha without storage loss.
     """
-    hogs = row['hogs']
-    milk_cows = row['milk']
-    beef_cows = row['beef']
-    heifer_steers = (row['cattle'] - (row['beef'] + row['milk'])) * 0.5
-    slaughter_cattle = (row['cattle'] - (row['beef'] + row['milk'])) * 0.5
-    soybeans_acres = row['soy_pa']
-    corn_acres = row['corng_pa']
-    
-    # Calculate manure nitrogen without considering storage loss
-    manure_n = (hogs * 0.027 * 365 +
-                milk_cows * 0.204 * 365 +
-                beef_cows * 0.15 * 365 +
-                heifer_steers * 0.1455 * 365 +
-                slaughter_cattle * 0.104 * 170) / (0.404686 * (soybeans_acres + corn_acres))
-        
-    return round(manure_n, 1)
+    coefficients = _row_coefficients(coefficients)
+    return round(manure_n(row.__getitem__, coefficients, 'manure_old'), 1)
+
+def round_like_python(values, ndigits=1):
+    """
+    Round an array like the built-in round(x, ndigits) on Python floats, which the row-wise functions use.
+
+    numpy rounds x * 10**ndigits to the nearest integer, which differs from the built-in round only when that
+    product lands next to a tie; those few values are rounded one by one with round().
+
+    Parameters:
+    - values (ndarray): Values to round.
+    - ndigits (int): Number of decimals.
+
+    Returns:
+    - rounded (ndarray): Rounded values.
+    """
+    values = np.asarray(values, dtype=float)
+    rounded = np.round(values, ndigits)
+    scaled = values * 10 ** ndigits
+    with np.errstate(invalid='ignore'):
+        near_tie = np.abs(scaled - np.floor(scaled) - 0.5) < 1e-6 * np.maximum(1, np.abs(scaled))
+    for i in np.flatnonzero(near_tie):
+        rounded.flat[i] = round(float(values.flat[i]), ndigits)
+    return rounded
+
+def calculate_n_budget(df, coefficients=None):
+    """
+    Calculate CN, MN, MN_old, FN, GN and NS for every row at once on column arrays.
+
+    Gives the same values as round(df["CN_lb/ac"] * 1.121, 1) and the row-wise calculate_* functions applied
+    with DataFrame.apply(axis=1): the formulas are shared with them and rounded like round() on Python floats.
+    Rows with no planted or harvested area give inf or NaN where the row-wise functions raise.
+
+    Parameters:
+    - df (DataFrame): Table with the CN_lb/ac, animal population and crop columns of data_processing.
+    - coefficients (Series): Coefficients from load_coefficients; the default version when None.
+
+    Returns:
+    - budget (DataFrame): CN, MN, MN_old, FN, GN and NS in kg/ha, aligned with df.
+    """
+    coefficients = load_coefficients() if coefficients is None else coefficients
+    col = lambda name: df[name].to_numpy(dtype=float)
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        # Commercial nitrogen, rounded as a Series like in main_Ns_code
+        commercial = np.round(col('CN_lb/ac') * 1.121, 1)
+        manure = round_like_python(manure_n(col, coefficients))
+        # Without storage loss (previous IFEWs version)
+        manure_old = round_like_python(manure_n(col, coefficients, 'manure_old'))
+        fix = round_like_python(fix_n(col, coefficients))
+        grain = round_like_python(grain_n(col, coefficients))
+        ns = round_like_python(commercial + manure + fix - grain)
+
+    return pd.DataFrame({'CN': commercial, 'MN': manure, 'MN_old': manure_old, 'FN': fix, 'GN': grain, 'NS': ns},
+                        index=df.index)
+
+def coefficient_scenarios(scenarios, base=None):
+    """
+    Complete a table of coefficient variants with the base coefficients.
+
+    Parameters:
+    - scenarios (DataFrame or dict): One column (or dict entry) per scenario, indexed by parameter; only the
+      parameters that differ from base are needed.
+    - base (Series): Coefficients the scenarios start from; the default version when None.
+
+    Returns:
+    - scenarios (DataFrame): Every parameter of base (rows) for every scenario (columns).
+    """
+    base = load_coefficients() if base is None else base
+    scenarios = pd.DataFrame(scenarios)
+    unknown = scenarios.index.difference(base.index)
+    if len(unknown):
+        raise ValueError(f'Unknown coefficients: {list(unknown)}')
+    scenarios = scenarios.reindex(base.index)
+    return scenarios.where(scenarios.notna(), base, axis=0)
+
+def n_budget_scenarios(df, scenarios, base=None, components=False):
+    """
+    Calculate NS for many coefficient sets at once.
+
+    Manure N of all scenarios is one (rows x animal groups) @ (animal groups x scenarios) product, and FN and
+    GN broadcast over the scenarios, so hundreds of variants cost about as much as one calculate_n_budget.
+    Components are rounded to 0.1 kg/ha as in calculate_n_budget; the matrix product adds the animal terms
+    in a different order, so manure N can differ from calculate_n_budget in the last digit at rounding ties.
+
+    Parameters:
+    - df (DataFrame): Table with the CN_lb/ac, animal population and crop columns of data_processing.
+    - scenarios (DataFrame or dict): Coefficient variants, see coefficient_scenarios.
+    - base (Series): Coefficients the scenarios start from; the default version when None.
+    - components (bool): Also return CN, MN, MN_old, FN and GN.
+
+    Returns:
+    - ns (DataFrame): NS in kg/ha, rows of df x scenarios. With components=True, a dict of such frames
+      keyed by NS, CN, MN, MN_old, FN and GN.
+    """
+    scenarios = coefficient_scenarios(scenarios, base)
+    names = scenarios.columns
+    col = lambda name: df[name].to_numpy(dtype=float)
+    # Every parameter as a (1 x scenarios) row, so the formulas broadcast against (rows x 1) columns
+    coefficients = {name: values[None, :] for name, values in zip(scenarios.index, scenarios.to_numpy(dtype=float))}
+    as_column = lambda name: col(name)[:, None]
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        budget = {}
+        for key, name in [('MN', 'manure'), ('MN_old', 'manure_old')]:
+            animals = [animal for animal, _, _ in manure_terms(scenarios.iloc[:, 0], name)]
+            populations = _old_populations(col) if name == 'manure_old' else {animal: col(animal) for animal in animals}
+            rates = np.stack([coefficients[f'{name}.{animal}.excretion'][0] * coefficients[f'{name}.{animal}.days'][0] for animal in animals])
+            area = 0.404686 * (col('soy_pa') + col('corng_pa'))
+            budget[key] = round_like_python(np.column_stack([populations[animal] for animal in animals]) @ rates / area[:, None])
+        budget['FN'] = round_like_python(fix_n(as_column, coefficients))
+        budget['GN'] = round_like_python(grain_n(as_column, coefficients))
+        budget['CN'] = np.repeat(np.round(col('CN_lb/ac') * 1.121, 1)[:, None], len(names), axis=1)
+        budget['NS'] = round_like_python(budget['CN'] + budget['MN'] + budget['FN'] - budget['GN'])
+
+    frames = {key: pd.DataFrame(values, index=df.index, columns=names) for key, values in budget.items()}
+    return frames if components else frames['NS']
@@ -1,8 +1,17 @@
 import os
+import gzip
+import json
+import time
+import hashlib
+import datetime
+import threading
+import http.client
+import urllib.error
 import urllib.parse
-import urllib.request
 import pandas as pd
-from io import StringIO
+import numpy as np
+from io import BytesIO
+from concurrent.futures import ThreadPoolExecutor
 from dotenv import load_dotenv
 
 current_file_path = os.path.abspath(__file__)
@@ -16,16 +25,349 @@ load_dotenv(env_path)
 # Retrieve the API key from the environment variables
 API_key = os.getenv('API_KEY')
 
+# QuickStats API root; point it at quickstats_server.py for offline runs and benchmarks
+BASE_URL = os.getenv('QUICKSTATS_BASE_URL', 'http://quickstats.nass.usda.gov/api')
+
+# When set, every downloaded body is also saved as a replay fixture for quickstats_server.py
+RECORD_DIR = os.getenv('QUICKSTATS_RECORD_DIR')
+
+# Local response cache (override with QUICKSTATS_CACHE_DIR, force a re-download with QUICKSTATS_REFRESH=1)
+CACHE_DIR = os.getenv('QUICKSTATS_CACHE_DIR', os.path.join(current_directory, '../datasets/quickstats_cache'))
+CACHE_TTL = 7 * 24 * 3600
+CACHE_MAX_BYTES = 512 * 1024 ** 2
+
+# Incremental sync store (override with QUICKSTATS_STORE_DIR, enable for all queries with QUICKSTATS_INCREMENTAL=1)
+STORE_DIR = os.getenv('QUICKSTATS_STORE_DIR', os.path.join(current_directory, '../datasets/quickstats_store'))
+# Years re-requested on every sync because NASS may still revise them
+REVISION_WINDOW = 2
+
+# Upper bound on simultaneous requests issued by get_data_many / get_csv_many
+MAX_WORKERS = 6
+
+# QuickStats rejects requests that would return more rows than this
+MAX_ROWS = 50000
+
+# Fields in which otherwise identical queries may differ and still be fetched as one request (see plan_queries)
+SPLIT_FIELDS = ['short_desc', 'class_desc', 'statisticcat_desc', 'util_practice_desc', 'prodn_practice_desc', 'unit_desc']
+
+# Columns used by process_data_crop / process_data_animal, and the dtypes they are parsed with
+QUICKSTATS_COLUMNS = ['county_name', 'year', 'Value', 'short_desc', 'domain_desc', 'class_desc']
+QUICKSTATS_DTYPES = {
+    'state_name': str, 'county_name': str, 'county_code': str, 'year': np.int64, 'Value': str,
+    'short_desc': str, 'domain_desc': str, 'class_desc': str, 'statisticcat_desc': str,
+    'util_practice_desc': str, 'prodn_practice_desc': str, 'unit_desc': str,
+}
+
+def parse_parameters(parameters):
+    """
+    Split a QuickStats query string into (field, value) pairs.
+
+    The strings in parameters_usda.py mix literal and percent-encoded separators
+    (e.g. 'short_desc%3DCORN%2C%20GRAIN'), so every item is unquoted before splitting on '='.
+
+    Parameters:
+    - parameters (str): Query string as passed to get_data.
+
+    Returns:
+    - pairs (list): List of (field, value) tuples in query order.
+    """
+    pairs = []
+    for item in parameters.split('&'):
+        if not item:
+            continue
+        field, _, value = urllib.parse.unquote_plus(item).partition('=')
+        pairs.append((field.strip(), value))
+    return pairs
+
+def normalize_parameters(parameters):
+    """
+    Build the canonical form of a query string: API key dropped, fields sorted and re-encoded.
+
+    Parameters:
+    - parameters (str): Query string.
+
+    Returns:
+    - normalized (str): Canonical query string.
+    """
+    pairs = sorted((field, value) for field, value in parse_parameters(parameters) if field != 'key')
+    return urllib.parse.urlencode(pairs, quote_via=urllib.parse.quote)
+
+def fixture_name(url, extension='csv'):
+    """
+    File name under which the response to url is recorded and replayed.
+
+    Only the path and the normalized query enter the name, so a recording made against the live
+    API is found again by a stand-in server running on another host.
+
+    Parameters:
+    - url (str): Request URL or path with query string.
+    - extension (str): File extension, 'csv' for data and 'json' for row counts.
+
+    Returns:
+    - name (str): Fixture file name.
+    """
+    parts = urllib.parse.urlsplit(url)
+    key = f'{parts.path}?{normalize_parameters(parts.query)}'
+    return f'{hashlib.sha256(key.encode("utf-8")).hexdigest()}.{extension}'
+
+class _Recorder:
+    """
+    Read-through wrapper that copies everything read from a stream into a fixture file.
+    """
+    def __init__(self, stream, path):
+        self.stream = stream
+        self.path = path
+        self.tmp_path = f'{path}.{os.getpid()}.{threading.get_ident()}.tmp'
+        self.sink = open(self.tmp_path, 'wb')
+
+    def read(self, size=-1):
+        data = self.stream.read(size)
+        self.sink.write(data)
+        return data
+
+    def close(self, complete=True):
+        self.sink.close()
+        if complete:
+            os.replace(self.tmp_path, self.path)
+        else:
+            os.remove(self.tmp_path)
+
+def parse_value(values):
+    """
+    Convert the QuickStats Value column to numbers.
+
+    Thousands separators and padding are removed; suppression codes such as '(D)' and '(Z)' become NaN.
+
+    Parameters:
+    - values (Series): Raw Value column.
+
+    Returns:
+    - values (Series): Float Series.
+    """
+    if pd.api.types.is_numeric_dtype(values):
+        return values.astype(float)
+    return pd.to_numeric(values.str.replace(',', '', regex=False).str.strip(), errors='coerce')
+
+def filter_mask(df, pairs):
+    """
+    Evaluate QuickStats query filters on rows held locally.
+
+    Supports equality and the __LIKE, __NOT_LIKE, __NE, __GE, __GT, __LE and __LT operators.
+    Equality and LIKE ignore surrounding whitespace; comparisons are numeric. A field given several
+    equality filters matches any of their values, as in the API.
+
+    Parameters:
+    - df (DataFrame): Rows with QuickStats column names.
+    - pairs (list): (field, value) filters as returned by parse_parameters.
+
+    Returns:
+    - mask (ndarray): Boolean mask of the rows matching every filter.
+    """
+    equal = {}
+    for name, value in pairs:
+        if '__' not in name:
+            equal.setdefault(name, []).append(value.strip())
+
+    mask = np.ones(len(df), dtype=bool)
+    for name, value in pairs:
+        field, _, operator = name.partition('__')
+        if field in ('key', 'format'):
+            continue
+        if operator == '' and field not in equal:
+            # Already evaluated together with an earlier value of the same field
+            continue
+        if field not in df.columns:
+            raise ValueError(f'Cannot evaluate filter {name}: column {field} is not available')
+        # Evaluate each distinct value once; missing values (code -1) map to the appended last entry
+        codes, uniques = pd.factorize(df[field])
+        if operator in ('GE', 'GT', 'LE', 'LT'):
+            column = np.append(pd.to_numeric(pd.Series(uniques), errors='coerce').to_numpy(dtype=float), np.nan)
+            bound = float(value)
+            keep = {'GE': column >= bound, 'GT': column > bound, 'LE': column <= bound, 'LT': column < bound}[operator]
+            mask &= keep[codes]
+            continue
+        column = pd.Series(np.append(pd.Series(uniques).astype(str).to_numpy(), 'nan')).str.strip()
+        if operator == '':
+            keep = column.isin(equal.pop(field)).to_numpy()
+        elif operator == 'NE':
+            keep = (column != value.strip()).to_numpy()
+        elif operator == 'LIKE':
+            keep = column.str.contains(value.strip(), case=False, regex=False).to_numpy()
+        elif operator == 'NOT_LIKE':
+            keep = ~column.str.contains(value.strip(), case=False, regex=False).to_numpy()
+        else:
+            raise ValueError(f'Unsupported filter operator in {name}')
+        mask &= keep[codes]
+    return mask
+
+def _bounds(pairs, field, default_lo, default_hi):
+    """
+    Inclusive integer range selected by the equality and comparison filters on field.
+    """
+    lo, hi = default_lo, default_hi
+    for name, value in pairs:
+        if name == field:
+            lo = hi = int(value)
+        elif name == f'{field}__GE':
+            lo = max(lo, int(value))
+        elif name == f'{field}__GT':
+            lo = max(lo, int(value) + 1)
+        elif name == f'{field}__LE':
+            hi = min(hi, int(value))
+        elif name == f'{field}__LT':
+            hi = min(hi, int(value) - 1)
+    return lo, hi
+
+def _restrict(pairs, field, lo, hi, fmt='{}'):
+    """
+    Replace the filters on field by the inclusive range lo..hi and re-encode the query.
+    """
+    operators = {field, f'{field}__GE', f'{field}__GT', f'{field}__LE', f'{field}__LT'}
+    pairs = [(name, value) for name, value in pairs if name not in operators]
+    pairs += [(f'{field}__GE', fmt.format(lo)), (f'{field}__LE', fmt.format(hi))]
+    return urllib.parse.urlencode(pairs, quote_via=urllib.parse.quote)
+
+class QuickStatsQuery(str):
+    """
+    A QuickStats query string that also names the output columns its rows provide.
+
+    Instances are plain query strings wherever one is expected (get_data, get_data_many, ingest_bulk);
+    plan_queries and USDAQuickStats.get_outputs_many use the structured form.
+    """
+    def __new__(cls, filters, outputs):
+        """
+        Parameters:
+        - filters (list): (field, value) pairs sent to the API, with operators written as field__OP.
+        - outputs (dict): Output column name -> (field, value) filters selecting its rows from the
+          response, e.g. {'hogs_sales': [('short_desc', 'HOGS - SALES, MEASURED IN HEAD')]}.
+          An empty filter list takes every row.
+        """
+        query = super().__new__(cls, urllib.parse.urlencode(filters, quote_via=urllib.parse.quote))
+        query.filters = list(filters)
+        query.outputs = {name: list(pairs) for name, pairs in outputs.items()}
+        return query
+
+    def __getnewargs__(self):
+        return (self.filters, self.outputs)
+
+def plan_queries(queries, split_fields=SPLIT_FIELDS):
+    """
+    Group queries that differ only in split fields into shared requests.
+
+    Within a group, split filters common to every query are kept; a split field that every query
+    filters by plain equality is sent with all of their values (QuickStats returns rows matching
+    any of them); other differing split filters are left out of the request and must be applied
+    locally. Leaving a filter out is only allowed while short_desc stays pinned to exact values,
+    since a short_desc names a single series: otherwise the shared request would download series
+    none of the queries wants, and the group is sent as separate requests. A query alone in its
+    group is sent unchanged.
+
+    Parameters:
+    - queries (list): Query strings.
+    - split_fields (list): Fields the queries of a group may differ in.
+
+    Returns:
+    - plan (list): (request, members) tuples, where members are the indices of the queries the request serves.
+    """
+    groups = {}
+    for i, query in enumerate(queries):
+        shared = tuple(sorted((name, value) for name, value in parse_parameters(query)
+                              if name != 'key' and name.partition('__')[0] not in split_fields))
+        groups.setdefault(shared, []).append(i)
+
+    plan = []
+    for members in groups.values():
+        if len(members) == 1:
+            plan.append((str(queries[members[0]]), members))
+            continue
+        member_pairs = [parse_parameters(queries[i]) for i in members]
+        pairs = [(name, value) for name, value in member_pairs[0] if name.partition('__')[0] not in split_fields]
+        dropped = False
+        for field in split_fields:
+            filters = [[(name, value) for name, value in p if name.partition('__')[0] == field] for p in member_pairs]
+            if all(f == filters[0] for f in filters):
+                pairs += filters[0]
+            elif all(len(f) == 1 and f[0][0] == field for f in filters):
+                pairs += [(field, value) for value in dict.fromkeys(f[0][1] for f in filters)]
+            else:
+                dropped = True
+        if dropped and 'short_desc' not in [name for name, _ in pairs]:
+            plan += [(str(queries[i]), [i]) for i in members]
+            continue
+        plan.append((urllib.parse.urlencode(pairs, quote_via=urllib.parse.quote), members))
+    return plan
+
+def plan_outputs(queries, columns=None):
+    """
+    Shared requests of QuickStatsQuery objects and the column projection they are fetched with.
+
+    USDAQuickStats.get_outputs_many fetches, caches and syncs exactly these requests and columns, so a
+    store seeded from elsewhere (e.g. nass_bulk.ingest_bulk) must use them too.
+
+    Parameters:
+    - queries (list): QuickStatsQuery objects.
+    - columns (list): Columns of the output frames; None keeps every column.
+
+    Returns:
+    - plan (list): (request, members) tuples of plan_queries.
+    - fetch_columns (list): columns plus the fields the local filters need, or None.
+    """
+    plan = plan_queries(queries)
+    fetch_columns = None
+    if columns is not None:
+        filter_fields = {name.partition('__')[0] for query in queries for name, _ in parse_parameters(query)
+                         if name.partition('__')[0] in SPLIT_FIELDS}
+        filter_fields |= {name.partition('__')[0] for query in queries for pairs in query.outputs.values() for name, _ in pairs}
+        fetch_columns = list(columns) + sorted(filter_fields - set(columns))
+    return plan, fetch_columns
+
 class USDAQuickStats:
     """
     A class to interact with the USDA QuickStats API.
     """
-    def __init__(self, api_key):
+    def __init__(self, api_key, cache_dir=CACHE_DIR, cache_ttl=CACHE_TTL, cache_max_bytes=CACHE_MAX_BYTES, refresh=None,
+                 max_workers=MAX_WORKERS, max_rows=MAX_ROWS, store_dir=STORE_DIR, incremental=None,
+                 revision_window=REVISION_WINDOW, base_url=BASE_URL, record_dir=RECORD_DIR):
         """
         Initialize the USDAQuickStats object with the provided API key.
+
+        Parameters:
+        - api_key (str): QuickStats API key.
+        - cache_dir (str): Directory of the on-disk response cache, None disables caching.
+        - cache_ttl (float): Seconds after which a cached response is fetched again.
+        - cache_max_bytes (int): Size budget of the cache; least recently used entries are evicted first.
+        - refresh (bool): Ignore cached responses and re-download. Defaults to the QUICKSTATS_REFRESH variable.
+        - max_workers (int): Number of concurrent requests used by get_data_many and get_csv_many.
+        - max_rows (int): Per-request row cap; larger queries are split into partitions. None disables splitting.
+        - store_dir (str): Directory of the per-query tables kept by sync_data_many.
+        - incremental (bool): Route get_data / get_data_many through sync_data_many. Defaults to the
+          QUICKSTATS_INCREMENTAL variable.
+        - revision_window (int): Number of years before the latest stored year that every sync re-requests.
+        - base_url (str): API root, defaults to the QUICKSTATS_BASE_URL variable or the live service.
+        - record_dir (str): Directory where downloaded bodies are saved as replay fixtures, None to disable.
         """
         self.api_key = api_key
-        self.base_url_api_get = f'http://quickstats.nass.usda.gov/api/api_GET/?key={self.api_key}&'
+        self.base_url_api_get = f'{base_url}/api_GET/?key={self.api_key}&'
+        self.base_url_api_counts = f'{base_url}/get_counts/?key={self.api_key}&'
+        self.record_dir = record_dir
+        self.cache_dir = cache_dir
+        self.cache_ttl = cache_ttl
+        self.cache_max_bytes = cache_max_bytes
+        if refresh is None:
+            refresh = os.getenv('QUICKSTATS_REFRESH', '0').lower() in ('1', 'true', 'yes')
+        self.refresh = refresh
+        self.max_workers = max_workers
+        self.max_rows = max_rows
+        self.store_dir = store_dir
+        if incremental is None:
+            incremental = os.getenv('QUICKSTATS_INCREMENTAL', '0').lower() in ('1', 'true', 'yes')
+        self.incremental = incremental
+        self.revision_window = revision_window
+        # Keep-alive connections are per worker thread, so they survive between batches of requests
+        self._local = threading.local()
+        self._executor = None
+        # Worker threads store responses concurrently; eviction scans and deletes one at a time
+        self._cache_lock = threading.Lock()
 
     def encode_parameters(self, params):
         """
@@ -39,23 +381,499 @@ class USDAQuickStats:
         """
         return urllib.parse.urlencode(params)
 
-    def get_data(self, parameters):
+    def api_url(self, parameters):
+        """
+        Full QuickStats request URL for a query string.
+        """
+        return self.base_url_api_get + parameters
+
+    def _entry_name(self, url, columns=None):
+        """
+        File name of the cache and store entries of a request: the hash of its normalized URL
+        and column projection.
+        """
+        parts = urllib.parse.urlsplit(url)
+        key = f'{parts.netloc}{parts.path}?{normalize_parameters(parts.query)}'
+        if columns is not None:
+            key += '#' + ','.join(columns)
+        digest = hashlib.sha256(key.encode('utf-8')).hexdigest()
+        return f'{digest}.pkl'
+
+    def cache_path(self, url, columns=None):
+        """
+        Location of the cache entry for a request.
+
+        Parameters:
+        - url (str): Full request URL.
+        - columns (list): Column projection of the request, None for all columns.
+
+        Returns:
+        - path (str): Path of the pickled DataFrame for this request.
+        """
+        return os.path.join(self.cache_dir, self._entry_name(url, columns))
+
+    def store_path(self, parameters, columns=None):
+        """
+        Location of the incrementally synced table of a query.
+
+        Parameters:
+        - parameters (str): The parameters to be passed to the API.
+        - columns (list): Column projection of the query, None for all columns.
+
+        Returns:
+        - path (str): Path of the pickled DataFrame for this query.
+        """
+        return os.path.join(self.store_dir, self._entry_name(self.api_url(parameters), columns))
+
+    def _cache_load(self, path):
+        """
+        Return the cached DataFrame at path, or None if it is missing or older than the TTL.
+        """
+        try:
+            stat = os.stat(path)
+        except FileNotFoundError:
+            return None
+        try:
+            if time.time() - stat.st_mtime > self.cache_ttl:
+                os.remove(path)
+                return None
+            df = pd.read_pickle(path)
+            # Record the hit in the access time; mtime keeps the download time for the TTL
+            os.utime(path, (time.time(), stat.st_mtime))
+        except FileNotFoundError:
+            # Evicted or expired by another thread in the meantime
+            return None
+        return df
+
+    def _cache_store(self, path, df):
+        """
+        Atomically write df to the cache and evict least recently used entries beyond the size budget.
+        """
+        os.makedirs(self.cache_dir, exist_ok=True)
+        tmp_path = f'{path}.{os.getpid()}.{threading.get_ident()}.tmp'
+        df.to_pickle(tmp_path)
+        os.replace(tmp_path, path)
+
+        # Entries can still disappear underneath (clear_cache, TTL expiry in _cache_load, other processes)
+        with self._cache_lock:
+            entries = []
+            for name in os.listdir(self.cache_dir):
+                if name.endswith('.pkl'):
+                    try:
+                        stat = os.stat(os.path.join(self.cache_dir, name))
+                    except FileNotFoundError:
+                        continue
+                    entries.append((stat.st_atime, stat.st_size, name))
+            total = sum(size for _, size, _ in entries)
+            for _, size, name in sorted(entries):
+                if total <= self.cache_max_bytes:
+                    break
+                if os.path.join(self.cache_dir, name) != path:
+                    try:
+                        os.remove(os.path.join(self.cache_dir, name))
+                    except FileNotFoundError:
+                        pass
+                    total -= size
+
+    def clear_cache(self):
+        """
+        Remove every cached response.
+        """
+        if self.cache_dir and os.path.isdir(self.cache_dir):
+            for name in os.listdir(self.cache_dir):
+                if name.endswith('.pkl'):
+                    os.remove(os.path.join(self.cache_dir, name))
+
+    def _connection(self, scheme, netloc):
+        """
+        Return this thread's keep-alive connection to netloc, opening it on first use.
+        """
+        connections = self._local.__dict__.setdefault('connections', {})
+        conn = connections.get((scheme, netloc))
+        if conn is None:
+            conn_class = http.client.HTTPSConnection if scheme == 'https' else http.client.HTTPConnection
+            conn = connections[(scheme, netloc)] = conn_class(netloc, timeout=300)
+        return conn
+
+    def _request(self, url, max_redirects=5):
+        """
+        Issue a GET over a pooled connection, following redirects.
+
+        Parameters:
+        - url (str): Full request URL.
+
+        Returns:
+        - response (HTTPResponse): Open response with status 200. It must be read to the end
+          before the next request on this thread.
+        """
+        for _ in range(max_redirects + 1):
+            parts = urllib.parse.urlsplit(url)
+            target = parts.path + ('?' + parts.query if parts.query else '')
+            for attempt in range(2):
+                conn = self._connection(parts.scheme, parts.netloc)
+                try:
+                    conn.request('GET', target, headers={'Connection': 'keep-alive', 'Accept-Encoding': 'gzip'})
+                    response = conn.getresponse()
+                    break
+                except (http.client.RemoteDisconnected, ConnectionResetError, BrokenPipeError):
+                    # The server dropped an idle keep-alive connection: reconnect once
+                    conn.close()
+                    if attempt:
+                        raise
+
+            if response.status in (301, 302, 303, 307, 308):
+                response.read()
+                url = urllib.parse.urljoin(url, response.getheader('Location'))
+                continue
+            if response.status != 200:
+                body = response.read()
+                raise urllib.error.HTTPError(url, response.status, response.reason, response.headers, BytesIO(body))
+            return response
+        raise urllib.error.URLError(f'Too many redirects for {url}')
+
+    def _download(self, url, columns=None):
+        """
+        Stream a CSV document straight from the response into a DataFrame, bypassing the cache.
+
+        Parameters:
+        - url (str): Full request URL.
+        - columns (list): Columns to keep. When given, only these are parsed, with the dtypes in
+          QUICKSTATS_DTYPES, and Value is converted to numbers with parse_value.
+
+        Returns:
+        - df (DataFrame): Parsed response.
+        """
+        # Retrieve data from the server
+        response = self._request(url)
+        stream = gzip.GzipFile(fileobj=response) if response.getheader('Content-Encoding') == 'gzip' else response
+        if self.record_dir:
+            os.makedirs(self.record_dir, exist_ok=True)
+            stream = _Recorder(stream, os.path.join(self.record_dir, fixture_name(url)))
+
+        # Parse the CSV data into a DataFrame without buffering the body
+        try:
+            if columns is None:
+                df = pd.read_csv(stream)
+            else:
+                dtype = {column: QUICKSTATS_DTYPES[column] for column in columns if column in QUICKSTATS_DTYPES}
+                df = pd.read_csv(stream, usecols=lambda column: column in columns, dtype=dtype)
+                if 'Value' in df.columns:
+                    df['Value'] = parse_value(df['Value'])
+            stream.read()
+            response.read()
+        except BaseException:
+            if self.record_dir:
+                stream.close(complete=False)
+            # The connection is left mid-response and cannot be reused
+            parts = urllib.parse.urlsplit(url)
+            self._connection(parts.scheme, parts.netloc).close()
+            raise
+        if self.record_dir:
+            stream.close()
+        return df
+
+    def get_csv(self, url, refresh=None, columns=None):
+        """
+        Fetch a CSV document and parse it into a DataFrame, using the on-disk cache.
+
+        Parameters:
+        - url (str): Full request URL.
+        - refresh (bool): Bypass the cache for this call. Defaults to the instance setting.
+        - columns (list): Column projection, see _download. None parses every column with inferred dtypes.
+
+        Returns:
+        - df (DataFrame): A pandas DataFrame containing the fetched data.
+        """
+        refresh = self.refresh if refresh is None else refresh
+        path = self.cache_path(url, columns) if self.cache_dir else None
+        if path and not refresh:
+            df = self._cache_load(path)
+            if df is not None:
+                return df
+
+        df = self._download(url, columns)
+
+        if path:
+            self._cache_store(path, df)
+
+        return df
+
+    def get_table(self, key, build, refresh=None):
+        """
+        Return a table derived from one or more downloads, kept in the on-disk cache like a response.
+
+        Parameters:
+        - key (str): Identifies the table; it must cover everything the table depends on, e.g. the queries it is built from.
+        - build (callable): Function without arguments that builds the DataFrame on a cache miss.
+        - refresh (bool): Rebuild even if a fresh entry exists. Defaults to the instance setting.
+
+        Returns:
+        - df (DataFrame): The cached or newly built table.
+        """
+        refresh = self.refresh if refresh is None else refresh
+        path = os.path.join(self.cache_dir, f'{hashlib.sha256(key.encode("utf-8")).hexdigest()}.pkl') if self.cache_dir else None
+        if path and not refresh:
+            df = self._cache_load(path)
+            if df is not None:
+                return df
+
+        df = build()
+
+        if path:
+            self._cache_store(path, df)
+
+        return df
+
+    def get_count(self, parameters):
+        """
+        Number of rows a query would return, from the QuickStats get_counts endpoint.
+
+        Parameters:
+        - parameters (str): The parameters to be passed to the API.
+
+        Returns:
+        - count (int): Number of matching rows.
+        """
+        pairs = [(field, value) for field, value in parse_parameters(parameters) if field != 'format']
+        url = self.base_url_api_counts + urllib.parse.urlencode(pairs, quote_via=urllib.parse.quote)
+        response = self._request(url)
+        body = response.read()
+        if response.getheader('Content-Encoding') == 'gzip':
+            body = gzip.decompress(body)
+        if self.record_dir:
+            os.makedirs(self.record_dir, exist_ok=True)
+            with open(os.path.join(self.record_dir, fixture_name(url, 'json')), 'wb') as f:
+                f.write(body)
+        return int(json.loads(body)['count'])
+
+    def split_parameters(self, parameters, count=None):
+        """
+        Split a query into partitions that each stay under the row cap.
+
+        Queries are split by year range first, using the average number of rows per year as the
+        estimate, and every partition is re-counted and split further if needed. A single year
+        that is still too large is bisected by county code.
+
+        Parameters:
+        - parameters (str): The parameters to be passed to the API.
+        - count (int): Row count of the query, if already known.
+
+        Returns:
+        - partitions (list): Query strings whose results together equal the original query.
+        """
+        if self.max_rows is None:
+            return [parameters]
+        count = self.get_count(parameters) if count is None else count
+        if count <= self.max_rows:
+            return [parameters]
+
+        pairs = parse_parameters(parameters)
+        first, last = _bounds(pairs, 'year', 1850, datetime.date.today().year)
+        if last > first:
+            n_years = last - first + 1
+            span = max(1, int(self.max_rows * n_years / count))
+            partitions = []
+            for start in range(first, last + 1, span):
+                partitions += self.split_parameters(_restrict(pairs, 'year', start, min(start + span - 1, last)))
+            return partitions
+
+        lo, hi = _bounds(pairs, 'county_code', 0, 999)
+        if hi > lo:
+            mid = (lo + hi) // 2
+            return (self.split_parameters(_restrict(pairs, 'county_code', lo, mid, '{:03d}')) +
+                    self.split_parameters(_restrict(pairs, 'county_code', mid + 1, hi, '{:03d}')))
+
+        raise ValueError(f'Query returns {count} rows for a single year and county, above the {self.max_rows} row cap: {parameters}')
+
+    def get_data(self, parameters, refresh=None, columns=None, incremental=None):
         """
         Fetch data from the USDA QuickStats API based on the provided parameters.
 
+        Responses are served from the on-disk cache when a fresh entry exists for the normalized query.
+        Queries above the row cap are split and fetched in partitions (see split_parameters).
+
         Parameters:
         - parameters (str): The parameters to be passed to the API.
+        - refresh (bool): Bypass the cache for this call. Defaults to the instance setting.
+        - columns (list): Column projection, e.g. QUICKSTATS_COLUMNS. None parses every column with inferred dtypes.
+        - incremental (bool): Use sync_data_many instead of the cache. Defaults to the instance setting.
 
         Returns:
         - df (DataFrame): A pandas DataFrame containing the fetched data.
         """
-        full_url = self.base_url_api_get + parameters
+        return self.get_data_many([parameters], refresh=refresh, columns=columns, incremental=incremental)[0]
+
+    def _map(self, func, items):
+        """
+        Apply func to items on the shared worker pool, returning results in input order.
+        """
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix='quickstats')
+        return list(self._executor.map(func, items))
+
+    def get_csv_many(self, urls, refresh=None, columns=None):
+        """
+        Fetch several CSV documents concurrently.
+
+        Parameters:
+        - urls (list): Full request URLs.
+        - refresh (bool): Bypass the cache for these calls. Defaults to the instance setting.
+        - columns (list): Column projection applied to every document.
+
+        Returns:
+        - dfs (list): DataFrames in the order of urls.
+        """
+        return self._map(lambda url: self.get_csv(url, refresh=refresh, columns=columns), urls)
+
+    def _fetch_many(self, parameters_list, columns=None):
+        """
+        Download several queries without the cache.
+
+        Queries are sized with get_count and split under the row cap. All partitions are downloaded
+        as one concurrent batch, then concatenated per query with duplicates removed.
+        """
+        plans = self._map(self.split_parameters, parameters_list)
+        chunks = iter(self._map(lambda url: self._download(url, columns), [self.api_url(part) for plan in plans for part in plan]))
+        dfs = []
+        for plan in plans:
+            parts = [next(chunks) for _ in plan]
+            dfs.append(parts[0] if len(parts) == 1 else pd.concat(parts, ignore_index=True).drop_duplicates(ignore_index=True))
+        return dfs
+
+    def get_data_many(self, parameters_list, refresh=None, columns=None, incremental=None):
+        """
+        Fetch several QuickStats queries concurrently, at most max_workers at a time.
+
+        Cache misses are downloaded with query splitting (see split_parameters).
+
+        Parameters:
+        - parameters_list (list): Query strings to be passed to the API.
+        - refresh (bool): Bypass the cache for these calls. Defaults to the instance setting.
+        - columns (list): Column projection applied to every query.
+        - incremental (bool): Use sync_data_many instead of the cache. Defaults to the instance setting.
+
+        Returns:
+        - dfs (list): DataFrames in the order of parameters_list.
+        """
+        if self.incremental if incremental is None else incremental:
+            return self.sync_data_many(parameters_list, columns=columns)
 
-        # Retrieve data from the Quick Stats server
-        with urllib.request.urlopen(full_url) as response:
-            s_text = response.read().decode('utf-8')
+        refresh = self.refresh if refresh is None else refresh
+        urls = [self.api_url(parameters) for parameters in parameters_list]
+        dfs = [None] * len(urls)
+        if self.cache_dir and not refresh:
+            dfs = [self._cache_load(self.cache_path(url, columns)) for url in urls]
+        missing = [i for i, df in enumerate(dfs) if df is None]
 
-        # Parse the CSV data into a DataFrame
-        df = pd.read_csv(StringIO(s_text))
+        fetched = self._fetch_many([parameters_list[i] for i in missing], columns)
+        for i, df in zip(missing, fetched):
+            if self.cache_dir:
+                self._cache_store(self.cache_path(urls[i], columns), df)
+            dfs[i] = df
+
+        return dfs
+
+    def get_outputs_many(self, queries, refresh=None, columns=None, incremental=None):
+        """
+        Fetch QuickStatsQuery objects with shared requests and split the rows into their named outputs.
 
+        Queries are batched with plan_queries and fetched with get_data_many. Each query's own split
+        filters are re-applied to the rows of a shared request before its outputs are selected.
+
+        Parameters:
+        - queries (list): QuickStatsQuery objects; output names must be unique across them.
+        - refresh (bool): Bypass the cache for these calls. Defaults to the instance setting.
+        - columns (list): Columns of the returned frames. Columns needed for the local filters are
+          fetched as well and dropped afterwards.
+        - incremental (bool): Use sync_data_many instead of the cache. Defaults to the instance setting.
+
+        Returns:
+        - outputs (dict): Output name -> DataFrame of its rows, in query order.
+        """
+        plan, fetch_columns = plan_outputs(queries, columns)
+        dfs = self.get_data_many([request for request, _ in plan], refresh=refresh, columns=fetch_columns, incremental=incremental)
+
+        outputs = {}
+        for (request, members), df in zip(plan, dfs):
+            for i in members:
+                rows = df
+                if len(members) > 1:
+                    split_pairs = [(name, value) for name, value in parse_parameters(queries[i])
+                                   if name.partition('__')[0] in SPLIT_FIELDS]
+                    rows = df[filter_mask(df, split_pairs)]
+                for name, pairs in queries[i].outputs.items():
+                    selected = rows[filter_mask(rows, pairs)]
+                    outputs[name] = (selected if columns is None else selected[list(columns)]).reset_index(drop=True)
+
+        return {name: outputs[name] for query in queries for name in query.outputs}
+
+    def save_stored(self, parameters, df, columns=None):
+        """
+        Replace the stored table of a query, as read and updated by sync_data_many.
+
+        Parameters:
+        - parameters (str): The parameters to be passed to the API.
+        - df (DataFrame): Full result of the query.
+        - columns (list): Column projection the table was built with.
+
+        Returns:
+        - df (DataFrame): The stored table, ordered by year.
+        """
+        df = df.sort_values('year', kind='stable', ignore_index=True)
+        path = self.store_path(parameters, columns)
+        os.makedirs(self.store_dir, exist_ok=True)
+        tmp_path = f'{path}.{os.getpid()}.tmp'
+        df.to_pickle(tmp_path)
+        os.replace(tmp_path, path)
         return df
+
+    def sync_data_many(self, parameters_list, columns=None, revision_window=None):
+        """
+        Bring the stored table of each query up to date and return it.
+
+        The first sync downloads the full query. Later syncs only request years from
+        (latest stored year - revision_window) onwards, replace those years in the stored table
+        and keep the older ones, so the result matches a full download as long as NASS only
+        revises recent years. Rows are ordered by year.
+
+        Parameters:
+        - parameters_list (list): Query strings to be passed to the API.
+        - columns (list): Column projection applied to every query; must include 'year' if given.
+        - revision_window (int): Years re-requested before the latest stored year. Defaults to the instance setting.
+
+        Returns:
+        - dfs (list): DataFrames in the order of parameters_list.
+        """
+        revision_window = self.revision_window if revision_window is None else revision_window
+        paths = [self.store_path(parameters, columns) for parameters in parameters_list]
+        stored = [pd.read_pickle(path) if os.path.exists(path) else None for path in paths]
+
+        # Work out which years each query still needs
+        requests, cutoffs = [], []
+        for parameters, df in zip(parameters_list, stored):
+            if df is None or df.empty:
+                requests.append(parameters)
+                cutoffs.append(None)
+                continue
+            pairs = parse_parameters(parameters)
+            first, last = _bounds(pairs, 'year', 1850, datetime.date.today().year)
+            cutoff = max(first, int(df['year'].max()) - revision_window)
+            requests.append(_restrict(pairs, 'year', cutoff, last) if cutoff <= last else None)
+            cutoffs.append(cutoff)
+
+        pending = [i for i, request in enumerate(requests) if request is not None]
+        fetched = dict(zip(pending, self._fetch_many([requests[i] for i in pending], columns)))
+
+        dfs = []
+        for i, (df, cutoff) in enumerate(zip(stored, cutoffs)):
+            if i not in fetched:
+                dfs.append(df)
+                continue
+            # Upsert: the re-requested years replace what was stored for them
+            if cutoff is not None:
+                df = pd.concat([df[df['year'] < cutoff], fetched[i]], ignore_index=True).drop_duplicates(ignore_index=True)
+            else:
+                df = fetched[i]
+            dfs.append(self.save_stored(parameters_list[i], df, columns))
+
+        return dfs
@@ -0,0 +1,347 @@
+import os
+import gzip
+import time
+import argparse
+import tempfile
+
+current_file_path = os.path.abspath(__file__)
+current_directory = os.path.dirname(current_file_path)
+os.chdir(current_directory)
+from quickstats_server import start_server, synthetic_frame
+
+"""
+Timing harnesses for the data pipeline. Network-bound steps run against the local stand-in server in
+quickstats_server.py, so results are reproducible on a machine without network access.
+
+    python benchmarks.py fetch --latency 0.3 --throughput 2e6
+    python benchmarks.py pipeline
+    python benchmarks.py bulk --size-gb 2
+    python benchmarks.py expand_df
+    python benchmarks.py ns
+    python benchmarks.py monte_carlo --draws 100000
+"""
+
+def _report(name, seconds):
+    print(f'{name:<40s} {seconds:8.3f} s')
+
+def bench_fetch(latency=0.3, throughput=2e6, workers=(1, 6), n_counties=99):
+    """
+    Time the 13 county queries of parameters_usda.py, sequentially and with concurrent fetching,
+    each as its own request and batched into shared requests by plan_queries.
+
+    Parameters:
+    - latency (float): Server delay per response in seconds.
+    - throughput (float): Server bytes per second per response.
+    - workers (tuple): max_workers settings to compare.
+    - n_counties (int): Counties in the synthetic responses.
+    """
+    from USDAQuickStats import USDAQuickStats, QUICKSTATS_COLUMNS
+    import parameters_usda as p
+
+    queries = [p.hogs, p.hogs_others, p.beef, p.milk, p.other_cattle, p.onfeed_sold, p.steers,
+               p.corng_y, p.corng_pa, p.corng_ha, p.soy_y, p.soy_pa, p.soy_ha]
+    server = start_server(latency=latency, throughput=throughput, n_counties=n_counties)
+    try:
+        for n in workers:
+            stats = USDAQuickStats('benchmark', cache_dir=None, base_url=f'{server.url}/api', max_workers=n)
+            start = time.perf_counter()
+            stats.get_data_many(queries, columns=QUICKSTATS_COLUMNS)
+            _report(f'fetch, max_workers={n}', time.perf_counter() - start)
+
+            stats = USDAQuickStats('benchmark', cache_dir=None, base_url=f'{server.url}/api', max_workers=n)
+            start = time.perf_counter()
+            stats.get_outputs_many(queries, columns=QUICKSTATS_COLUMNS)
+            _report(f'fetch planned, max_workers={n}', time.perf_counter() - start)
+
+        with tempfile.TemporaryDirectory() as cache_dir:
+            stats = USDAQuickStats('benchmark', cache_dir=cache_dir, base_url=f'{server.url}/api', max_workers=max(workers))
+            stats.get_data_many(queries, columns=QUICKSTATS_COLUMNS)
+            start = time.perf_counter()
+            stats.get_data_many(queries, columns=QUICKSTATS_COLUMNS)
+            _report('fetch, warm cache', time.perf_counter() - start)
+    finally:
+        server.shutdown()
+
+def bench_pipeline(latency=0.3, throughput=2e6, fixture_dir=None):
+    """
+    Time main_processing_code.data_processing with both endpoints served locally.
+
+    Needs the local nitrogen-rate files read by caopeiyu_nrate.nrate.
+
+    Parameters:
+    - latency (float): Server delay per response in seconds.
+    - throughput (float): Server bytes per second per response.
+    - fixture_dir (str): Recorded responses to replay instead of synthetic data.
+    """
+    server = start_server(fixture_dir=fixture_dir, latency=latency, throughput=throughput)
+    try:
+        with tempfile.TemporaryDirectory() as cache_dir:
+            from USDAQuickStats import USDAQuickStats
+            import parameters_functions
+            from main_processing_code import data_processing
+
+            # Point the pipeline's client and validation endpoint at the stand-in
+            parameters_functions.stats = USDAQuickStats('benchmark', cache_dir=cache_dir, base_url=f'{server.url}/api')
+            parameters_functions.VALIDATION_BASE_URL = server.url
+
+            start = time.perf_counter()
+            data_processing()
+            _report('data_processing, cold cache', time.perf_counter() - start)
+
+            start = time.perf_counter()
+            data_processing()
+            _report('data_processing, warm cache', time.perf_counter() - start)
+    finally:
+        server.shutdown()
+
+def write_synthetic_bulk(path, size_bytes, n_counties=99):
+    """
+    Write a gzipped tab-delimited file laid out like a NASS bulk dump, of at least size_bytes uncompressed.
+
+    Parameters:
+    - path (str): Output file.
+    - size_bytes (int): Target uncompressed size.
+    - n_counties (int): Counties per state.
+    """
+    written, batch = 0, 0
+    with gzip.open(path, 'wt', compresslevel=1) as f:
+        while written < size_bytes:
+            # Vary the query so every batch draws different values
+            df = synthetic_frame(f'agg_level_desc=COUNTY&batch={batch}', n_counties=n_counties)
+            text = df.to_csv(sep='\t', index=False, header=[c.upper().replace('CV (%)', 'CV_%') for c in df.columns] if batch == 0 else False)
+            f.write(text)
+            written += len(text)
+            batch += 1
+
+def bench_bulk(size_gb=1.0, chunksize=500000):
+    """
+    Time nass_bulk.ingest_bulk on a synthetic bulk file against the queries of parameters_usda.py, then
+    check that an incremental USDAQuickStats.get_outputs_many on the seeded store only requests recent years.
+
+    Parameters:
+    - size_gb (float): Uncompressed size of the synthetic file in GB.
+    - chunksize (int): Rows parsed per chunk.
+    """
+    from USDAQuickStats import USDAQuickStats, QUICKSTATS_COLUMNS, parse_parameters
+    from nass_bulk import ingest_bulk
+    import parameters_usda as p
+
+    queries = [p.hogs, p.hogs_others, p.beef, p.milk, p.other_cattle, p.onfeed_sold, p.steers,
+               p.corng_y, p.corng_pa, p.corng_ha, p.soy_y, p.soy_pa, p.soy_ha]
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'qs.synthetic.txt.gz')
+        start = time.perf_counter()
+        write_synthetic_bulk(path, int(size_gb * 1e9))
+        _report(f'write {size_gb:g} GB synthetic bulk file', time.perf_counter() - start)
+
+        # The store is keyed on the request URLs, so ingest with the client the sync will use
+        server = start_server()
+        try:
+            stats = USDAQuickStats('benchmark', cache_dir=None, store_dir=os.path.join(tmp, 'store'),
+                                   base_url=f'{server.url}/api', incremental=True)
+            start = time.perf_counter()
+            stored = ingest_bulk(path, queries, stats, chunksize=chunksize)
+            _report(f'ingest, chunksize={chunksize}', time.perf_counter() - start)
+
+            # The pipeline's incremental sync should find the ingested tables and only re-request recent years
+            start = time.perf_counter()
+            stats.get_outputs_many(queries, columns=QUICKSTATS_COLUMNS)
+            _report('incremental sync after ingest', time.perf_counter() - start)
+        finally:
+            server.shutdown()
+
+        # Only requests whose bulk table came out empty may go back further than the revision window
+        latest = min(int(df['year'].max()) for df in stored if not df.empty)
+        requested = [dict(parse_parameters(path.partition('?')[2])) for path in server.requests if 'api_GET' in path]
+        full = [pairs for pairs in requested if int(pairs.get('year__GE', 0)) < latest - stats.revision_window]
+        empty = sum(df.empty for df in stored)
+        print(f'{len(requested)} data requests after ingest, {len(full)} full downloads ({empty} requests without bulk rows)')
+        if len(full) > empty:
+            raise AssertionError('The incremental sync re-downloaded years covered by the bulk file')
+
+def _expand_df_loop(df, validation_df):
+    """
+    Previous row-by-row implementation of validation_functions.expand_df, kept as the timing and output reference.
+    """
+    import pandas as pd
+    import numpy as np
+
+    counties = df['CountyName'].unique()
+    years = list(range(validation_df['Year'].min(), validation_df['Year'].max() + 1))
+    expanded_df = pd.DataFrame(columns=df.columns)
+    for county in counties:
+        for year in years:
+            if not ((df['CountyName'] == county) & (df['Year'] == year)).any():
+                new_row = pd.DataFrame([[county, year] + [pd.NA] * (len(df.columns) - 2)], columns=df.columns)
+                expanded_df = pd.concat([expanded_df, new_row], ignore_index=True)
+    new_df = pd.concat([df, expanded_df], ignore_index=True)
+    new_df = new_df.sort_values(['CountyName', 'Year']).reset_index(drop=True)
+    new_df = new_df.fillna({'hogs': np.nan, 'hogs_sales': np.nan, 'hogs_breeding': np.nan, 'beef': np.nan, 'milk': np.nan,
+                            'cattle': np.nan, 'steers': np.nan, 'onfeed_sold': np.nan, 'corng_y': np.nan, 'corng_pa': np.nan,
+                            'corng_ha': np.nan, 'soy_y': np.nan, 'soy_pa': np.nan, 'soy_ha': np.nan})
+    if 'corng_y' in new_df.columns:
+        new_df = new_df.drop_duplicates(subset=['CountyName', 'Year'])
+    return new_df[new_df['Year'] < 2023]
+
+def synthetic_panel(n_counties, n_years, columns, coverage=0.7, first_year=1873, seed=0):
+    """
+    County x year panel with gaps, shaped like the USDA tables passed to expand_df.
+
+    Parameters:
+    - n_counties (int): Number of counties.
+    - n_years (int): Number of years, starting at first_year.
+    - columns (list): Value columns.
+    - coverage (float): Share of county-years present.
+    - first_year (int): First year of the panel.
+    - seed (int): Random seed.
+
+    Returns:
+    - df (DataFrame): Panel with CountyName, Year and the value columns.
+    """
+    import numpy as np
+    import pandas as pd
+
+    rng = np.random.default_rng(seed)
+    counties = np.repeat([f'COUNTY {i:04d}' for i in range(n_counties)], n_years)
+    years = np.tile(np.arange(first_year, first_year + n_years), n_counties)
+    keep = rng.random(len(years)) < coverage
+    df = pd.DataFrame({'CountyName': counties[keep], 'Year': years[keep]})
+    for column in columns:
+        df[column] = np.round(rng.lognormal(10, 1, keep.sum()))
+    return df
+
+def bench_expand_df(sizes=((99, 56), (1000, 150), (3000, 150)), reference_max_rows=6000):
+    """
+    Time validation_functions.expand_df on growing county x year panels.
+
+    The previous row-by-row implementation is timed as well, and its output compared, on panels
+    small enough for it to finish.
+
+    Parameters:
+    - sizes (tuple): (counties, years) panels to time.
+    - reference_max_rows (int): Largest grid on which the previous implementation is run.
+    """
+    import warnings
+    import pandas as pd
+    from validation_functions import expand_df
+
+    columns = ['corng_y', 'corng_pa', 'corng_ha', 'soy_y', 'soy_pa', 'soy_ha']
+    with warnings.catch_warnings():
+        # Both implementations concatenate all-NA object columns, which pandas warns about
+        warnings.simplefilter('ignore', FutureWarning)
+        for n_counties, n_years in sizes:
+            df = synthetic_panel(n_counties, n_years, columns, first_year=2023 - n_years)
+            validation_df = pd.DataFrame({'Year': [2023 - n_years, 2022]})
+            start = time.perf_counter()
+            result = expand_df(df, validation_df)
+            _report(f'expand_df, {n_counties} x {n_years}', time.perf_counter() - start)
+
+            if n_counties * n_years <= reference_max_rows:
+                start = time.perf_counter()
+                reference = _expand_df_loop(df, validation_df)
+                _report(f'expand_df loop, {n_counties} x {n_years}', time.perf_counter() - start)
+                pd.testing.assert_frame_equal(result, reference)
+
+def synthetic_ifews(n_rows, seed=0):
+    """
+    Table with the columns main_Ns_code reads from data_processing, with plausible magnitudes.
+
+    Parameters:
+    - n_rows (int): Number of county-years.
+    - seed (int): Random seed.
+
+    Returns:
+    - df (DataFrame): CountyName, Year, CN_lb/ac and the animal and crop columns.
+    """
+    import numpy as np
+    import pandas as pd
+
+    rng = np.random.default_rng(seed)
+    df = pd.DataFrame({'CountyName': rng.choice([f'COUNTY {i:02d}' for i in range(99)], n_rows),
+                       'Year': rng.integers(1968, 2023, n_rows)})
+    for column in ['hogs', 'hogs_sales', 'hogs_breeding', 'beef', 'milk', 'cattle', 'steers', 'onfeed_sold',
+                   'bulls', 'dairy_150', 'dairy_400', 'fin_cattle', 'hogs_fin', 'hogs_sow', 'hogs_boars']:
+        df[column] = np.round(rng.lognormal(8, 1.5, n_rows))
+    for column in ['corng_pa', 'corng_ha', 'soy_pa', 'soy_ha']:
+        df[column] = np.round(rng.lognormal(11, 0.7, n_rows), -2)
+    df['corng_y'] = np.round(rng.normal(150, 30, n_rows), 1)
+    df['soy_y'] = np.round(rng.normal(45, 8, n_rows), 1)
+    df['CN_lb/ac'] = rng.normal(120, 25, n_rows)
+    return df
+
+def _ns_rowwise(df):
+    """
+    Nitrogen budget as main_Ns_code computed it, one DataFrame.apply(axis=1) per term.
+    """
+    from Ns_functions import calculate_manure_n, calculate_manure_n_no_storage_loss, calculate_fix_n, calculate_grain_n, calculate_ns
+
+    df = df.copy()
+    df['CN'] = round(df['CN_lb/ac'] * 1.121, 1)
+    df['MN'] = df.apply(calculate_manure_n, axis=1)
+    df['MN_old'] = df.apply(calculate_manure_n_no_storage_loss, axis=1)
+    df['FN'] = df.apply(calculate_fix_n, axis=1)
+    df['GN'] = df.apply(calculate_grain_n, axis=1)
+    df['NS'] = df.apply(calculate_ns, axis=1)
+    return df[['CN', 'MN', 'MN_old', 'FN', 'GN', 'NS']]
+
+def bench_ns(sizes=(5000, 50000, 500000), reference_max_rows=50000):
+    """
+    Time Ns_functions.calculate_n_budget against the row-wise apply path and check they agree exactly.
+
+    Parameters:
+    - sizes (tuple): Table sizes to time.
+    - reference_max_rows (int): Largest table on which the row-wise path is run.
+    """
+    import pandas as pd
+    from Ns_functions import calculate_n_budget
+
+    for n_rows in sizes:
+        df = synthetic_ifews(n_rows)
+        start = time.perf_counter()
+        budget = calculate_n_budget(df)
+        _report(f'n budget, {n_rows} rows', time.perf_counter() - start)
+
+        if n_rows <= reference_max_rows:
+            start = time.perf_counter()
+            reference = _ns_rowwise(df)
+            _report(f'n budget apply, {n_rows} rows', time.perf_counter() - start)
+            pd.testing.assert_frame_equal(budget, reference, check_exact=True)
+
+def bench_monte_carlo(n_draws=100000, n_rows=5000, max_workers=None):
+    """
+    Time monte_carlo.ns_uncertainty on a synthetic table of county-years.
+
+    Parameters:
+    - n_draws (int): Monte Carlo draws.
+    - n_rows (int): Number of county-years.
+    - max_workers (int): Worker processes, all cores when None.
+    """
+    from monte_carlo import ns_uncertainty
+
+    df = synthetic_ifews(n_rows)
+    start = time.perf_counter()
+    ns_uncertainty(df, n_draws=n_draws, max_workers=max_workers)
+    _report(f'monte carlo, {n_draws} draws x {n_rows} rows', time.perf_counter() - start)
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Pipeline benchmarks')
+    parser.add_argument('benchmark', choices=['fetch', 'pipeline', 'bulk', 'expand_df', 'ns', 'monte_carlo'])
+    parser.add_argument('--latency', type=float, default=0.3)
+    parser.add_argument('--throughput', type=float, default=2e6)
+    parser.add_argument('--fixtures', help='recorded responses for the pipeline benchmark')
+    parser.add_argument('--size-gb', type=float, default=1.0, help='uncompressed size of the synthetic bulk file')
+    parser.add_argument('--draws', type=int, default=100000, help='draws of the Monte Carlo benchmark')
+    args = parser.parse_args()
+
+    if args.benchmark == 'fetch':
+        bench_fetch(args.latency, args.throughput)
+    elif args.benchmark == 'pipeline':
+        bench_pipeline(args.latency, args.throughput, args.fixtures)
+    elif args.benchmark == 'bulk':
+        bench_bulk(args.size_gb)
+    elif args.benchmark == 'expand_df':
+        bench_expand_df()
+    elif args.benchmark == 'ns':
+        bench_ns()
+    elif args.benchmark == 'monte_carlo':
+        bench_monte_carlo(args.draws)
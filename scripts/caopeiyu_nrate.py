@@ -1,77 +1,143 @@
 import os
+import re
+import json
 import numpy as np
-from shapely.geometry import mapping
-import rioxarray as rxr
 import geopandas as gpd
-import rasterio
-from rasterstats import zonal_stats
 import pandas as pd
 
-def nrate_original(parent_dir):
+current_file_path = os.path.abspath(__file__)
+current_directory = os.path.dirname(current_file_path)
+os.chdir(current_directory)
+from zonal import raster_zonal_means
+
+# County x year CN cache of nrate() (override with NRATE_CACHE_DIR)
+NRATE_CACHE_DIR = os.getenv('NRATE_CACHE_DIR', os.path.join(current_directory, '../datasets/nrate_cache'))
+
+def fertilizer_rasters(directory, first_year=1968):
     """
-    Process original nitrogen fertilizer data from rasters to points and aggregate to counties.
+    Yearly national N fertilizer rasters of a directory, with the year read from each file name.
+
+    Parameters:
+    - directory (str): Directory with the .tif maps.
+    - first_year (int): Earliest year to keep.
+
+    Returns:
+    - rasters (list): (year, path) tuples sorted by year.
+    """
+    rasters = []
+    for file in os.listdir(directory):
+        years = re.findall(r'(?<!\d)(1[89]\d\d|20\d\d)(?!\d)', file)
+        if "N fertilizer data" in file or not file.endswith(".tif") or not years:
+            continue
+        if int(years[-1]) >= first_year:
+            rasters.append((int(years[-1]), os.path.join(directory, file)))
+    return sorted(rasters)
+
+def nrate_original(parent_dir, first_year=1968, coverage=False, max_workers=None, verbose=False):
+    """
+    Process original nitrogen fertilizer data from rasters and aggregate to counties.
+
+    The counties are rasterized once per raster grid and the county means of every year are computed from
+    that (see zonal.py), without clipped intermediate rasters.
     
     Parameters:
     - parent_dir (str): Directory path containing the dataset files.
+    - first_year (int): Earliest year to process.
+    - coverage (bool): Weight pixels by the share of their area inside each county instead of counting the
+      pixels whose centre is in the county (the rasterstats.zonal_stats default used previously).
+    - max_workers (int): Worker processes reading the yearly rasters; 1 runs in the calling process.
+    - verbose (bool): Print the time taken by each year.
     """
     dir_name1 = os.path.join(parent_dir, "N fertilizer maps US from 2022")
-    files = os.listdir(dir_name1)
-
-    # Filter files: select only .tif files for years >= 1968
-    files = [x for x in files if "N fertilizer data" not in x and x.endswith(".tif")]
-    y = [str(i) for i in range(1900, 1968)]
-    for year in y:
-        files = [x for x in files if year not in x]
+    rasters = fertilizer_rasters(dir_name1, first_year)
 
     # Get boundary data
     file_boundary = os.path.join(parent_dir, "Iowa Counties", 'IowaCounties.shp')
+    iowa = gpd.read_file(file_boundary)
+    iowa_utm = iowa.to_crs(epsg=26915)
+
+    means = raster_zonal_means([path for _, path in rasters], iowa, coverage=coverage, max_workers=max_workers, verbose=verbose)
 
-    for idx, file in enumerate(files):
-        iowa = gpd.read_file(file_boundary)
-        year = 1968 + idx
-        f = os.path.join(dir_name1, file)
-
-        # Open and clip raster
-        fertilizer_im = rxr.open_rasterio(f, masked=True).squeeze()
-        nrate_clipped = fertilizer_im.rio.clip(iowa.geometry.apply(mapping), iowa.crs)
-
-        # Export clipped raster
-        path_to_tif_file = os.path.join(dir_name1, 'N fertilizer data_Iowa', file)
-        nrate_clipped.rio.to_raster(path_to_tif_file)
-
-        # Convert raster to points
-        with rasterio.open(path_to_tif_file) as src:
-            data = src.read(1, masked=True)
-            if not data.mask.all():
-                meta = src.meta
-                points = np.where(data.mask == False)
-                if len(points) == 1:
-                    lon, lat = src.xy(points[0], np.zeros_like(points[0]))
-                else:
-                    lon, lat = src.xy(points[0], points[1])
-                df = pd.DataFrame({'Longitude': lon, 'Latitude': lat})
-                geometry = gpd.points_from_xy(df.Longitude, df.Latitude)
-                crs = src.crs
-                point_gdf = gpd.GeoDataFrame(df, crs=crs, geometry=geometry)
-        
-        iowa1 = iowa.to_crs(fertilizer_im.rio.crs)
-        stats = zonal_stats(iowa1, path_to_tif_file, stats='mean', nodata=-999)
-        mean_vals = [feature['mean'] for feature in stats]
-        iowa['CN_lb/ac'] = mean_vals
-        iowa['date'] = year
-
-        iowa_utm = iowa.to_crs(epsg=26915)
-        iowa = iowa.drop(['FID', 'PERIMETER', 'DOMCountyI', 'FIPS', 'FIPS_INT', 'SHAPE_Leng', 'SHAPE_Area'], axis=1)
+    for (year, _), mean_vals in zip(rasters, means):
+        iowa_utm['CN_lb/ac'] = mean_vals
+        iowa_utm['date'] = year
 
         path_to_geojson_file = os.path.join(parent_dir, 'N fertilizer data_Iowa', f"Nrate_{year}.geojson")
         iowa_utm.to_file(path_to_geojson_file)
 
-def nrate(current_directory):
+def _nrate_manifest(filepaths):
+    """
+    Name, size and modification time of every yearly file; the cache is rebuilt when any of them changes.
+    """
+    return json.dumps([[os.path.basename(path), os.stat(path).st_size, os.stat(path).st_mtime_ns] for path in filepaths])
+
+def _read_nrate_files(filepaths):
+    """
+    Read the yearly GeoJSON files into the county x year CN table and one geometry per county.
+
+    Returns:
+    - table (DataFrame): CountyName, State, CN_lb/ac and Year, in file order.
+    - geometry (GeoSeries): County polygons indexed by CountyName, from the first file.
+    """
+    # Every yearly file is written by nrate_original from the same county boundaries; keep one copy of them
+    gdfs = [gpd.read_file(filepaths[0])] + [gpd.read_file(filepath, ignore_geometry=True) for filepath in filepaths[1:]]
+    geometry = gdfs[0].set_index('CountyName').geometry
+
+    nrate_gdf = pd.concat([pd.DataFrame(gdf.drop(columns='geometry', errors='ignore')) for gdf in gdfs], ignore_index=True)
+
+    nrate_gdf['date'] = pd.to_datetime(nrate_gdf['date'], format='%Y')
+    nrate_gdf['Year'] = nrate_gdf['date'].dt.year
+
+    nrate_gdf = nrate_gdf.drop(['FID', 'PERIMETER', 'DOMCountyI', 'FIPS', 'FIPS_INT', 'SHAPE_Leng', 'SHAPE_Area', 'date'], axis=1)
+    nrate_gdf.rename(columns={"StateAbbr": "State"}, inplace=True)
+    nrate_gdf['CountyName'] = nrate_gdf['CountyName'].replace('Obrien', "O BRIEN")
+    nrate_gdf['CountyName'] = nrate_gdf['CountyName'].str.upper()
+
+    geometry.index = geometry.index.str.replace('Obrien', 'O BRIEN').str.upper()
+    return nrate_gdf, geometry
+
+def _save_nrate_cache(path, manifest, table, geometry):
+    """
+    Write the CN table as column arrays and the county polygons as hex WKB, through a temporary file.
+    """
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = f'{path}.{os.getpid()}.tmp.npz'
+    np.savez(tmp_path, manifest=np.array(manifest), columns=np.array(table.columns, dtype=str),
+             **{f'column_{i}': table[column].to_numpy(dtype=str if table[column].dtype == object else None)
+                for i, column in enumerate(table.columns)},
+             geometry_names=geometry.index.to_numpy(dtype=str), geometry_wkb=np.array(geometry.to_wkb(hex=True), dtype=str),
+             crs=np.array(geometry.crs.to_wkt() if geometry.crs else ''))
+    os.replace(tmp_path, path)
+
+def _load_nrate_cache(path, manifest):
+    """
+    Table and geometry stored by _save_nrate_cache, or None when missing or built from other files.
+    """
+    if not os.path.exists(path):
+        return None
+    with np.load(path) as cached:
+        if str(cached['manifest']) != manifest:
+            return None
+        columns = [str(column) for column in cached['columns']]
+        table = pd.DataFrame({column: cached[f'column_{i}'] for i, column in enumerate(columns)})
+        for column in columns:
+            if table[column].dtype.kind == 'U':
+                table[column] = table[column].astype(object)
+        crs = str(cached['crs']) or None
+        geometry = gpd.GeoSeries.from_wkb(cached['geometry_wkb'], index=cached['geometry_names'].astype(object), crs=crs)
+    return table, geometry
+
+def nrate(current_directory, with_geometry=True, cache_dir=NRATE_CACHE_DIR):
     """
     Aggregate individual GeoJSON files into a single temporal series GeoDataFrame.
+
+    The county x year table is cached as column arrays with a single copy of the county polygons, and only
+    rebuilt from the GeoJSON files when one of them is added, removed or modified.
     
     Parameters:
     - current_directory (str): Directory path containing the script files.
+    - with_geometry (bool): Attach the county polygons; without them a plain DataFrame is returned.
+    - cache_dir (str): Cache directory, None always reads the GeoJSON files.
     
     Returns:
     - nrate_gdf (GeoDataFrame): Aggregated GeoDataFrame with nitrogen rate data.
@@ -81,19 +147,21 @@ def nrate(current_directory):
     # nrate_original(parent_dir=parent_dir)
 
     dir_name2 = os.path.join(parent_dir, "N fertilizer data_Iowa")
-    files = [x for x in os.listdir(dir_name2) if x.endswith(".geojson")]
-
+    files = sorted(x for x in os.listdir(dir_name2) if x.endswith(".geojson"))
     filepaths = [os.path.join(dir_name2, file) for file in files]
-    gdfs = [gpd.read_file(filepath) for filepath in filepaths]
-
-    nrate_gdf = pd.concat(gdfs, ignore_index=True)
-
-    nrate_gdf['date'] = pd.to_datetime(nrate_gdf['date'], format='%Y')
-    nrate_gdf['Year'] = nrate_gdf['date'].dt.year
-
-    nrate_gdf = nrate_gdf.drop(['FID', 'PERIMETER', 'DOMCountyI', 'FIPS', 'FIPS_INT', 'SHAPE_Leng', 'SHAPE_Area', 'date'], axis=1)
-    nrate_gdf.rename(columns={"StateAbbr": "State"}, inplace=True)
-    nrate_gdf['CountyName'] = nrate_gdf['CountyName'].replace('Obrien', "O BRIEN")
-    nrate_gdf['CountyName'] = nrate_gdf['CountyName'].str.upper()
 
-    return nrate_gdf
\ No newline at end of file
+    manifest = _nrate_manifest(filepaths)
+    cache_path = os.path.join(cache_dir, 'nrate.npz') if cache_dir else None
+    cached = _load_nrate_cache(cache_path, manifest) if cache_path else None
+    if cached is None:
+        cached = _read_nrate_files(filepaths)
+        if cache_path:
+            _save_nrate_cache(cache_path, manifest, *cached)
+            cached = _load_nrate_cache(cache_path, manifest)
+    nrate_gdf, geometry = cached
+
+    if not with_geometry:
+        return nrate_gdf
+    # Geometry sits before Year, where the concatenated GeoJSON files had it
+    nrate_gdf.insert(nrate_gdf.columns.get_loc('Year'), 'geometry', geometry.reindex(nrate_gdf['CountyName']).to_numpy())
+    return gpd.GeoDataFrame(nrate_gdf, geometry='geometry', crs=geometry.crs)
@@ -0,0 +1,240 @@
+import os
+import numpy as np
+import pandas as pd
+from concurrent.futures import ProcessPoolExecutor
+
+current_file_path = os.path.abspath(__file__)
+current_directory = os.path.dirname(current_file_path)
+os.chdir(current_directory)
+from gap_filling import panel_matrix, fill_gaps, ffill_rows
+from validation_functions import reconcile_proportional
+
+"""
+Leave-out cross-validation of the gap filling in validation_functions.interpolation (crops) and
+refine_animal_data (animals).
+
+Known county-year values are hidden, the panel is refilled with the same steps as the pipeline, and the
+refilled values are compared with the hidden ones. Replicates are stacked as extra rows of the county x
+year matrices so that a whole batch is filled in one call; batches run in a process pool whose workers
+receive the panel once, when they start.
+
+    errors = cross_validate(crop_df, CROP_VALIDATION, kind='crop', n_replicates=2000)
+    summarize(errors)
+"""
+
+# Worker state, set once per process by _init_worker
+_PANEL = None
+
+def mask_cells(known, n_replicates, fraction=0.1, structure='random', block=3, rng=None):
+    """
+    Draw the known cells to hide in each replicate.
+
+    Structures:
+    - 'random': every known cell is hidden independently with probability fraction.
+    - 'block': runs of block consecutive years are hidden within a county, covering about fraction of its years.
+    - 'year': whole years are hidden for all counties at once, like a missing survey year.
+
+    Parameters:
+    - known (ndarray): Boolean array (variables x counties x years) of the known cells.
+    - n_replicates (int): Number of masks to draw.
+    - fraction (float): Share of cells to hide.
+    - structure (str): 'random', 'block' or 'year'.
+    - block (int): Length of the hidden runs for the 'block' structure.
+    - rng (Generator): Random generator.
+
+    Returns:
+    - hidden (ndarray): Boolean array (replicates x variables x counties x years), a subset of known.
+    """
+    rng = np.random.default_rng(rng)
+    shape = (n_replicates,) + known.shape
+    if structure == 'random':
+        hidden = rng.random(shape) < fraction
+    elif structure == 'block':
+        starts = rng.random(shape) < fraction / block
+        # A hidden run covers its start year and the block - 1 years after it
+        hidden = starts.copy()
+        for offset in range(1, block):
+            hidden[..., offset:] |= starts[..., :-offset]
+    elif structure == 'year':
+        hidden = np.broadcast_to(rng.random(shape[:2] + (1, shape[-1])) < fraction, shape)
+    else:
+        raise ValueError(f'Unknown mask structure {structure!r}')
+    return hidden & known
+
+def _column_fill(values, backward=False):
+    """
+    Forward (or backward) fill each replicate and variable down its flattened county x year column,
+    like DataFrame.ffill on a panel sorted by county and year.
+    """
+    flat = values.reshape(-1, values.shape[-2] * values.shape[-1]).T
+    if backward:
+        return ffill_rows(flat[::-1])[::-1].T.reshape(values.shape)
+    return ffill_rows(flat).T.reshape(values.shape)
+
+def refill(matrices, times, hidden, kind, methods='linear', state=None):
+    """
+    Refill a batch of masked panels with the gap-filling steps of the pipeline.
+
+    For kind='crop' these are the steps of validation_functions.interpolation: fill, round the filled gaps,
+    set negative values to zero and forward fill zeros down each column. For kind='animal' they are those of
+    refine_animal_data: fill with the last known year held, round, forward and backward fill down each column,
+    then share the state totals among the gaps with reconcile_proportional when state is given.
+
+    Parameters:
+    - matrices (ndarray): Panel values (variables x counties x years), NaN where missing.
+    - times (ndarray): Sorted years of the matrix columns.
+    - hidden (ndarray): Boolean array (replicates x variables x counties x years) of the cells to hide.
+    - kind (str): 'crop' or 'animal'.
+    - methods (list): Gap-filling method of each variable (see gap_filling.fill_gaps).
+    - state (ndarray): State totals (variables x years), NaN where missing; animals only.
+
+    Returns:
+    - values (ndarray): Refilled values, same shape as hidden.
+    """
+    n_replicates, n_variables, n_counties, n_years = hidden.shape
+    masked = np.where(hidden, np.nan, matrices[None])
+    missing = np.isnan(masked)
+    extrapolate = 'linear' if kind == 'crop' else 'forward'
+
+    filled = np.empty_like(masked)
+    for method in dict.fromkeys(methods):
+        selected = [i for i, m in enumerate(methods) if m == method]
+        stacked = masked[:, selected].reshape(-1, n_years)
+        filled[:, selected] = fill_gaps(stacked, times, method, extrapolate).reshape(n_replicates, len(selected), n_counties, n_years)
+
+    if kind == 'crop':
+        values = np.where(missing, np.round(filled), masked)
+        values = np.where(values < 0, 0, values)
+        return _column_fill(np.where(values == 0, np.nan, values))
+
+    values = _column_fill(_column_fill(np.round(filled)), backward=True)
+    if state is None:
+        return values
+
+    # One reconciliation for the whole batch: every (replicate, year) pair is its own year group
+    long_values = values.transpose(0, 2, 3, 1).reshape(-1, n_variables)
+    groups = np.broadcast_to(np.arange(n_replicates)[:, None, None] * n_years + np.arange(n_years), (n_replicates, n_counties, n_years))
+    columns = list(range(n_variables))
+    df = pd.DataFrame(long_values, columns=columns)
+    df['Year'] = groups.ravel()
+    val_df = pd.DataFrame(np.tile(state.T, (n_replicates, 1)), columns=columns)
+    val_df['Year'] = np.arange(n_replicates * n_years)
+    interpolated = missing.transpose(0, 2, 3, 1).reshape(-1, n_variables)
+    reconciled = reconcile_proportional(df, val_df, columns, interpolated)
+    return reconciled.reshape(n_replicates, n_counties, n_years, n_variables).transpose(0, 3, 1, 2)
+
+def replicate_errors(matrices, refilled, hidden, variables, first_replicate=0):
+    """
+    Error metrics of the refilled values at the hidden cells, per replicate and variable.
+
+    Parameters:
+    - matrices (ndarray): True panel values (variables x counties x years).
+    - refilled (ndarray): Refilled values (replicates x variables x counties x years).
+    - hidden (ndarray): Boolean array of the hidden cells, same shape as refilled.
+    - variables (list): Variable names.
+    - first_replicate (int): Number of the first replicate of the batch.
+
+    Returns:
+    - errors (DataFrame): One row per replicate and variable with n, mae, rmse, bias and mape.
+    """
+    error = np.where(hidden, refilled - matrices[None], 0)
+    error = np.nan_to_num(error)
+    scored = hidden & ~np.isnan(refilled)
+    n = scored.sum(axis=(2, 3))
+    relative = np.where(scored & (matrices[None] > 0), np.abs(error) / np.where(matrices[None] > 0, matrices[None], 1), 0)
+    n_positive = (scored & (matrices[None] > 0)).sum(axis=(2, 3))
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        metrics = {
+            'n': n,
+            'mae': np.abs(error).sum(axis=(2, 3)) / n,
+            'rmse': np.sqrt((error ** 2).sum(axis=(2, 3)) / n),
+            'bias': error.sum(axis=(2, 3)) / n,
+            'mape': relative.sum(axis=(2, 3)) / n_positive,
+        }
+    n_replicates = hidden.shape[0]
+    errors = pd.DataFrame({name: values.ravel() for name, values in metrics.items()})
+    errors.insert(0, 'variable', np.tile(variables, n_replicates))
+    errors.insert(0, 'replicate', np.repeat(np.arange(first_replicate, first_replicate + n_replicates), len(variables)))
+    return errors
+
+def _init_worker(panel):
+    global _PANEL
+    _PANEL = panel
+
+def _run_batch(first_replicate, n_replicates, seed):
+    """
+    Draw, refill and score one batch of replicates against the panel of the worker.
+    """
+    panel = _PANEL
+    hidden = mask_cells(panel['known'], n_replicates, panel['fraction'], panel['structure'], panel['block'],
+                        np.random.default_rng(seed))
+    refilled = refill(panel['matrices'], panel['times'], hidden, panel['kind'], panel['methods'], panel['state'])
+    return replicate_errors(panel['matrices'], refilled, hidden, panel['variables'], first_replicate)
+
+def cross_validate(df, variables, kind='crop', val_df=None, methods='linear', n_replicates=1000, fraction=0.1,
+                   structure='random', block=3, batch_size=20, max_workers=None, seed=0):
+    """
+    Hide known county-year values, refill them with the pipeline's gap filling and measure the errors.
+
+    Parameters:
+    - df (DataFrame): County x year panel as produced by expand_df (CountyName, Year and the variables).
+    - variables (list): Columns to validate.
+    - kind (str): 'crop' for the steps of interpolation, 'animal' for those of refine_animal_data.
+    - val_df (DataFrame): State totals per Year for the animal reconciliation (e.g. ap()); optional.
+    - methods (str or dict): Gap-filling method, or a dict giving one per variable.
+    - n_replicates (int): Number of masks.
+    - fraction (float): Share of known values hidden per mask.
+    - structure (str): Mask structure, see mask_cells.
+    - block (int): Length of the hidden runs for the 'block' structure.
+    - batch_size (int): Replicates refilled together; bounds memory per worker.
+    - max_workers (int): Worker processes; 1 runs in the calling process.
+    - seed (int): Random seed; results do not depend on max_workers or batch order.
+
+    Returns:
+    - errors (DataFrame): One row per replicate and variable with n, mae, rmse, bias and mape.
+    """
+    if kind not in ('crop', 'animal'):
+        raise ValueError(f'Unknown kind {kind!r}, expected crop or animal')
+    variables = list(variables)
+    df = df.sort_values(['CountyName', 'Year'])
+    matrices, times, _ = panel_matrix(df, variables)
+
+    state = None
+    if kind == 'animal' and val_df is not None:
+        state = val_df.drop_duplicates('Year').set_index('Year').reindex(times.astype(int))
+        state = state.reindex(columns=variables).to_numpy(dtype=float).T
+
+    panel = {
+        'matrices': matrices, 'times': times, 'known': ~np.isnan(matrices), 'state': state,
+        'variables': variables, 'kind': kind, 'fraction': fraction, 'structure': structure, 'block': block,
+        'methods': [methods[variable] for variable in variables] if isinstance(methods, dict) else [methods] * len(variables),
+    }
+    starts = list(range(0, n_replicates, batch_size))
+    sizes = [min(batch_size, n_replicates - start) for start in starts]
+    seeds = np.random.SeedSequence(seed).spawn(len(starts))
+
+    if max_workers == 1:
+        _init_worker(panel)
+        results = list(map(_run_batch, starts, sizes, seeds))
+    else:
+        with ProcessPoolExecutor(max_workers=max_workers, initializer=_init_worker, initargs=(panel,)) as executor:
+            results = list(executor.map(_run_batch, starts, sizes, seeds))
+    return pd.concat(results, ignore_index=True)
+
+def summarize(errors, quantiles=(0.05, 0.25, 0.5, 0.75, 0.95)):
+    """
+    Distribution of the replicate errors of each variable.
+
+    Parameters:
+    - errors (DataFrame): Output of cross_validate.
+    - quantiles (tuple): Quantiles to report.
+
+    Returns:
+    - summary (DataFrame): Mean and quantiles of mae, rmse, bias and mape per variable.
+    """
+    metrics = errors.groupby('variable', sort=False)[['mae', 'rmse', 'bias', 'mape']]
+    summary = metrics.quantile(list(quantiles)).unstack()
+    summary.columns = [f'{metric}_q{int(q * 100):02d}' for metric, q in summary.columns]
+    means = metrics.mean().add_suffix('_mean')
+    return pd.concat([means, summary], axis=1)
@@ -0,0 +1,226 @@
+import numpy as np
+import pandas as pd
+from scipy.interpolate import CubicSpline, PchipInterpolator
+
+# Interior gap-filling methods and rules for the gaps before the first / after the last known point
+METHODS = ('linear', 'pchip', 'spline', 'nearest')
+EXTRAPOLATIONS = ('linear', 'hold', 'forward', None)
+
+def panel_matrix(df, columns, row_column='CountyName', time_column='Year'):
+    """
+    Lay out value columns of a long panel as dense row x time matrices.
+
+    Parameters:
+    - df (DataFrame): Panel with one row per (row_column, time_column) pair.
+    - columns (list): Value columns to lay out.
+    - row_column (str): Column identifying a series, e.g. the county.
+    - time_column (str): Column with the time of each observation.
+
+    Returns:
+    - matrices (ndarray): Array of shape (len(columns), n_rows, n_times); cells absent from df are NaN.
+    - times (ndarray): Sorted float times of the matrix columns.
+    - cells (tuple): (row, time) positions of the rows of df in the matrices.
+    """
+    row_codes, row_names = pd.factorize(df[row_column])
+    time_codes, times = pd.factorize(df[time_column].astype(float), sort=True)
+    matrices = np.full((len(columns), len(row_names), len(times)), np.nan)
+    matrices[:, row_codes, time_codes] = df[columns].to_numpy(dtype=float).T
+    return matrices, np.asarray(times, dtype=float), (row_codes, time_codes)
+
+def _known_neighbours(known):
+    """
+    For every cell, the matrix positions of the two known points that interp1d would use for it:
+    the previous and next known points inside the range, the first two before it and the last two after it.
+    Rows with fewer than two known points get -1.
+    """
+    n_known = known.sum(axis=1, keepdims=True)
+    # Known positions of each row first, in time order
+    order = np.argsort(~known, axis=1, kind='stable')
+    hi = np.clip(np.cumsum(known, axis=1) - known, 1, np.maximum(n_known - 1, 1))
+    lo = hi - 1
+    lo_pos = np.take_along_axis(order, lo, axis=1)
+    hi_pos = np.take_along_axis(order, hi, axis=1)
+    enough = n_known >= 2
+    return np.where(enough, lo_pos, -1), np.where(enough, hi_pos, -1)
+
+def fill_linear(matrix, times):
+    """
+    Fill the gaps of every row by linear interpolation between its known points, extrapolating
+    linearly from the first and last two known points.
+
+    Gives the same values as scipy.interpolate.interp1d(kind='linear', fill_value='extrapolate')
+    fitted row by row on the known points. Rows with fewer than two known points are left as they are.
+
+    Parameters:
+    - matrix (ndarray): Values of shape (n_rows, n_times) with NaN gaps.
+    - times (ndarray): Sorted times of the columns.
+
+    Returns:
+    - filled (ndarray): Copy of matrix with the gaps filled.
+    """
+    known = ~np.isnan(matrix)
+    lo, hi = _known_neighbours(known)
+    rows, cols = np.nonzero(~known & (lo >= 0))
+    lo, hi = lo[rows, cols], hi[rows, cols]
+
+    x_lo, x_hi = times[lo], times[hi]
+    y_lo, y_hi = matrix[rows, lo], matrix[rows, hi]
+    slope = (y_hi - y_lo) / (x_hi - x_lo)
+
+    filled = matrix.copy()
+    filled[rows, cols] = slope * (times[cols] - x_lo) + y_lo
+    return filled
+
+def ffill_rows(values):
+    """
+    Forward-fill NaN down the first axis of a 2-D array, like DataFrame.ffill on its columns.
+    """
+    valid = ~np.isnan(values)
+    source = np.where(valid, np.arange(len(values))[:, None], 0)
+    np.maximum.accumulate(source, axis=0, out=source)
+    return np.take_along_axis(values, source, axis=0)
+
+def _fill_nearest(matrix, times):
+    """
+    Fill every gap between two known points with the nearer of them in time (the earlier one on ties).
+    """
+    known = ~np.isnan(matrix)
+    lo, hi = _known_neighbours(known)
+    rows, cols = np.nonzero(~known & (lo >= 0))
+    lo, hi = lo[rows, cols], hi[rows, cols]
+    nearest = np.where(times[cols] - times[lo] <= times[hi] - times[cols], lo, hi)
+
+    filled = matrix.copy()
+    filled[rows, cols] = matrix[rows, nearest]
+    return filled
+
+def _fill_piecewise(matrix, times, interpolator):
+    """
+    Fill gaps with a scipy piecewise polynomial fitted to the known points.
+
+    Rows that share the same pattern of known points are fitted in one call, along axis 1.
+    """
+    known = ~np.isnan(matrix)
+    filled = matrix.copy()
+    patterns, pattern_of_row = np.unique(known, axis=0, return_inverse=True)
+    for pattern_id, pattern in enumerate(patterns):
+        if pattern.sum() < 2 or pattern.all():
+            continue
+        rows = np.flatnonzero(pattern_of_row.ravel() == pattern_id)
+        fitted = interpolator(times[pattern], matrix[np.ix_(rows, pattern)], axis=1)
+        filled[np.ix_(rows, ~pattern)] = fitted(times[~pattern])
+    return filled
+
+def fill_gaps(matrix, times, method='linear', extrapolate='linear'):
+    """
+    Fill the gaps of every row of a matrix with one interpolation method, all rows at once.
+
+    Gaps between the first and last known point of a row are filled with method:
+    - 'linear': straight line between the neighbouring known points.
+    - 'pchip': shape-preserving piecewise cubic (no overshoot between known points).
+    - 'spline': cubic spline with not-a-knot end conditions.
+    - 'nearest': value of the nearer known point in time.
+
+    Gaps before the first or after the last known point follow extrapolate:
+    - 'linear': continue the line through the first or last two known points (as interp1d with
+      fill_value='extrapolate').
+    - 'hold': repeat the first or last known value.
+    - 'forward': repeat the last known value after it and leave the gaps before the first one
+      (as pandas' default interpolate).
+    - None: leave them.
+
+    Interior gaps need at least two known points in the row and linear extrapolation needs two as well;
+    other rows keep those gaps.
+
+    Parameters:
+    - matrix (ndarray): Values of shape (n_rows, n_times) with NaN gaps.
+    - times (ndarray): Sorted times of the columns.
+    - method (str): One of METHODS.
+    - extrapolate (str): One of EXTRAPOLATIONS.
+
+    Returns:
+    - filled (ndarray): Copy of matrix with the gaps filled.
+    """
+    if method not in METHODS:
+        raise ValueError(f'Unknown gap-filling method {method!r}, expected one of {METHODS}')
+    if extrapolate not in EXTRAPOLATIONS:
+        raise ValueError(f'Unknown extrapolation {extrapolate!r}, expected one of {EXTRAPOLATIONS}')
+
+    known = ~np.isnan(matrix)
+    positions = np.arange(matrix.shape[1])
+    first = np.where(known.any(axis=1), known.argmax(axis=1), matrix.shape[1])[:, None]
+    last = np.where(known.any(axis=1), matrix.shape[1] - 1 - known[:, ::-1].argmax(axis=1), -1)[:, None]
+    before, after = positions < first, positions > last
+
+    linear = fill_linear(matrix, times) if 'linear' in (method, extrapolate) else None
+    if method == 'linear':
+        interior = linear
+    elif method == 'nearest':
+        interior = _fill_nearest(matrix, times)
+    else:
+        interior = _fill_piecewise(matrix, times, PchipInterpolator if method == 'pchip' else CubicSpline)
+    filled = np.where(before | after, matrix, interior)
+
+    if extrapolate == 'linear':
+        filled = np.where(before | after, linear, filled)
+    elif extrapolate in ('hold', 'forward'):
+        rows = np.arange(len(matrix))
+        last_value = matrix[rows, np.maximum(last[:, 0], 0)][:, None]
+        filled = np.where(after, last_value, filled)
+        if extrapolate == 'hold':
+            first_value = matrix[rows, np.minimum(first[:, 0], matrix.shape[1] - 1)][:, None]
+            filled = np.where(before, first_value, filled)
+    return filled
+
+def _per_column(option, columns):
+    """
+    Expand a gap-filling option given once or per column (dict) into one value per column.
+    """
+    if isinstance(option, dict):
+        return [option[column] for column in columns]
+    return [option] * len(columns)
+
+def fill_panel(df, columns, method='linear', extrapolate='linear', row_column='CountyName', time_column='Year'):
+    """
+    Fill the missing values of panel columns, all series and columns at once.
+
+    Parameters:
+    - df (DataFrame): Panel with one row per (row_column, time_column) pair.
+    - columns (list): Value columns to fill.
+    - method (str or dict): Gap-filling method (see fill_gaps), or a dict giving one per column.
+    - extrapolate (str or dict): Extrapolation rule (see fill_gaps), or a dict giving one per column.
+    - row_column (str): Column identifying a series, e.g. the county.
+    - time_column (str): Column with the time of each observation.
+
+    Returns:
+    - values (ndarray): Filled values, shape (len(df), len(columns)), aligned with the rows of df.
+    """
+    matrices, times, (row_codes, time_codes) = panel_matrix(df, columns, row_column, time_column)
+    options = list(zip(_per_column(method, columns), _per_column(extrapolate, columns)))
+
+    # Columns sharing a method are filled together: every (column, series) pair is one matrix row
+    filled = np.empty_like(matrices)
+    for option in dict.fromkeys(options):
+        selected = [i for i, o in enumerate(options) if o == option]
+        stacked = matrices[selected].reshape(-1, len(times))
+        filled[selected] = fill_gaps(stacked, times, *option).reshape(len(selected), *matrices.shape[1:])
+    return filled[:, row_codes, time_codes].T
+
+def compare_methods(df, columns, methods=METHODS, extrapolate='linear', row_column='CountyName', time_column='Year'):
+    """
+    Fill the same panel with several gap-filling methods, for side-by-side comparison in one run.
+
+    Parameters:
+    - df (DataFrame): Panel with one row per (row_column, time_column) pair.
+    - columns (list): Value columns to fill.
+    - methods (tuple): Gap-filling methods to compare (see fill_gaps).
+    - extrapolate (str): Extrapolation rule shared by all methods.
+    - row_column (str): Column identifying a series, e.g. the county.
+    - time_column (str): Column with the time of each observation.
+
+    Returns:
+    - filled (DataFrame): Filled values aligned with df, with (method, column) columns.
+    """
+    return pd.concat({method: pd.DataFrame(fill_panel(df, columns, method, extrapolate, row_column, time_column),
+                                           index=df.index, columns=columns)
+                      for method in methods}, axis=1)
@@ -10,9 +10,7 @@ current_directory = os.path.dirname(current_file_path)
 os.chdir(current_directory)
 
 # Import necessary functions and data processing module
-from Ns_functions import (
-    calculate_manure_n, calculate_fix_n, calculate_grain_n, calculate_ns, calculate_manure_n_no_storage_loss,
-)
+from Ns_functions import calculate_n_budget
 from main_processing_code import data_processing
 
 """
@@ -52,23 +50,11 @@ GN = Nitrogen in harvested grain in kg/ha
 # Process the data
 IFEWs = data_processing()
 
-# Calculate CN (Commercial Nitrogen) in kg/ha
-IFEWs['CN'] = round(IFEWs["CN_lb/ac"] * 1.121, 1)
-
-# Calculate MN (Manure Nitrogen) considering storage loss
-IFEWs['MN'] = IFEWs.apply(calculate_manure_n, axis=1)
-
-# Calculate MN_old (Manure Nitrogen) without considering storage loss
-IFEWs['MN_old'] = IFEWs.apply(calculate_manure_n_no_storage_loss, axis=1)
-
-# Calculate FN (Fixation Nitrogen)
-IFEWs['FN'] = IFEWs.apply(calculate_fix_n, axis=1)
-
-# Calculate GN (Grain Nitrogen)
-IFEWs['GN'] = IFEWs.apply(calculate_grain_n, axis=1)
-
-# Calculate Ns (Nitrogen Surplus)
-IFEWs['NS'] = IFEWs.apply(calculate_ns, axis=1)
+# Calculate CN (Commercial Nitrogen), MN (Manure Nitrogen with and without storage loss), FN (Fixation Nitrogen),
+# GN (Grain Nitrogen) and Ns (Nitrogen Surplus) in kg/ha for all rows at once; the row-wise calculate_* functions
+# in Ns_functions give the same values
+budget = calculate_n_budget(IFEWs)
+IFEWs[list(budget.columns)] = budget
 
 # Save the output to a GeoJSON file
 # shp_path = os.path.join(current_directory, "..", "datasets", "Iowa Counties", "Counties.shp")
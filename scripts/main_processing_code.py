@@ -20,13 +20,20 @@ from validation_functions import (
     expand_df, refine_animal_data, interpolation
 )
 from caopeiyu_nrate import nrate
+from spatial_imputation import impute_suppressed
 
-def data_processing():
+def data_processing(spatial=False, reconcile='proportional'):
     """
     Main data processing function to fetch, refine, and merge USDA animal and crop data and nitrogen rate data.
+
+    Parameters:
+    - spatial (bool): Impute suppressed county values from neighbouring counties before the time series gap filling.
+    - reconcile (str): How interpolated animal values are fitted to the state totals, 'proportional' or 'ipf'
+      (see validation_functions.refine_animal_data).
     
     Returns:
-    - IFEWs_base (DataFrame): Merged DataFrame containing refined USDA data and nitrogen rate data.
+    - IFEWs_base (DataFrame): Merged DataFrame containing refined USDA data and nitrogen rate data; its attrs are those
+      of refine_animal_data, with the labels in attrs['interpolated'] mapped to its rows.
     """
     # Fetch USDA data from Parameters
     animal_parameters = [hogs, hogs_others, beef, milk, other_cattle, onfeed_sold, steers]
@@ -56,8 +63,14 @@ def data_processing():
     for col in [col for col in crop_df.columns if col not in ['CountyName', 'Year']]:
         crop_df[col] = pd.to_numeric(crop_df[col])
 
+    # Impute suppressed values from neighbouring counties
+    animal_imputed = None
+    if spatial:
+        animal_df, animal_imputed = impute_suppressed(animal_df, [col for col in animal_df.columns if col not in ['CountyName', 'Year']])
+        crop_df, _ = impute_suppressed(crop_df, [col for col in crop_df.columns if col not in ['CountyName', 'Year']])
+
     # Refine animal and crop data
-    animal_ifews = refine_animal_data(animal_df, animal_val)
+    animal_ifews = refine_animal_data(animal_df, animal_val, imputed=animal_imputed, reconcile=reconcile)
     crops_ifews = interpolation(crop_df)
 
     # Merge USDA data
@@ -69,4 +82,11 @@ def data_processing():
     # Merge USDA data with nitrogen rate data
     IFEWs_base = pd.merge(df_USDA, nrate_gdf, on=['CountyName', 'Year'], how='inner')
 
+    # Merges drop attrs; carry those of the animal data over, with the estimated cells relabelled to the merged rows
+    keys = ['CountyName', 'Year']
+    rows = pd.MultiIndex.from_frame(IFEWs_base[keys])
+    interpolated = {column: IFEWs_base.index[rows.isin(pd.MultiIndex.from_frame(animal_ifews.loc[indices, keys]))].tolist()
+                    for column, indices in animal_ifews.attrs['interpolated'].items()}
+    IFEWs_base.attrs = {**animal_ifews.attrs, 'interpolated': interpolated}
+
     return IFEWs_base
\ No newline at end of file
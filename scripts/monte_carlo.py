@@ -0,0 +1,303 @@
+import os
+import numpy as np
+import pandas as pd
+from concurrent.futures import ProcessPoolExecutor
+
+current_file_path = os.path.abspath(__file__)
+current_directory = os.path.dirname(current_file_path)
+os.chdir(current_directory)
+from Ns_functions import load_coefficients, manure_terms, fix_n, grain_n
+
+"""
+Monte Carlo uncertainty of the county nitrogen surplus.
+
+Animal populations, the commercial nitrogen rate (CN) and the manure excretion coefficients are drawn from
+configurable distributions and the Ns budget (NS = CN + MN + FN - GN) is evaluated in chunks of draws. No draw
+is kept: every county-year accumulates a fixed-bin histogram and running moments of each component, which are
+merged across the worker processes at the end. Memory therefore depends on the number of county-years and
+bins, not on the number of draws.
+
+    bands = ns_uncertainty(IFEWs, n_draws=100000)
+"""
+
+# Multiplicative uncertainty of every input: (distribution, scale), with factors of mean 1.
+# 'normal' and 'uniform' scales are relative (sd and half-width), 'lognormal' is the sd of the log.
+DEFAULT_UNCERTAINTY = {
+    'population': ('lognormal', 0.05),               # reported county animal counts
+    'interpolated_population': ('lognormal', 0.25),  # counts filled by interpolation and reconciliation
+    'CN': ('normal', 0.10),                          # county mean of the nitrogen-rate raster in nrate()
+    'excretion': ('uniform', 0.20),                  # excretion coefficients, shared by all county-years in a draw
+}
+
+QUANTILES = (0.05, 0.25, 0.5, 0.75, 0.95)
+
+# Worker state, set once per process by _init_worker
+_INPUTS = None
+
+def sample_factors(rng, distribution, shape):
+    """
+    Draw multiplicative factors of mean 1.
+
+    Parameters:
+    - rng (Generator): Random generator.
+    - distribution (tuple): (kind, scale) with kind 'normal', 'lognormal', 'uniform' or 'fixed'; scale may be
+      an array broadcasting against shape.
+    - shape (tuple): Shape of the draw.
+
+    Returns:
+    - factors (ndarray): Single-precision factors of the given shape.
+    """
+    kind, scale = distribution
+    # Single precision halves the cost of the draws, which dominate the run time
+    scale = np.asarray(scale, dtype=np.float32)
+    if kind == 'fixed':
+        return np.ones(shape, dtype=np.float32)
+    if kind == 'normal':
+        return 1 + scale * rng.standard_normal(shape, dtype=np.float32)
+    if kind == 'lognormal':
+        return np.exp(scale * rng.standard_normal(shape, dtype=np.float32) - scale ** 2 / 2)
+    if kind == 'uniform':
+        return 1 + scale * (2 * rng.random(shape, dtype=np.float32) - 1)
+    raise ValueError(f'Unknown distribution {kind!r}')
+
+class CellHistogram:
+    """
+    Fixed-bin histograms and running moments of many cells, fed with chunks of draws and mergeable.
+
+    Quantiles are interpolated within bins, so their error is at most one bin width; draws outside the
+    range fall in the edge bins and the exact minimum and maximum are kept for them.
+    """
+
+    def __init__(self, lower, upper, n_bins=256):
+        """
+        Parameters:
+        - lower (ndarray): Lower edge of the range of every cell.
+        - upper (ndarray): Upper edge of the range of every cell.
+        - n_bins (int): Bins per cell.
+        """
+        self.lower = np.asarray(lower, dtype=float)
+        self.width = (np.asarray(upper, dtype=float) - self.lower) / n_bins
+        self.n_bins = n_bins
+        n_cells = len(self.lower)
+        self.counts = np.zeros(n_cells * n_bins, dtype=np.int64)
+        self.n = np.zeros(n_cells, dtype=np.int64)
+        self.total = np.zeros(n_cells)
+        self.total_sq = np.zeros(n_cells)
+        self.minimum = np.full(n_cells, np.inf)
+        self.maximum = np.full(n_cells, -np.inf)
+
+    def add(self, values):
+        """
+        Add a chunk of draws of shape (draws, cells); NaN draws are ignored.
+        """
+        valid = ~np.isnan(values)
+        bins = np.clip(np.floor((values - self.lower) / self.width), 0, self.n_bins - 1)
+        index = (np.arange(values.shape[1]) * self.n_bins + np.where(valid, bins, 0)).astype(np.int64)
+        self.counts += np.bincount(index[valid], minlength=self.counts.size)
+        # Moments about the range start, which keeps the sums of squares well conditioned
+        centered = np.where(valid, values - self.lower, 0)
+        self.n += valid.sum(axis=0)
+        self.total += centered.sum(axis=0)
+        self.total_sq += (centered ** 2).sum(axis=0)
+        self.minimum = np.fmin(self.minimum, np.nanmin(np.where(valid, values, np.inf), axis=0))
+        self.maximum = np.fmax(self.maximum, np.nanmax(np.where(valid, values, -np.inf), axis=0))
+
+    def merge(self, other):
+        """
+        Add the draws of another CellHistogram with the same ranges.
+        """
+        self.counts += other.counts
+        self.n += other.n
+        self.total += other.total
+        self.total_sq += other.total_sq
+        self.minimum = np.fmin(self.minimum, other.minimum)
+        self.maximum = np.fmax(self.maximum, other.maximum)
+        return self
+
+    def mean(self):
+        with np.errstate(divide='ignore', invalid='ignore'):
+            return self.lower + self.total / self.n
+
+    def std(self):
+        with np.errstate(divide='ignore', invalid='ignore'):
+            variance = (self.total_sq - self.total ** 2 / self.n) / (self.n - 1)
+        return np.sqrt(np.maximum(variance, 0))
+
+    def quantiles(self, qs=QUANTILES):
+        """
+        Quantiles of every cell, shape (len(qs), cells).
+        """
+        counts = self.counts.reshape(-1, self.n_bins)
+        cumulative = np.cumsum(counts, axis=1)
+        result = np.full((len(qs), len(self.n)), np.nan)
+        for i, q in enumerate(qs):
+            target = q * self.n
+            # First bin whose cumulative count reaches the target, then linear within it
+            b = np.minimum((cumulative < target[:, None]).sum(axis=1), self.n_bins - 1)
+            before = np.take_along_axis(cumulative, b[:, None], axis=1)[:, 0] - np.take_along_axis(counts, b[:, None], axis=1)[:, 0]
+            inside = np.take_along_axis(counts, b[:, None], axis=1)[:, 0]
+            with np.errstate(divide='ignore', invalid='ignore'):
+                fraction = np.where(inside > 0, (target - before) / inside, 0.5)
+            value = self.lower + (b + fraction) * self.width
+            result[i] = np.where(self.n > 0, np.clip(value, self.minimum, self.maximum), np.nan)
+        return result
+
+def prepare_inputs(df, coefficients=None, interpolated=None):
+    """
+    Arrays of the Ns budget inputs that the draws perturb.
+
+    Parameters:
+    - df (DataFrame): Table with the CN_lb/ac, animal population and crop columns of data_processing.
+    - coefficients (Series): Coefficients from Ns_functions.load_coefficients; the default version when None.
+    - interpolated (DataFrame): Boolean frame marking estimated populations, with any of the manure animal
+      columns; missing columns count as reported. When None, it is built from df.attrs['interpolated'], the
+      index labels of the estimated cells that refine_animal_data records for the NASS types and the groups
+      derived from them, and data_processing maps to its rows; without it all populations count as reported.
+
+    Returns:
+    - inputs (dict): populations (cells x animal groups), rates (kg N/year per head of each group),
+      interpolated mask, area (ha), CN (kg/ha) and FN - GN (kg/ha) of every cell.
+    """
+    coefficients = load_coefficients() if coefficients is None else coefficients
+    terms = manure_terms(coefficients)
+    animals = [animal for animal, _, _ in terms]
+    col = lambda name: df[name].to_numpy(dtype=float)
+
+    mask = np.zeros((len(df), len(animals)), dtype=bool)
+    if interpolated is None and 'interpolated' in df.attrs:
+        interpolated = pd.DataFrame({column: df.index.isin(indices) for column, indices in df.attrs['interpolated'].items()},
+                                    index=df.index)
+    if interpolated is not None:
+        mask = interpolated.reindex(index=df.index, columns=animals, fill_value=False).to_numpy(dtype=bool)
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return {
+            'populations': np.column_stack([col(animal) for animal in animals]),
+            'rates': np.array([excretion * days for _, excretion, days in terms]),
+            'interpolated': mask,
+            'area': 0.404686 * (col('soy_pa') + col('corng_pa')),
+            'CN': col('CN_lb/ac') * 1.121,
+            'FN_GN': fix_n(col, coefficients) - grain_n(col, coefficients),
+        }
+
+def evaluate_draws(inputs, n_draws, rng, uncertainty=DEFAULT_UNCERTAINTY):
+    """
+    Draw the inputs and evaluate the Ns components for one chunk of draws.
+
+    Parameters:
+    - inputs (dict): Output of prepare_inputs.
+    - n_draws (int): Draws in the chunk.
+    - rng (Generator): Random generator.
+    - uncertainty (dict): Distributions of the inputs, see DEFAULT_UNCERTAINTY.
+
+    Returns:
+    - components (dict): CN, MN and NS arrays of shape (draws, cells).
+    """
+    populations, mask = inputs['populations'], inputs['interpolated']
+    shape = (n_draws,) + populations.shape
+
+    reported, estimated = uncertainty['population'], uncertainty['interpolated_population']
+    if reported[0] == estimated[0]:
+        population_factors = sample_factors(rng, (reported[0], np.where(mask, estimated[1], reported[1])), shape)
+    else:
+        population_factors = np.where(mask, sample_factors(rng, estimated, shape), sample_factors(rng, reported, shape))
+    rates = inputs['rates'] * sample_factors(rng, uncertainty['excretion'], (n_draws, len(inputs['rates'])))
+
+    manure = np.einsum('ca,dca,da->dc', populations, population_factors, rates, optimize=True) / inputs['area']
+    commercial = inputs['CN'] * sample_factors(rng, uncertainty['CN'], (n_draws, len(inputs['CN'])))
+    return {'CN': commercial, 'MN': manure, 'NS': commercial + manure + inputs['FN_GN']}
+
+def _init_worker(inputs, uncertainty, ranges, n_bins):
+    global _INPUTS
+    _INPUTS = (inputs, uncertainty, ranges, n_bins)
+
+def _run_draws(n_draws, chunk_size, seed):
+    """
+    Accumulate n_draws draws in chunks into fresh histograms of the worker's ranges.
+    """
+    inputs, uncertainty, ranges, n_bins = _INPUTS
+    rng = np.random.default_rng(seed)
+    histograms = {name: CellHistogram(lower, upper, n_bins) for name, (lower, upper) in ranges.items()}
+    for start in range(0, n_draws, chunk_size):
+        components = evaluate_draws(inputs, min(chunk_size, n_draws - start), rng, uncertainty)
+        for name, histogram in histograms.items():
+            histogram.add(components[name])
+    return histograms
+
+def _merge_results(histograms, results):
+    """
+    Merge the histograms returned by the tasks, one task at a time.
+    """
+    for result in results:
+        for name, histogram in histograms.items():
+            histogram.merge(result[name])
+
+def _ranges(components, widen=1.0):
+    """
+    Per-cell histogram ranges from pilot draws, widened by widen times their spread on both sides.
+    """
+    ranges = {}
+    with np.errstate(invalid='ignore'):
+        for name, values in components.items():
+            low, high = np.nanmin(values, axis=0), np.nanmax(values, axis=0)
+            pad = np.maximum(widen * (high - low), 1e-6 * np.maximum(np.abs(high), 1))
+            ranges[name] = (np.nan_to_num(low - pad), np.nan_to_num(high + pad, nan=1.0))
+    return ranges
+
+def ns_uncertainty(df, n_draws=100000, uncertainty=None, coefficients=None, interpolated=None, quantiles=QUANTILES,
+                   n_bins=256, chunk_size=200, pilot_draws=1000, max_workers=None, seed=0):
+    """
+    Monte Carlo distribution of CN, MN and NS in every county-year.
+
+    Parameters:
+    - df (DataFrame): Table with the CN_lb/ac, animal population and crop columns of data_processing.
+    - n_draws (int): Total number of draws, including the pilot draws.
+    - uncertainty (dict): Distributions overriding entries of DEFAULT_UNCERTAINTY.
+    - coefficients (Series): Coefficients from Ns_functions.load_coefficients; the default version when None.
+    - interpolated (DataFrame): Boolean frame marking estimated populations; from df.attrs['interpolated'] when
+      None, see prepare_inputs.
+    - quantiles (tuple): Quantiles to report.
+    - n_bins (int): Histogram bins per county-year and component; quantile error is at most one bin.
+    - chunk_size (int): Draws evaluated together; bounds memory per worker.
+    - pilot_draws (int): Draws used to set the histogram ranges.
+    - max_workers (int): Worker processes; 1 runs in the calling process.
+    - seed (int): Random seed; results do not depend on max_workers.
+
+    Returns:
+    - bands (DataFrame): Mean, standard deviation and quantiles of each component (e.g. NS_mean, NS_std,
+      NS_q05), aligned with df. Values are not rounded.
+    """
+    uncertainty = {**DEFAULT_UNCERTAINTY, **(uncertainty or {})}
+    inputs = prepare_inputs(df, coefficients, interpolated)
+    pilot_draws = min(pilot_draws, n_draws)
+    seeds = np.random.SeedSequence(seed).spawn(2)
+
+    # Pilot draws fix the ranges and are kept as the first draws
+    pilot = evaluate_draws(inputs, pilot_draws, np.random.default_rng(seeds[0]), uncertainty)
+    ranges = _ranges(pilot)
+    histograms = {name: CellHistogram(lower, upper, n_bins) for name, (lower, upper) in ranges.items()}
+    for name, histogram in histograms.items():
+        histogram.add(pilot[name])
+    del pilot
+
+    # Remaining draws in a fixed number of tasks, so the seeds do not depend on the worker count
+    remaining = n_draws - pilot_draws
+    n_tasks = min(max(remaining // (chunk_size * 10), 1), 64) if remaining else 0
+    sizes = [remaining // n_tasks + (i < remaining % n_tasks) for i in range(n_tasks)]
+    task_seeds = seeds[1].spawn(n_tasks)
+    tasks = (sizes, [chunk_size] * n_tasks, task_seeds)
+    if max_workers == 1:
+        _init_worker(inputs, uncertainty, ranges, n_bins)
+        _merge_results(histograms, map(_run_draws, *tasks))
+    else:
+        with ProcessPoolExecutor(max_workers=max_workers, initializer=_init_worker,
+                                 initargs=(inputs, uncertainty, ranges, n_bins)) as executor:
+            _merge_results(histograms, executor.map(_run_draws, *tasks))
+
+    bands = {}
+    for name, histogram in histograms.items():
+        bands[f'{name}_mean'] = histogram.mean()
+        bands[f'{name}_std'] = histogram.std()
+        for q, values in zip(quantiles, histogram.quantiles(quantiles)):
+            bands[f'{name}_q{round(q * 100):02d}'] = values
+    return pd.DataFrame(bands, index=df.index)
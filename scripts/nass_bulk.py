@@ -0,0 +1,94 @@
+import os
+import time
+import pandas as pd
+
+current_file_path = os.path.abspath(__file__)
+current_directory = os.path.dirname(current_file_path)
+os.chdir(current_directory)
+from USDAQuickStats import QUICKSTATS_COLUMNS, QuickStatsQuery, filter_mask, parse_parameters, parse_value, plan_outputs
+
+"""
+Ingestion of the NASS QuickStats bulk dumps (https://www.nass.usda.gov/datasets/, e.g.
+qs.animals_products_YYYYMMDD.txt.gz) as an alternative to the API for large backfills.
+
+The gzipped tab-delimited file is streamed in chunks, rows are matched against the query strings of
+parameters_usda.py with the same filter semantics as the API, and the matches are written to the
+per-query tables of USDAQuickStats.sync_data_many. Later incremental syncs then only fetch the
+recent years from the API.
+"""
+
+# Bulk files name a few columns differently from the API CSV
+BULK_COLUMN_NAMES = {'value': 'Value', 'cv_%': 'CV (%)'}
+
+def _api_name(column):
+    """
+    API column name of a bulk file column (bulk headers are upper case).
+    """
+    column = column.strip().lower()
+    return BULK_COLUMN_NAMES.get(column, column)
+
+def ingest_bulk(path, parameters_list, stats, columns=QUICKSTATS_COLUMNS, chunksize=500000, verbose=True):
+    """
+    Stream a NASS bulk file and store the rows matching each query as that query's synced table.
+
+    Memory use is bounded by chunksize plus the matched rows, whatever the size of the file.
+
+    QuickStatsQuery objects (parameters_usda.py) are stored as the shared requests and column projection of
+    plan_outputs, which is what USDAQuickStats.get_outputs_many syncs; plain query strings are stored as
+    given, for get_data_many.
+
+    Parameters:
+    - path (str): Bulk file, optionally gzip compressed.
+    - parameters_list (list): Query strings or QuickStatsQuery objects, e.g. from parameters_usda.py.
+    - stats (USDAQuickStats): Client whose store receives the tables.
+    - columns (list): Column projection of the stored tables; must match what the pipeline requests.
+    - chunksize (int): Rows parsed per chunk.
+    - verbose (bool): Print progress.
+
+    Returns:
+    - dfs (list): The stored tables, in the order of parameters_list (of the shared requests for QuickStatsQuery objects).
+    """
+    if parameters_list and all(isinstance(p, QuickStatsQuery) for p in parameters_list):
+        plan, columns = plan_outputs(parameters_list, columns)
+        parameters_list = [request for request, _ in plan]
+
+    filters = [[(name, value) for name, value in parse_parameters(p) if name not in ('key', 'format')]
+               for p in parameters_list]
+
+    # Only parse the projected columns and the columns the filters look at
+    needed = set(columns) | {name.partition('__')[0] for pairs in filters for name, _ in pairs}
+
+    # Cheap pre-filter: fields every query restricts by equality (agg level, state, ...)
+    shared = {}
+    for field in {name for name, _ in filters[0] if '__' not in name}:
+        if all(any(name == field for name, _ in pairs) for pairs in filters):
+            shared[field] = {value.strip() for pairs in filters for name, value in pairs if name == field}
+
+    matches = [[] for _ in parameters_list]
+    rows = 0
+    start = time.perf_counter()
+    reader = pd.read_csv(path, sep='\t', dtype=str, chunksize=chunksize, compression='infer',
+                         usecols=lambda column: _api_name(column) in needed)
+    for chunk in reader:
+        rows += len(chunk)
+        chunk.columns = [_api_name(column) for column in chunk.columns]
+        for field, values in shared.items():
+            chunk = chunk[chunk[field].str.strip().isin(values)]
+        for i, pairs in enumerate(filters):
+            mask = filter_mask(chunk, pairs)
+            if mask.any():
+                matches[i].append(chunk.loc[mask, [c for c in columns if c in chunk.columns]])
+        if verbose:
+            print(f'{rows:,} rows scanned, {sum(len(m) for part in matches for m in part):,} matched '
+                  f'({time.perf_counter() - start:.1f} s)', end='\r')
+    if verbose:
+        print()
+
+    dfs = []
+    for parameters, parts in zip(parameters_list, matches):
+        df = pd.concat(parts, ignore_index=True) if parts else pd.DataFrame(columns=columns)
+        df['year'] = df['year'].astype('int64')
+        if 'Value' in df.columns:
+            df['Value'] = parse_value(df['Value'])
+        dfs.append(stats.save_stored(parameters, df.drop_duplicates(ignore_index=True), columns))
+    return dfs
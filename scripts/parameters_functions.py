@@ -1,37 +1,49 @@
 import os
+import functools
 import pandas as pd
 import numpy as np
 import urllib.parse
 current_file_path = os.path.abspath(__file__)
 current_directory = os.path.dirname(current_file_path)
 os.chdir(current_directory)
-from USDAQuickStats import USDAQuickStats
+from USDAQuickStats import USDAQuickStats, QUICKSTATS_COLUMNS, parse_value
 
 # Initialize USDAQuickStats class with your API key
 stats = USDAQuickStats(os.getenv('API_KEY'))
 
-def ap():
+# State-level validation series; point it at quickstats_server.py for offline runs and benchmarks
+VALIDATION_BASE_URL = os.getenv('VALIDATION_BASE_URL', 'https://api.usda-reports.penguinlabs.net')
+
+# State-level validation series served by VALIDATION_BASE_URL: (variable, query); state_name is added per request
+VALIDATION_SERIES = [
+    ('beef', 'short_desc=CATTLE%2C+COWS%2C+BEEF+-+INVENTORY&year__GE=1968&agg_level_desc=STATE&reference_period_desc=FIRST+OF+JAN'),
+    ('milk', 'short_desc=CATTLE%2C+COWS%2C+MILK+-+INVENTORY&year__GE=1968&agg_level_desc=STATE&reference_period_desc=FIRST+OF+JAN'),
+    ('cattle', 'short_desc=CATTLE%2C+INCL+CALVES+-+INVENTORY&year__GE=1968&agg_level_desc=STATE&reference_period_desc=FIRST+OF+JAN'),
+    ('hogs', 'short_desc=HOGS+-+INVENTORY&year__GE=1968&agg_level_desc=STATE&reference_period_desc=FIRST+OF+DEC'),
+    ('hogs_breeding', 'short_desc=HOGS,+BREEDING+-+INVENTORY&year__GE=1968&agg_level_desc=STATE&reference_period_desc=FIRST+OF+DEC'),
+    ('hogs_sales', 'short_desc=HOGS+-+SALES,+MEASURED+IN+HEAD&year__GE=1968&agg_level_desc=STATE&reference_period_desc=YEAR'),
+    ('corng_y', 'short_desc=CORN%2C+GRAIN+-+YIELD%2C+MEASURED+IN+BU+%2F+ACRE&year__GE=1968&agg_level_desc=STATE'),
+    ('corng_ha', 'short_desc=CORN%2C+GRAIN+-+ACRES+HARVESTED&year__GE=1968&agg_level_desc=STATE'),
+    ('corng_pa', 'short_desc=CORN+-+ACRES+PLANTED&year__GE=1968&agg_level_desc=STATE'),
+    ('soy_y', 'short_desc=SOYBEANS+-+YIELD%2C+MEASURED+IN+BU+%2F+ACRE&year__GE=1968&agg_level_desc=STATE'),
+    ('soy_ha', 'short_desc=SOYBEANS+-+ACRES+HARVESTED&year__GE=1968&agg_level_desc=STATE'),
+    ('soy_pa', 'short_desc=SOYBEANS+-+ACRES+PLANTED&year__GE=1968&agg_level_desc=STATE'),
+]
+
+# Cattle on feed series, taken from one state-level QuickStats query: variable -> short_desc
+ON_FEED_SERIES = {
+    'steers': 'CATTLE, ON FEED - INVENTORY',
+    'onfeed_sold': 'CATTLE, ON FEED - SALES FOR SLAUGHTER, MEASURED IN HEAD',
+}
+
+ANIMAL_VALIDATION = ['beef', 'milk', 'cattle', 'steers', 'onfeed_sold', 'hogs', 'hogs_breeding', 'hogs_sales']
+CROP_VALIDATION = ['corng_y', 'corng_ha', 'corng_pa', 'soy_y', 'soy_ha', 'soy_pa']
+
+def on_feed_query(state_name='IOWA'):
     """
-    Fetch and process animal population data for the State of Iowa.
-    
-    Returns:
-    - merged_data (DataFrame): A pandas DataFrame containing processed animal population data.
+    QuickStats query for the state-level cattle on feed series of ON_FEED_SERIES.
     """
-    # Fetch cattle data
-    ap_cbval = pd.read_csv('https://api.usda-reports.penguinlabs.net/data.csv?short_desc=CATTLE%2C+COWS%2C+BEEF+-+INVENTORY&year__GE=1968&agg_level_desc=STATE&reference_period_desc=FIRST+OF+JAN')
-    ap_cbval = ap_cbval[ap_cbval['state_name'] == 'IOWA'][['Value', 'year']]
-    ap_cbval.rename(columns={'Value': 'beef'}, inplace=True)
-    
-    ap_cmval = pd.read_csv('https://api.usda-reports.penguinlabs.net/data.csv?short_desc=CATTLE%2C+COWS%2C+MILK+-+INVENTORY&year__GE=1968&agg_level_desc=STATE&reference_period_desc=FIRST+OF+JAN')
-    ap_cmval = ap_cmval[ap_cmval['state_name'] == 'IOWA'][['Value', 'year']]
-    ap_cmval.rename(columns={'Value': 'milk'}, inplace=True)
-    
-    ap_cicval = pd.read_csv('https://api.usda-reports.penguinlabs.net/data.csv?short_desc=CATTLE%2C+INCL+CALVES+-+INVENTORY&year__GE=1968&agg_level_desc=STATE&reference_period_desc=FIRST+OF+JAN')
-    ap_cicval = ap_cicval[ap_cicval['state_name'] == 'IOWA'][['Value', 'year']]
-    ap_cicval.rename(columns={'Value': 'cattle'}, inplace=True)
-
-    # Fetch on feed data
-    on_feed_s = (
+    return (
         urllib.parse.quote('sector_desc=ANIMALS & PRODUCTS') + \
                 '&group_desc=LIVESTOCK' + \
                 '&commodity_desc=CATTLE' + \
@@ -40,48 +52,66 @@ def ap():
                 '&unit_desc=HEAD' + \
                 '&year__GE=1968' + \
                 '&agg_level_desc=STATE' + \
-                '&state_name=IOWA' + \
+                '&state_name=' + urllib.parse.quote(state_name) + \
                 '&format=CSV'
     )
-    
-    df = stats.get_data(on_feed_s)
 
-    # Process cattle steers data
-    ap_csval = df[(df['short_desc'] == 'CATTLE, ON FEED - INVENTORY') & (df['domain_desc'] == 'TOTAL')][['Value', 'year']]
-    ap_csval.rename(columns={'Value': 'steers'}, inplace=True)
+def validation_data(state_name='IOWA'):
+    """
+    Fetch the state-level validation series of one state as a single long table.
 
-    # Process cattle for sale data
-    ap_sval = df[(df['short_desc'] == 'CATTLE, ON FEED - SALES FOR SLAUGHTER, MEASURED IN HEAD') & (df['domain_desc'] == 'TOTAL')][['Value', 'year']]
-    ap_sval.rename(columns={'Value': 'onfeed_sold'}, inplace=True)
-    
-    # Fetch hogs data
-    ap_hval = pd.read_csv('https://api.usda-reports.penguinlabs.net/data.csv?short_desc=HOGS+-+INVENTORY&year__GE=1968&agg_level_desc=STATE&reference_period_desc=FIRST+OF+DEC')
-    ap_hval = ap_hval[ap_hval['state_name'] == 'IOWA'][['Value', 'year']]
-    ap_hval.rename(columns={'Value': 'hogs'}, inplace=True)
-    
-    ap_hbval = pd.read_csv('https://api.usda-reports.penguinlabs.net/data.csv?short_desc=HOGS,+BREEDING+-+INVENTORY&year__GE=1968&agg_level_desc=STATE&reference_period_desc=FIRST+OF+DEC')
-    ap_hbval = ap_hbval[ap_hbval['state_name'] == 'IOWA'][['Value', 'year']]
-    ap_hbval.rename(columns={'Value': 'hogs_breeding'}, inplace=True)
-    
-    ap_hsval = pd.read_csv('https://api.usda-reports.penguinlabs.net/data.csv?short_desc=HOGS+-+SALES,+MEASURED+IN+HEAD&year__GE=1968&agg_level_desc=STATE&reference_period_desc=YEAR')
-    ap_hsval = ap_hsval[ap_hsval['state_name'] == 'IOWA'][['Value', 'year']]
-    ap_hsval.rename(columns={'Value': 'hogs_sales'}, inplace=True)
+    All series are requested for state_name only and downloaded concurrently. The combined table is
+    kept in the QuickStats cache and memoized in the process, so ap(), cp() and every script using
+    them share one copy. The returned frame is shared: do not modify it.
 
-    # Merge all data
-    merged_data = ap_cbval.merge(ap_cmval, on='year', how='outer')\
-                          .merge(ap_cicval, on='year', how='outer')\
-                          .merge(ap_csval, on='year', how='outer')\
-                          .merge(ap_sval, on='year', how='outer')\
-                          .merge(ap_hval, on='year', how='outer')\
-                          .merge(ap_hbval, on='year', how='outer')\
-                          .merge(ap_hsval, on='year', how='outer')
+    Parameters:
+    - state_name (str): State to fetch, as spelled in QuickStats.
 
-    merged_data = merged_data.replace(',', '', regex=True)
-    cols = merged_data.columns.drop('year')
-    merged_data[cols] = merged_data[cols].apply(pd.to_numeric, errors='coerce')
-    merged_data.rename(columns={'year': 'Year'}, inplace=True)
+    Returns:
+    - df (DataFrame): Columns state_name, year, variable and numeric Value.
+    """
+    return _validation_data(state_name, VALIDATION_BASE_URL, stats)
+
+@functools.lru_cache(maxsize=None)
+def _validation_data(state_name, base_url, client):
+    state = urllib.parse.quote_plus(state_name)
+    urls = [f'{base_url}/data.csv?{query}&state_name={state}' for _, query in VALIDATION_SERIES]
+    on_feed = on_feed_query(state_name)
+
+    def build():
+        *series, on_feed_df = client.get_csv_many(urls + [client.api_url(on_feed)],
+                                                  columns=['state_name', 'year', 'short_desc', 'domain_desc', 'Value'])
+        frames = []
+        for (variable, _), df in zip(VALIDATION_SERIES, series):
+            # The endpoint may ignore state_name and return every state
+            frames.append(df[df['state_name'] == state_name][['year', 'Value']].assign(variable=variable))
+        for variable, short_desc in ON_FEED_SERIES.items():
+            df = on_feed_df[(on_feed_df['short_desc'] == short_desc) & (on_feed_df['domain_desc'] == 'TOTAL')]
+            frames.append(df[['year', 'Value']].assign(variable=variable))
+        df = pd.concat(frames, ignore_index=True)
+        df.insert(0, 'state_name', state_name)
+        return df[['state_name', 'year', 'variable', 'Value']]
+
+    return client.get_table('\n'.join(['validation'] + urls + [on_feed]), build)
+
+def _validation_wide(variables, state_name='IOWA'):
+    """
+    Year x variable table of validation series, with one column per variable.
+    """
+    df = validation_data(state_name)
+    df = df[df['variable'].isin(variables)].drop_duplicates(['year', 'variable'])
+    df = df.pivot(index='year', columns='variable', values='Value').reindex(columns=variables)
+    df.columns.name = None
+    return df.reset_index().rename(columns={'year': 'Year'})
 
-    return merged_data  
+def ap():
+    """
+    Fetch and process animal population data for the State of Iowa.
+    
+    Returns:
+    - merged_data (DataFrame): A pandas DataFrame containing processed animal population data.
+    """
+    return _validation_wide(ANIMAL_VALIDATION)
 
 def cp():
     """
@@ -90,182 +120,69 @@ def cp():
     Returns:
     - merged_data (DataFrame): A pandas DataFrame containing processed crop production data.
     """
-    # Fetch crop production data
-    cp_cyval = pd.read_csv('https://api.usda-reports.penguinlabs.net/data.csv?short_desc=CORN%2C+GRAIN+-+YIELD%2C+MEASURED+IN+BU+%2F+ACRE&year__GE=1968&agg_level_desc=STATE')
-    cp_cyval = cp_cyval[cp_cyval['state_name'] == 'IOWA'][['Value', 'year']]
-    cp_cyval.rename(columns={'Value': 'corng_y'}, inplace=True)
-    
-    cp_chval = pd.read_csv('https://api.usda-reports.penguinlabs.net/data.csv?short_desc=CORN%2C+GRAIN+-+ACRES+HARVESTED&year__GE=1968&agg_level_desc=STATE')
-    cp_chval = cp_chval[cp_chval['state_name'] == 'IOWA'][['Value', 'year']]
-    cp_chval.rename(columns={'Value': 'corng_ha'}, inplace=True)
-    
-    cp_cpval = pd.read_csv('https://api.usda-reports.penguinlabs.net/data.csv?short_desc=CORN+-+ACRES+PLANTED&year__GE=1968&agg_level_desc=STATE')
-    cp_cpval = cp_cpval[cp_cpval['state_name'] == 'IOWA'][['Value', 'year']]
-    cp_cpval.rename(columns={'Value': 'corng_pa'}, inplace=True)
-    
-    cp_syval = pd.read_csv('https://api.usda-reports.penguinlabs.net/data.csv?short_desc=SOYBEANS+-+YIELD%2C+MEASURED+IN+BU+%2F+ACRE&year__GE=1968&agg_level_desc=STATE')
-    cp_syval = cp_syval[cp_syval['state_name'] == 'IOWA'][['Value', 'year']]
-    cp_syval.rename(columns={'Value': 'soy_y'}, inplace=True)
-    
-    cp_shval = pd.read_csv('https://api.usda-reports.penguinlabs.net/data.csv?short_desc=SOYBEANS+-+ACRES+HARVESTED&year__GE=1968&agg_level_desc=STATE')
-    cp_shval = cp_shval[cp_shval['state_name'] == 'IOWA'][['Value', 'year']]
-    cp_shval.rename(columns={'Value': 'soy_ha'}, inplace=True)
-    
-    cp_spval = pd.read_csv('https://api.usda-reports.penguinlabs.net/data.csv?short_desc=SOYBEANS+-+ACRES+PLANTED&year__GE=1968&agg_level_desc=STATE')
-    cp_spval = cp_spval[cp_spval['state_name'] == 'IOWA'][['Value', 'year']]
-    cp_spval.rename(columns={'Value': 'soy_pa'}, inplace=True)
+    return _validation_wide(CROP_VALIDATION)
 
-    # Merge all data
-    merged_data = pd.merge(cp_cyval, cp_chval, on='year', how='outer')
-    merged_data = pd.merge(merged_data, cp_cpval, on='year', how='outer')
-    merged_data = pd.merge(merged_data, cp_syval, on='year', how='outer')
-    merged_data = pd.merge(merged_data, cp_shval, on='year', how='outer')
-    merged_data = pd.merge(merged_data, cp_spval, on='year', how='outer')
+def build_wide(outputs, index=('county_name', 'year')):
+    """
+    Build the wide county x year table from long-format results in a single pass.
 
-    merged_data = merged_data.replace(',', '', regex=True)
-    cols = merged_data.columns.drop('year')
-    merged_data[cols] = merged_data[cols].apply(pd.to_numeric, errors='coerce')
-    merged_data.rename(columns={'year': 'Year'}, inplace=True)
+    All outputs are concatenated, Value is normalized once, and the first non-missing Value of every
+    county, year and variable is unstacked into one column per output. Rows are the county-years
+    with data in at least one output, sorted by the index columns.
 
-    return merged_data  
+    Parameters:
+    - outputs (dict): Output name -> DataFrame with the index columns and Value.
+    - index (tuple): Columns identifying a row of the wide table.
+
+    Returns:
+    - df (DataFrame): A pandas DataFrame with the index columns followed by one column per output.
+    """
+    index = list(index)
+    long = pd.concat([df[index + ['Value']] for df in outputs.values()], ignore_index=True)
+    variable = np.repeat(np.arange(len(outputs)), [len(df) for df in outputs.values()])
+    values = parse_value(long['Value']).to_numpy()
+    keep = ~np.isnan(values)
+    variable, values = variable[keep], values[keep]
+
+    # One integer key per row, combining the sorted codes of the index columns
+    levels, key = [], np.zeros(len(values), dtype=np.int64)
+    for column in index:
+        codes, uniques = pd.factorize(long[column].to_numpy()[keep], sort=True)
+        levels.append(uniques)
+        key = key * len(uniques) + codes
+    keys, rows = np.unique(key, return_inverse=True)
+
+    # First Value of every (row, variable) cell
+    _, first = np.unique(rows * len(outputs) + variable, return_index=True)
+    wide = np.full((len(keys), len(outputs)), np.nan)
+    wide[rows[first], variable[first]] = values[first]
+
+    df = pd.DataFrame(wide, columns=list(outputs))
+    for column, uniques in reversed(list(zip(index, levels))):
+        df.insert(0, column, uniques[keys % len(uniques)])
+        keys = keys // len(uniques)
+    return df
 
 def process_data_crop(parameters):
     """
     Process Iowa counties crop data based on provided parameters.
 
     Parameters:
-    - parameters (list): List of parameters for fetching crop data.
+    - parameters (list): QuickStatsQuery objects for fetching crop data (see parameters_usda.py).
 
     Returns:
     - df (DataFrame): A pandas DataFrame containing processed crop data.
     """
-    dataframes = []
-    for param in parameters:
-        df = stats.get_data(param)         
-
-        if 'CORN' in param and 'YIELD' in param:
-            name = "corng_y"
-        elif 'CORN' in param and 'PLANTED' in param:
-            name = "corng_pa"  
-        elif 'CORN' in param and 'HARVESTED' in param:
-            name = "corng_ha"  
-        elif 'SOYBEANS' in param and 'YIELD' in param:
-            name = "soy_y"
-        elif 'SOYBEANS' in param and 'HARVESTED' in param:
-            name = "soy_ha"
-        else:
-            name = "soy_pa"
-        
-        # Pivot table with county_name and year as indices and Value as the data column
-        df = df.pivot_table(index=['county_name', 'year'], 
-                            values='Value', 
-                            aggfunc='first').reset_index()
-
-        # Rename the columns
-        df.columns = ['county_name', 'year', name]
-
-        dataframes.append(df)
-
-    df = dataframes[0] 
-    for dfs in dataframes[1:]:  # Loop through remaining dataframes
-        df = pd.merge(df, dfs, on=['county_name', 'year'], how='outer')
-    
-    df = df.replace(',', '', regex=True)
-    df = df.replace(' (D)', np.nan)
-    
-    return df
+    return build_wide(stats.get_outputs_many(parameters, columns=QUICKSTATS_COLUMNS))
 
 def process_data_animal(parameters):
     """
     Process Iowa counties animal data based on provided parameters.
 
     Parameters:
-    - parameters (list): List of parameters for fetching animal data.
+    - parameters (list): QuickStatsQuery objects for fetching animal data (see parameters_usda.py).
 
     Returns:
     - df (DataFrame): A pandas DataFrame containing processed animal data.
     """
-    dataframes = []
-    for param in parameters:
-        df = stats.get_data(param)
-        
-        if 'CALVES' in param:
-            df = df[df['class_desc'] == 'INCL CALVES']
-            # Pivot table with county_name and year as indices and Value as the data column
-            df = df.pivot_table(index=['county_name', 'year'], 
-                                values='Value', 
-                                aggfunc='first').reset_index()
-            df.columns = ['county_name', 'year', 'cattle']
-
-        if 'HOGS' in param and 'BREEDING' not in param:
-            df = df[df['short_desc'] == 'HOGS - INVENTORY']  
-            # Pivot table with county_name and year as indices and Value as the data column
-            df = df.pivot_table(index=['county_name', 'year'], 
-                                values='Value', 
-                                aggfunc='first').reset_index()
-            df.columns = ['county_name', 'year', 'hogs']
-
-        if 'BREEDING' in param:  
-            df = df[
-                ((df['short_desc'] == 'HOGS, BREEDING - INVENTORY') | 
-                (df['short_desc'] == 'HOGS - SALES, MEASURED IN HEAD')) & 
-                (df['domain_desc'] == 'TOTAL')
-            ][['county_name', 'year', 'short_desc', 'Value']]
-            # Use pivot_table to reshape the data
-            df = df.pivot_table(
-                index=['county_name', 'year'], 
-                columns='short_desc', 
-                values='Value', 
-                aggfunc='first'
-            ).reset_index()
-            df.columns.name = None  # Remove the columns' name
-            df.rename(columns={
-                'HOGS, BREEDING - INVENTORY': 'hogs_breeding', 
-                'HOGS - SALES, MEASURED IN HEAD': 'hogs_sales'
-            }, inplace=True)
-            
-        if 'SALES' in param:
-            df = df[
-                ((df['short_desc'] == 'CATTLE, ON FEED - INVENTORY') | 
-                (df['short_desc'] == 'CATTLE, ON FEED - SALES FOR SLAUGHTER, MEASURED IN HEAD')) & 
-                (df['domain_desc'] == 'TOTAL')
-            ][['county_name', 'year', 'short_desc', 'Value']]
-            df = df.pivot_table(
-                index=['county_name', 'year'], 
-                columns='short_desc', 
-                values='Value', 
-                aggfunc='first'
-            ).reset_index()
-            df.columns.name = None
-            df.rename(columns={
-                'CATTLE, ON FEED - INVENTORY': 'steers', 
-                'CATTLE, ON FEED - SALES FOR SLAUGHTER, MEASURED IN HEAD': 'onfeed_sold'
-            }, inplace=True)
-            
-        if not any(x in param for x in ['CHICKENS', 'SALES', 'BREEDING', 'HOGS', 'CALVES']):
-            if 'BEEF' in param:
-                name = "beef"
-            elif 'MILK' in param:
-                name = "milk"
-
-            # Pivot table with county_name and year as indices and Value as the data column
-            df = df.pivot_table(index=['county_name', 'year'], 
-                                values='Value', 
-                                aggfunc='first').reset_index()
-            df.columns = ['county_name', 'year', name]
-
-        dataframes.append(df)
-
-    df = dataframes[0] 
-    for dfs in dataframes[1:]: 
-        df = pd.merge(df, dfs, on=['county_name', 'year'], how='outer')
-        
-    if 'milk_y' in df.columns:
-        df = df.drop(columns=['milk_y'])
-    if 'milk_x' in df.columns:
-        df = df.rename(columns={'milk_x': 'milk'})   
-    
-    df = df.replace(',', '', regex=True)
-    df = df.replace(' (D)', np.nan)
-    
-    return df
\ No newline at end of file
+    return build_wide(stats.get_outputs_many(parameters, columns=QUICKSTATS_COLUMNS))
\ No newline at end of file
@@ -1,218 +1,230 @@
-import urllib.parse
+import os
+
+current_file_path = os.path.abspath(__file__)
+current_directory = os.path.dirname(current_file_path)
+os.chdir(current_directory)
+from USDAQuickStats import QuickStatsQuery
+
+# Each query lists its API filters and the output columns its rows provide. Queries that differ
+# only in SPLIT_FIELDS (short_desc, class_desc, ...) are fetched as one request by
+# USDAQuickStats.get_outputs_many and split locally.
 
 # Corn Grain Yield Bu/Acre
-corng_y = (
-    'source_desc=SURVEY' +  \
-    '&sector_desc=CROPS' + \
-    '&commodity_desc=CORN' + \
-    '&statisticcat_desc=YIELD' + \
-    '&util_practice_desc=GRAIN' + \
-    '&' + urllib.parse.quote('short_desc=CORN, GRAIN - YIELD, MEASURED IN BU / ACRE') + \
-    '&freq_desc=ANNUAL' + \
-    '&reference_period_desc=YEAR' + \
-    '&year__GE=1968' + \
-    '&agg_level_desc=COUNTY' + \
-    '&state_name=IOWA' + \
-    '&county_code__LT=998' + \
-    '&format=CSV'
-)
+corng_y = QuickStatsQuery([
+    ('source_desc', 'SURVEY'),
+    ('sector_desc', 'CROPS'),
+    ('commodity_desc', 'CORN'),
+    ('statisticcat_desc', 'YIELD'),
+    ('util_practice_desc', 'GRAIN'),
+    ('short_desc', 'CORN, GRAIN - YIELD, MEASURED IN BU / ACRE'),
+    ('freq_desc', 'ANNUAL'),
+    ('reference_period_desc', 'YEAR'),
+    ('year__GE', '1968'),
+    ('agg_level_desc', 'COUNTY'),
+    ('state_name', 'IOWA'),
+    ('county_code__LT', '998'),
+    ('format', 'CSV'),
+], {'corng_y': []})
 
 # Soybean Yield Bu/Acre
-soy_y = (
-    'source_desc=SURVEY' +  \
-    '&sector_desc=CROPS' + \
-    '&commodity_desc=SOYBEANS' + \
-    '&statisticcat_desc=YIELD' + \
-    '&' + urllib.parse.quote('short_desc=SOYBEANS - YIELD, MEASURED IN BU / ACRE') + \
-    '&freq_desc=ANNUAL' + \
-    '&reference_period_desc=YEAR' + \
-    '&year__GE=1968' + \
-    '&agg_level_desc=COUNTY' + \
-    '&state_name=IOWA' + \
-    '&format=CSV'
-)
+soy_y = QuickStatsQuery([
+    ('source_desc', 'SURVEY'),
+    ('sector_desc', 'CROPS'),
+    ('commodity_desc', 'SOYBEANS'),
+    ('statisticcat_desc', 'YIELD'),
+    ('short_desc', 'SOYBEANS - YIELD, MEASURED IN BU / ACRE'),
+    ('freq_desc', 'ANNUAL'),
+    ('reference_period_desc', 'YEAR'),
+    ('year__GE', '1968'),
+    ('agg_level_desc', 'COUNTY'),
+    ('state_name', 'IOWA'),
+    ('format', 'CSV'),
+], {'soy_y': []})
 
 # Corn Area Planted Acres
-corng_pa = (
-    'source_desc=SURVEY' +  \
-    '&sector_desc=CROPS' + \
-    '&commodity_desc=CORN' + \
-    '&statisticcat_desc__LIKE=PLANTED' + \
-    '&' + urllib.parse.quote('short_desc=CORN - ACRES PLANTED') + \
-    '&unit_desc=ACRES' + \
-    '&freq_desc=ANNUAL' + \
-    '&reference_period_desc=YEAR' + \
-    '&year__GE=1968' + \
-    '&agg_level_desc=COUNTY' + \
-    '&state_name=IOWA' + \
-    '&county_code__LT=998' + \
-    '&format=CSV'
-)
+corng_pa = QuickStatsQuery([
+    ('source_desc', 'SURVEY'),
+    ('sector_desc', 'CROPS'),
+    ('commodity_desc', 'CORN'),
+    ('statisticcat_desc__LIKE', 'PLANTED'),
+    ('short_desc', 'CORN - ACRES PLANTED'),
+    ('unit_desc', 'ACRES'),
+    ('freq_desc', 'ANNUAL'),
+    ('reference_period_desc', 'YEAR'),
+    ('year__GE', '1968'),
+    ('agg_level_desc', 'COUNTY'),
+    ('state_name', 'IOWA'),
+    ('county_code__LT', '998'),
+    ('format', 'CSV'),
+], {'corng_pa': []})
 
 # Corn Area Harvested Acres (grain)
-corng_ha = (
-    'source_desc=SURVEY' +  \
-    '&sector_desc=CROPS' + \
-    '&commodity_desc=CORN' + \
-    '&util_practice_desc=GRAIN' + \
-    '&statisticcat_desc__LIKE=HARVESTED' + \
-    '&' + urllib.parse.quote('short_desc=CORN, GRAIN - ACRES HARVESTED') + \
-    '&unit_desc=ACRES' + \
-    '&freq_desc=ANNUAL' + \
-    '&reference_period_desc=YEAR' + \
-    '&year__GE=1968' + \
-    '&agg_level_desc=COUNTY' + \
-    '&state_name=IOWA' + \
-    '&county_code__LT=998' + \
-    '&format=CSV'
-)            
+corng_ha = QuickStatsQuery([
+    ('source_desc', 'SURVEY'),
+    ('sector_desc', 'CROPS'),
+    ('commodity_desc', 'CORN'),
+    ('util_practice_desc', 'GRAIN'),
+    ('statisticcat_desc__LIKE', 'HARVESTED'),
+    ('short_desc', 'CORN, GRAIN - ACRES HARVESTED'),
+    ('unit_desc', 'ACRES'),
+    ('freq_desc', 'ANNUAL'),
+    ('reference_period_desc', 'YEAR'),
+    ('year__GE', '1968'),
+    ('agg_level_desc', 'COUNTY'),
+    ('state_name', 'IOWA'),
+    ('county_code__LT', '998'),
+    ('format', 'CSV'),
+], {'corng_ha': []})
 
 # Soybean Area Planted Acres
-soy_pa = (
-    'source_desc=SURVEY' +  \
-    '&sector_desc=CROPS' + \
-    '&' + urllib.parse.quote('group_desc=FIELD CROPS') + \
-    '&commodity_desc=SOYBEANS' + \
-    '&statisticcat_desc__LIKE=PLANTED' + \
-    '&' + urllib.parse.quote('short_desc=SOYBEANS - ACRES PLANTED') + \
-    '&unit_desc=ACRES' + \
-    '&freq_desc=ANNUAL' + \
-    '&reference_period_desc=YEAR' + \
-    '&year__GE=1968' + \
-    '&agg_level_desc=COUNTY' + \
-    '&state_name=IOWA' + \
-    '&county_code__LT=998' + \
-    '&format=CSV'
-)            
+soy_pa = QuickStatsQuery([
+    ('source_desc', 'SURVEY'),
+    ('sector_desc', 'CROPS'),
+    ('group_desc', 'FIELD CROPS'),
+    ('commodity_desc', 'SOYBEANS'),
+    ('statisticcat_desc__LIKE', 'PLANTED'),
+    ('short_desc', 'SOYBEANS - ACRES PLANTED'),
+    ('unit_desc', 'ACRES'),
+    ('freq_desc', 'ANNUAL'),
+    ('reference_period_desc', 'YEAR'),
+    ('year__GE', '1968'),
+    ('agg_level_desc', 'COUNTY'),
+    ('state_name', 'IOWA'),
+    ('county_code__LT', '998'),
+    ('format', 'CSV'),
+], {'soy_pa': []})
 
 # Soybean Area Harvested Acres
-soy_ha = (
-    'source_desc=SURVEY' +  \
-    '&sector_desc=CROPS' + \
-    '&' + urllib.parse.quote('group_desc=FIELD CROPS') + \
-    '&commodity_desc=SOYBEANS' + \
-    '&statisticcat_desc__LIKE=HARVESTED' + \
-    '&' + urllib.parse.quote('short_desc=SOYBEANS - ACRES PLANTED') + \
-    '&unit_desc=ACRES' + \
-    '&freq_desc=ANNUAL' + \
-    '&reference_period_desc=YEAR' + \
-    '&year__GE=1968' + \
-    '&agg_level_desc=COUNTY' + \
-    '&state_name=IOWA' + \
-    '&county_code__LT=998' + \
-    '&format=CSV'
-)           
+soy_ha = QuickStatsQuery([
+    ('source_desc', 'SURVEY'),
+    ('sector_desc', 'CROPS'),
+    ('group_desc', 'FIELD CROPS'),
+    ('commodity_desc', 'SOYBEANS'),
+    ('statisticcat_desc__LIKE', 'HARVESTED'),
+    ('short_desc', 'SOYBEANS - ACRES HARVESTED'),
+    ('unit_desc', 'ACRES'),
+    ('freq_desc', 'ANNUAL'),
+    ('reference_period_desc', 'YEAR'),
+    ('year__GE', '1968'),
+    ('agg_level_desc', 'COUNTY'),
+    ('state_name', 'IOWA'),
+    ('county_code__LT', '998'),
+    ('format', 'CSV'),
+], {'soy_ha': []})
 
 # Hogs
-hogs = (
-    urllib.parse.quote('sector_desc=ANIMALS & PRODUCTS') + \
-    '&group_desc=LIVESTOCK' + \
-    '&commodity_desc=HOGS' + \
-    '&statisticcat_desc=INVENTORY' + \
-    '&domain_desc=TOTAL' + \
-    '&' + urllib.parse.quote('domaincat_desc=NOT SPECIFIED') + \
-    '&unit_desc=HEAD' + \
-    '&year__GE=1968' + \
-    '&agg_level_desc=COUNTY' + \
-    '&state_name=IOWA' + \
-    '&county_code__LT=998' + \
-    '&format=CSV'
-)                
+hogs = QuickStatsQuery([
+    ('sector_desc', 'ANIMALS & PRODUCTS'),
+    ('group_desc', 'LIVESTOCK'),
+    ('commodity_desc', 'HOGS'),
+    ('statisticcat_desc', 'INVENTORY'),
+    ('domain_desc', 'TOTAL'),
+    ('domaincat_desc', 'NOT SPECIFIED'),
+    ('unit_desc', 'HEAD'),
+    ('year__GE', '1968'),
+    ('agg_level_desc', 'COUNTY'),
+    ('state_name', 'IOWA'),
+    ('county_code__LT', '998'),
+    ('format', 'CSV'),
+], {'hogs': [('short_desc', 'HOGS - INVENTORY')]})
 
 # Breeding Hogs Inventory - sows + boars ratio 20:1 and # Hogs Sales
-hogs_others = (
-    urllib.parse.quote('sector_desc=ANIMALS & PRODUCTS') + \
-    '&group_desc=LIVESTOCK' + \
-    '&commodity_desc=HOGS' + \
-    '&' + urllib.parse.quote('util_practice_desc= BREEDING') + \
-    '&' + urllib.parse.quote('domaincat_desc=NOT SPECIFIED') + \
-    '&unit_desc=HEAD' + \
-    '&year__GE=1968' + \
-    '&agg_level_desc=COUNTY' + \
-    '&state_name=IOWA' + \
-    '&county_code__LT=998' + \
-    '&format=CSV'
-)                
+hogs_others = QuickStatsQuery([
+    ('sector_desc', 'ANIMALS & PRODUCTS'),
+    ('group_desc', 'LIVESTOCK'),
+    ('commodity_desc', 'HOGS'),
+    ('util_practice_desc', ' BREEDING'),
+    ('domaincat_desc', 'NOT SPECIFIED'),
+    ('unit_desc', 'HEAD'),
+    ('year__GE', '1968'),
+    ('agg_level_desc', 'COUNTY'),
+    ('state_name', 'IOWA'),
+    ('county_code__LT', '998'),
+    ('format', 'CSV'),
+], {
+    'hogs_breeding': [('short_desc', 'HOGS, BREEDING - INVENTORY'), ('domain_desc', 'TOTAL')],
+    'hogs_sales': [('short_desc', 'HOGS - SALES, MEASURED IN HEAD'), ('domain_desc', 'TOTAL')],
+})
 
 # Beef Cows
-beef = (
-    urllib.parse.quote('sector_desc=ANIMALS & PRODUCTS') + \
-    '&group_desc=LIVESTOCK' + \
-    '&commodity_desc=CATTLE' + \
-    '&class_desc__LIKE=BEEF' + \
-    '&statisticcat_desc=INVENTORY' + \
-    '&domain_desc=TOTAL' + \
-    '&' + urllib.parse.quote('domaincat_desc=NOT SPECIFIED') + \
-    '&unit_desc=HEAD' + \
-    '&year__GE=1968' + \
-    '&agg_level_desc=COUNTY' + \
-    '&state_name=IOWA' + \
-    '&county_code__LT=998' + \
-    '&format=CSV'
-)
+beef = QuickStatsQuery([
+    ('sector_desc', 'ANIMALS & PRODUCTS'),
+    ('group_desc', 'LIVESTOCK'),
+    ('commodity_desc', 'CATTLE'),
+    ('class_desc__LIKE', 'BEEF'),
+    ('statisticcat_desc', 'INVENTORY'),
+    ('domain_desc', 'TOTAL'),
+    ('domaincat_desc', 'NOT SPECIFIED'),
+    ('unit_desc', 'HEAD'),
+    ('year__GE', '1968'),
+    ('agg_level_desc', 'COUNTY'),
+    ('state_name', 'IOWA'),
+    ('county_code__LT', '998'),
+    ('format', 'CSV'),
+], {'beef': []})
 
 # Milk
-milk = (
-    urllib.parse.quote('sector_desc=ANIMALS & PRODUCTS') + \
-    '&group_desc=LIVESTOCK' + \
-    '&commodity_desc=CATTLE' + \
-    '&class_desc__LIKE=MILK' + \
-    '&statisticcat_desc=INVENTORY' + \
-    '&domain_desc=TOTAL' + \
-    '&' + urllib.parse.quote('domaincat_desc=NOT SPECIFIED') + \
-    '&unit_desc=HEAD' + \
-    '&year__GE=1968' + \
-    '&agg_level_desc=COUNTY' + \
-    '&state_name=IOWA' + \
-    '&county_code__LT=998' + \
-    '&format=CSV'
-)
+milk = QuickStatsQuery([
+    ('sector_desc', 'ANIMALS & PRODUCTS'),
+    ('group_desc', 'LIVESTOCK'),
+    ('commodity_desc', 'CATTLE'),
+    ('class_desc__LIKE', 'MILK'),
+    ('statisticcat_desc', 'INVENTORY'),
+    ('domain_desc', 'TOTAL'),
+    ('domaincat_desc', 'NOT SPECIFIED'),
+    ('unit_desc', 'HEAD'),
+    ('year__GE', '1968'),
+    ('agg_level_desc', 'COUNTY'),
+    ('state_name', 'IOWA'),
+    ('county_code__LT', '998'),
+    ('format', 'CSV'),
+], {'milk': []})
 
 # All cattle
-other_cattle = (
-    urllib.parse.quote('sector_desc=ANIMALS & PRODUCTS') + \
-    '&group_desc=LIVESTOCK' + \
-    '&commodity_desc=CATTLE' + \
-    '&' +urllib.parse.quote('class_desc=INCL CALVES') + \
-    '&statisticcat_desc=INVENTORY' + \
-    '&unit_desc=HEAD' + \
-        '&' +urllib.parse.quote('short_desc=CATTLE, INCL CALVES - INVENTORY') + \
-        '&domain_desc=TOTAL' + \
-    '&year__GE=1968' + \
-    '&agg_level_desc=COUNTY' + \
-    '&state_name=IOWA' + \
-    '&county_code__LT=998' + \
-    '&format=CSV'
-)
+other_cattle = QuickStatsQuery([
+    ('sector_desc', 'ANIMALS & PRODUCTS'),
+    ('group_desc', 'LIVESTOCK'),
+    ('commodity_desc', 'CATTLE'),
+    ('class_desc', 'INCL CALVES'),
+    ('statisticcat_desc', 'INVENTORY'),
+    ('unit_desc', 'HEAD'),
+    ('short_desc', 'CATTLE, INCL CALVES - INVENTORY'),
+    ('domain_desc', 'TOTAL'),
+    ('year__GE', '1968'),
+    ('agg_level_desc', 'COUNTY'),
+    ('state_name', 'IOWA'),
+    ('county_code__LT', '998'),
+    ('format', 'CSV'),
+], {'cattle': [('class_desc', 'INCL CALVES')]})
 
 # Steers
-steers = (
-    urllib.parse.quote('sector_desc=ANIMALS & PRODUCTS') +
-    '&group_desc=LIVESTOCK' +
-    '&commodity_desc=CATTLE' +
-    '&' + urllib.parse.quote('prodn_practice_desc=ON FEED') +
-    '&' + urllib.parse.quote('short_desc__LIKE=CATTLE, ON FEED - INVENTORY') +
-    '&domain_desc=TOTAL' +
-    '&unit_desc=HEAD' +
-    '&year__GE=1968' +
-    '&agg_level_desc=COUNTY' +
-    '&state_name=IOWA' +
-    '&county_code__LT=998' +
-    '&format=CSV'
-)
+steers = QuickStatsQuery([
+    ('sector_desc', 'ANIMALS & PRODUCTS'),
+    ('group_desc', 'LIVESTOCK'),
+    ('commodity_desc', 'CATTLE'),
+    ('prodn_practice_desc', 'ON FEED'),
+    ('short_desc__LIKE', 'CATTLE, ON FEED - INVENTORY'),
+    ('domain_desc', 'TOTAL'),
+    ('unit_desc', 'HEAD'),
+    ('year__GE', '1968'),
+    ('agg_level_desc', 'COUNTY'),
+    ('state_name', 'IOWA'),
+    ('county_code__LT', '998'),
+    ('format', 'CSV'),
+], {'steers': [('short_desc', 'CATTLE, ON FEED - INVENTORY'), ('domain_desc', 'TOTAL')]})
 
 # Cattle on Feed Sold
-onfeed_sold = (
-    urllib.parse.quote('sector_desc=ANIMALS & PRODUCTS') +
-    '&group_desc=LIVESTOCK' +
-    '&commodity_desc=CATTLE' +
-    '&' + urllib.parse.quote('statisticcat_desc=SALES FOR SLAUGHTER') +
-    '&' + urllib.parse.quote('short_desc__LIKE=CATTLE, ON FEED - SALES FOR SLAUGHTER, MEASURED IN HEAD') +
-    '&domain_desc=TOTAL' +
-    '&unit_desc=HEAD' +
-    '&year__GE=1968' +
-    '&agg_level_desc=COUNTY' +
-    '&state_name=IOWA' +
-    '&county_code__LT=998' +
-    '&format=CSV'
-)
\ No newline at end of file
+onfeed_sold = QuickStatsQuery([
+    ('sector_desc', 'ANIMALS & PRODUCTS'),
+    ('group_desc', 'LIVESTOCK'),
+    ('commodity_desc', 'CATTLE'),
+    ('statisticcat_desc', 'SALES FOR SLAUGHTER'),
+    ('short_desc__LIKE', 'CATTLE, ON FEED - SALES FOR SLAUGHTER, MEASURED IN HEAD'),
+    ('domain_desc', 'TOTAL'),
+    ('unit_desc', 'HEAD'),
+    ('year__GE', '1968'),
+    ('agg_level_desc', 'COUNTY'),
+    ('state_name', 'IOWA'),
+    ('county_code__LT', '998'),
+    ('format', 'CSV'),
+], {'onfeed_sold': [('short_desc', 'CATTLE, ON FEED - SALES FOR SLAUGHTER, MEASURED IN HEAD'), ('domain_desc', 'TOTAL')]})
@@ -0,0 +1,231 @@
+import os
+import sys
+import json
+import time
+import hashlib
+import argparse
+import threading
+import urllib.parse
+import numpy as np
+import pandas as pd
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+current_file_path = os.path.abspath(__file__)
+current_directory = os.path.dirname(current_file_path)
+os.chdir(current_directory)
+from USDAQuickStats import fixture_name, parse_parameters, normalize_parameters, _bounds
+
+"""
+Local stand-in for the QuickStats API and the state-level validation endpoint used by ap() and cp().
+
+Responses come from fixtures recorded with USDAQuickStats(record_dir=...) / QUICKSTATS_RECORD_DIR,
+or are generated synthetically from the query. Latency and throughput are configurable, so the fetch
+layer and the pipeline can be timed deterministically without network access:
+
+    python quickstats_server.py --port 8765 --latency 0.3 --throughput 2e6
+    QUICKSTATS_BASE_URL=http://127.0.0.1:8765/api VALIDATION_BASE_URL=http://127.0.0.1:8765 python main_Ns_code.py
+"""
+
+# Column layout of a QuickStats CSV response
+QUICKSTATS_ALL_COLUMNS = [
+    'source_desc', 'sector_desc', 'group_desc', 'commodity_desc', 'class_desc', 'prodn_practice_desc',
+    'util_practice_desc', 'statisticcat_desc', 'unit_desc', 'short_desc', 'domain_desc', 'domaincat_desc',
+    'agg_level_desc', 'state_ansi', 'state_fips_code', 'state_alpha', 'state_name', 'asd_code', 'asd_desc',
+    'county_ansi', 'county_code', 'county_name', 'region_desc', 'zip_5', 'watershed_code', 'watershed_desc',
+    'congr_district_code', 'country_code', 'country_name', 'location_desc', 'year', 'freq_desc', 'begin_code',
+    'end_code', 'reference_period_desc', 'week_ending', 'load_time', 'Value', 'CV (%)',
+]
+
+# Series served in synthetic mode, with a typical county-level magnitude
+SYNTHETIC_SERIES = [
+    ('CROPS', 'FIELD CROPS', 'CORN', 'ALL CLASSES', 'ALL PRODUCTION PRACTICES', 'GRAIN', 'YIELD', 'BU / ACRE', 'CORN, GRAIN - YIELD, MEASURED IN BU / ACRE', 150),
+    ('CROPS', 'FIELD CROPS', 'CORN', 'ALL CLASSES', 'ALL PRODUCTION PRACTICES', 'ALL UTILIZATION PRACTICES', 'AREA PLANTED', 'ACRES', 'CORN - ACRES PLANTED', 120000),
+    ('CROPS', 'FIELD CROPS', 'CORN', 'ALL CLASSES', 'ALL PRODUCTION PRACTICES', 'GRAIN', 'AREA HARVESTED', 'ACRES', 'CORN, GRAIN - ACRES HARVESTED', 110000),
+    ('CROPS', 'FIELD CROPS', 'SOYBEANS', 'ALL CLASSES', 'ALL PRODUCTION PRACTICES', 'ALL UTILIZATION PRACTICES', 'YIELD', 'BU / ACRE', 'SOYBEANS - YIELD, MEASURED IN BU / ACRE', 45),
+    ('CROPS', 'FIELD CROPS', 'SOYBEANS', 'ALL CLASSES', 'ALL PRODUCTION PRACTICES', 'ALL UTILIZATION PRACTICES', 'AREA PLANTED', 'ACRES', 'SOYBEANS - ACRES PLANTED', 90000),
+    ('CROPS', 'FIELD CROPS', 'SOYBEANS', 'ALL CLASSES', 'ALL PRODUCTION PRACTICES', 'ALL UTILIZATION PRACTICES', 'AREA HARVESTED', 'ACRES', 'SOYBEANS - ACRES HARVESTED', 88000),
+    ('ANIMALS & PRODUCTS', 'LIVESTOCK', 'HOGS', 'ALL CLASSES', 'ALL PRODUCTION PRACTICES', 'ALL UTILIZATION PRACTICES', 'INVENTORY', 'HEAD', 'HOGS - INVENTORY', 200000),
+    ('ANIMALS & PRODUCTS', 'LIVESTOCK', 'HOGS', 'BREEDING', 'ALL PRODUCTION PRACTICES', 'ALL UTILIZATION PRACTICES', 'INVENTORY', 'HEAD', 'HOGS, BREEDING - INVENTORY', 20000),
+    ('ANIMALS & PRODUCTS', 'LIVESTOCK', 'HOGS', 'ALL CLASSES', 'ALL PRODUCTION PRACTICES', 'ALL UTILIZATION PRACTICES', 'SALES', 'HEAD', 'HOGS - SALES, MEASURED IN HEAD', 400000),
+    ('ANIMALS & PRODUCTS', 'LIVESTOCK', 'CATTLE', 'COWS, BEEF', 'ALL PRODUCTION PRACTICES', 'ALL UTILIZATION PRACTICES', 'INVENTORY', 'HEAD', 'CATTLE, COWS, BEEF - INVENTORY', 8000),
+    ('ANIMALS & PRODUCTS', 'LIVESTOCK', 'CATTLE', 'COWS, MILK', 'ALL PRODUCTION PRACTICES', 'ALL UTILIZATION PRACTICES', 'INVENTORY', 'HEAD', 'CATTLE, COWS, MILK - INVENTORY', 2000),
+    ('ANIMALS & PRODUCTS', 'LIVESTOCK', 'CATTLE', 'INCL CALVES', 'ALL PRODUCTION PRACTICES', 'ALL UTILIZATION PRACTICES', 'INVENTORY', 'HEAD', 'CATTLE, INCL CALVES - INVENTORY', 40000),
+    ('ANIMALS & PRODUCTS', 'LIVESTOCK', 'CATTLE', 'ALL CLASSES', 'ON FEED', 'ALL UTILIZATION PRACTICES', 'INVENTORY', 'HEAD', 'CATTLE, ON FEED - INVENTORY', 12000),
+    ('ANIMALS & PRODUCTS', 'LIVESTOCK', 'CATTLE', 'ALL CLASSES', 'ON FEED', 'ALL UTILIZATION PRACTICES', 'SALES FOR SLAUGHTER', 'HEAD', 'CATTLE, ON FEED - SALES FOR SLAUGHTER, MEASURED IN HEAD', 20000),
+]
+SERIES_FIELDS = ['sector_desc', 'group_desc', 'commodity_desc', 'class_desc', 'prodn_practice_desc',
+                 'util_practice_desc', 'statisticcat_desc', 'unit_desc', 'short_desc']
+
+# Filters honoured in synthetic mode; the rest of the query only seeds the generator
+SYNTHETIC_FILTERS = ['commodity_desc', 'class_desc', 'prodn_practice_desc', 'short_desc']
+
+STATES = [('IOWA', 'IA', '19'), ('ILLINOIS', 'IL', '17'), ('MINNESOTA', 'MN', '27'), ('NEBRASKA', 'NE', '31')]
+
+def _matches(value, pairs, field):
+    """
+    Whether a series attribute passes the equality and __LIKE filters on field.
+    Several equality filters on the same field match any of their values.
+    """
+    equal = [wanted.strip() for name, wanted in pairs if name == field]
+    if equal and value not in equal:
+        return False
+    for name, wanted in pairs:
+        if name == f'{field}__LIKE' and wanted.strip() not in value:
+            return False
+    return True
+
+def synthetic_frame(query, n_counties=99, first_year=1968, last_year=2023):
+    """
+    Generate a QuickStats-shaped response for a query.
+
+    The result depends only on the normalized query, so repeated runs see identical data.
+
+    Parameters:
+    - query (str): Query string of the request.
+    - n_counties (int): Number of counties per state for county-level queries.
+    - first_year, last_year (int): Year range used when the query does not bound it.
+
+    Returns:
+    - df (DataFrame): Rows with the QuickStats column layout; Value is formatted text as served by NASS.
+    """
+    pairs = parse_parameters(query)
+    fields = dict(pairs)
+    seed = int(hashlib.sha256(normalize_parameters(query).encode('utf-8')).hexdigest()[:8], 16)
+    rng = np.random.default_rng(seed)
+
+    series = [s for s in SYNTHETIC_SERIES
+              if all(_matches(value, pairs, field) for field, value in zip(SERIES_FIELDS, s) if field in SYNTHETIC_FILTERS)]
+    states = [s for s in STATES if s[0] == fields.get('state_name', s[0])]
+    years = np.arange(*np.add(_bounds(pairs, 'year', first_year, last_year), (0, 1)))
+    county_level = fields.get('agg_level_desc') == 'COUNTY'
+    codes = np.arange(1, 2 * n_counties, 2)
+    lo, hi = _bounds(pairs, 'county_code', 0, 999)
+    codes = codes[(codes >= lo) & (codes <= hi)] if county_level else np.array([-1])
+
+    frames = []
+    for (state_name, state_alpha, state_fips) in states:
+        for s in series:
+            n = len(years) * len(codes)
+            scale = s[-1] if county_level else s[-1] * n_counties
+            values = rng.lognormal(np.log(scale), 0.3, n)
+            text = np.where(values >= 1000, [f'{v:,.0f}' for v in values], [f'{v:.1f}' for v in values])
+            text[rng.random(n) < 0.03] = '                 (D)'
+            df = pd.DataFrame({
+                'year': np.repeat(years, len(codes)),
+                'county_code': np.tile([f'{c:03d}' if c >= 0 else '' for c in codes], len(years)),
+                'Value': text,
+            })
+            df['county_name'] = np.where(df['county_code'] != '', 'COUNTY ' + df['county_code'], '')
+            for field, value in zip(SERIES_FIELDS, s):
+                df[field] = value
+            df['state_name'], df['state_alpha'], df['state_fips_code'], df['state_ansi'] = state_name, state_alpha, state_fips, state_fips
+            frames.append(df)
+
+    df = pd.concat(frames, ignore_index=True) if frames else pd.DataFrame(columns=['year'])
+    df['source_desc'] = fields.get('source_desc', 'SURVEY')
+    df['domain_desc'] = 'TOTAL'
+    df['domaincat_desc'] = 'NOT SPECIFIED'
+    df['agg_level_desc'] = 'COUNTY' if county_level else 'STATE'
+    df['country_code'], df['country_name'] = '9000', 'UNITED STATES'
+    df['freq_desc'], df['reference_period_desc'] = 'ANNUAL', fields.get('reference_period_desc', 'YEAR')
+    df['location_desc'] = df.get('state_name', '')
+    df['load_time'] = '2024-01-01 00:00:00.000'
+    return df.reindex(columns=QUICKSTATS_ALL_COLUMNS, fill_value='').sort_values('year', ascending=False, kind='stable')
+
+class QuickStatsHandler(BaseHTTPRequestHandler):
+    """
+    Serves /api/api_GET/, /api/get_counts/ and /data.csv from fixtures or synthetic data.
+    """
+    protocol_version = 'HTTP/1.1'
+
+    def do_GET(self):
+        server = self.server
+        parts = urllib.parse.urlsplit(self.path)
+        counts = parts.path.rstrip('/').endswith('get_counts')
+        server.requests.append(self.path)
+        body = None
+
+        if server.fixture_dir:
+            path = os.path.join(server.fixture_dir, fixture_name(self.path, 'json' if counts else 'csv'))
+            if os.path.exists(path):
+                with open(path, 'rb') as f:
+                    body = f.read()
+
+        if body is None and server.synthetic:
+            df = synthetic_frame(parts.query, n_counties=server.n_counties)
+            body = json.dumps({'count': len(df)}).encode() if counts else df.to_csv(index=False).encode('utf-8')
+
+        time.sleep(server.latency)
+        if body is None:
+            self.send_response(404)
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+            return
+
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json' if counts else 'text/csv')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+
+        # Throttle the body to the configured throughput
+        chunk = 64 * 1024
+        for start in range(0, len(body), chunk):
+            self.wfile.write(body[start:start + chunk])
+            if server.throughput:
+                time.sleep(min(chunk, len(body) - start) / server.throughput)
+
+    def log_message(self, format, *args):
+        if self.server.verbose:
+            super().log_message(format, *args)
+
+def start_server(fixture_dir=None, synthetic=True, latency=0.0, throughput=None, n_counties=99,
+                 host='127.0.0.1', port=0, verbose=False):
+    """
+    Start the stand-in server on a background thread.
+
+    Parameters:
+    - fixture_dir (str): Directory of recorded responses, looked up by fixture_name.
+    - synthetic (bool): Generate a response when no fixture matches, otherwise answer 404.
+    - latency (float): Seconds of delay before each response.
+    - throughput (float): Bytes per second per response, None for unthrottled.
+    - n_counties (int): Counties per state in synthetic county-level responses.
+    - host (str), port (int): Listening address; port 0 picks a free port.
+    - verbose (bool): Log every request.
+
+    Returns:
+    - server (ThreadingHTTPServer): Running server; server.url is its root URL and server.requests lists the
+      paths requested so far. Call server.shutdown() to stop.
+    """
+    server = ThreadingHTTPServer((host, port), QuickStatsHandler)
+    server.daemon_threads = True
+    server.fixture_dir = fixture_dir
+    server.synthetic = synthetic
+    server.latency = latency
+    server.throughput = throughput
+    server.n_counties = n_counties
+    server.verbose = verbose
+    server.requests = []
+    server.url = f'http://{host}:{server.server_port}'
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Local stand-in for the QuickStats API and validation endpoint')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--fixtures', help='directory of recorded responses')
+    parser.add_argument('--no-synthetic', action='store_true', help='answer 404 when no fixture matches')
+    parser.add_argument('--latency', type=float, default=0.0, help='seconds before each response')
+    parser.add_argument('--throughput', type=float, help='bytes per second per response')
+    parser.add_argument('--counties', type=int, default=99, help='counties per state in synthetic data')
+    args = parser.parse_args()
+
+    server = start_server(args.fixtures, not args.no_synthetic, args.latency, args.throughput, args.counties,
+                          args.host, args.port, verbose=True)
+    print(f'QuickStats stand-in listening on {server.url} (QUICKSTATS_BASE_URL={server.url}/api, VALIDATION_BASE_URL={server.url})')
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        server.shutdown()
+        sys.exit(0)
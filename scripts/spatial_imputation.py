@@ -0,0 +1,224 @@
+import os
+import hashlib
+import functools
+import numpy as np
+import pandas as pd
+import scipy.sparse as sp
+
+current_file_path = os.path.abspath(__file__)
+current_directory = os.path.dirname(current_file_path)
+os.chdir(current_directory)
+from gap_filling import panel_matrix
+
+"""
+Spatial imputation of disclosure-suppressed ("(D)") county values from neighbouring counties.
+
+A sparse county adjacency matrix is built once from the county polygons and cached on disk, keyed on the
+shapefile's path, size and modification time. Suppressed cells of all variables and years are then filled
+together: each is repeatedly set to the mean of its neighbours' current values, known cells held fixed,
+until the largest change is below a tolerance (a Jacobi iteration for the harmonic fill).
+"""
+
+COUNTIES_SHAPEFILE = os.path.join(current_directory, '../datasets/Iowa Counties/IowaCounties.shp')
+
+# Adjacency cache (override with ADJACENCY_CACHE_DIR)
+ADJACENCY_CACHE_DIR = os.getenv('ADJACENCY_CACHE_DIR', os.path.join(current_directory, '../datasets/adjacency_cache'))
+
+def county_key(names):
+    """
+    Normalize county names to the NASS spelling (upper case, 'Obrien' -> 'O BRIEN'), as in caopeiyu_nrate.nrate.
+
+    Parameters:
+    - names (Series): County names.
+
+    Returns:
+    - names (Series): Normalized names.
+    """
+    return pd.Series(names).replace('Obrien', 'O BRIEN').str.upper().str.strip()
+
+def build_adjacency(path=COUNTIES_SHAPEFILE, name_column='CountyName'):
+    """
+    Build the county adjacency matrix from polygons; counties sharing a boundary or a corner are neighbours.
+
+    Parameters:
+    - path (str): Polygon file readable by geopandas.
+    - name_column (str): Column with the county names.
+
+    Returns:
+    - names (ndarray): Normalized county names, in matrix order.
+    - adjacency (csr_matrix): Symmetric 0/1 matrix of neighbouring counties.
+    """
+    import geopandas as gpd
+
+    counties = gpd.read_file(path)
+    # The spatial index keeps this O(n log n), so it stays cheap beyond a single state
+    left, right = counties.sindex.query(counties.geometry, predicate='touches')
+    adjacency = sp.csr_matrix((np.ones(len(left)), (left, right)), shape=(len(counties), len(counties)))
+    adjacency.data[:] = 1
+    return county_key(counties[name_column]).to_numpy(dtype=str), adjacency
+
+@functools.lru_cache(maxsize=None)
+def load_adjacency(path=COUNTIES_SHAPEFILE, cache_dir=ADJACENCY_CACHE_DIR):
+    """
+    County adjacency matrix of path, read from the cache when the polygons have not changed since it was built.
+
+    Parameters:
+    - path (str): Polygon file readable by geopandas.
+    - cache_dir (str): Cache directory, None disables the on-disk cache.
+
+    Returns:
+    - names (ndarray): Normalized county names, in matrix order.
+    - adjacency (csr_matrix): Symmetric 0/1 matrix of neighbouring counties.
+    """
+    if cache_dir is None:
+        return build_adjacency(path)
+
+    stat = os.stat(path)
+    key = f'{os.path.abspath(path)}|{stat.st_size}|{stat.st_mtime_ns}'
+    cache_path = os.path.join(cache_dir, f'adjacency_{hashlib.sha256(key.encode("utf-8")).hexdigest()[:16]}.npz')
+    if os.path.exists(cache_path):
+        with np.load(cache_path) as cached:
+            adjacency = sp.csr_matrix((cached['data'], cached['indices'], cached['indptr']), shape=tuple(cached['shape']))
+            return cached['names'], adjacency
+
+    names, adjacency = build_adjacency(path)
+    os.makedirs(cache_dir, exist_ok=True)
+    # Write to a temporary name first so a concurrent run never reads a partial file
+    tmp_path = f'{cache_path}.{os.getpid()}.tmp.npz'
+    np.savez(tmp_path, names=names, data=adjacency.data, indices=adjacency.indices, indptr=adjacency.indptr,
+             shape=np.array(adjacency.shape))
+    os.replace(tmp_path, cache_path)
+    return names, adjacency
+
+def suppressed_cells(df, columns, time_column='Year'):
+    """
+    Mark the cells treated as suppressed: missing for a county in a year where other counties report the variable.
+
+    Suppression codes are turned into NaN when the QuickStats tables are parsed, so they are recognised from
+    the pattern they leave in the expand_df panel; years with no county data at all are left to the time
+    series gap filling.
+
+    Parameters:
+    - df (DataFrame): County x year panel.
+    - columns (list): Value columns.
+    - time_column (str): Year column.
+
+    Returns:
+    - suppressed (DataFrame): Boolean frame with columns, aligned with df.
+    """
+    missing = df[columns].isna()
+    reported = (~missing).groupby(df[time_column]).transform('any')
+    return missing & reported
+
+def impute_spatial(values, unknown, adjacency, tol=1e-6, max_iter=500):
+    """
+    Fill unknown cells with the mean of their neighbours' values, iterated to convergence.
+
+    The neighbour pairs between unknown cells (same column, adjacent counties) form a sparse matrix built once,
+    and the known neighbours of every unknown cell are summed once, so an iteration is one sparse product over
+    the unknown cells only, whatever the number of columns (e.g. every variable and year). Cells with no path
+    to a known value through unknown neighbours stay NaN.
+
+    Parameters:
+    - values (ndarray): Values of shape (n_counties, n_columns); unknown cells are ignored.
+    - unknown (ndarray): Boolean array of the cells to impute, same shape as values.
+    - adjacency (csr_matrix): County adjacency matrix (n_counties x n_counties).
+    - tol (float): Largest change, relative to the largest known value of the column, at which to stop.
+    - max_iter (int): Maximum number of iterations.
+
+    Returns:
+    - imputed (ndarray): Copy of values with the unknown cells filled.
+    - n_iter (int): Iterations run.
+    """
+    values = np.where(unknown, np.nan, values)
+    rows, cols = np.nonzero(unknown)
+    if not len(rows):
+        return values, 0
+    scale = np.nanmax(np.abs(np.where(np.isnan(values), 0, values)), axis=0)[cols]
+    scale = np.where(scale > 0, scale, 1)
+
+    # Every (unknown cell, neighbouring county) pair
+    adjacency = sp.csr_matrix(adjacency)
+    degree = np.diff(adjacency.indptr)[rows]
+    cell = np.repeat(np.arange(len(rows)), degree)
+    starts = np.repeat(adjacency.indptr[rows], degree)
+    neighbour = adjacency.indices[starts + np.arange(len(cell)) - np.repeat(np.cumsum(degree) - degree, degree)]
+    neighbour_value = values[neighbour, cols[cell]]
+
+    # Known neighbours are constant terms; unknown ones are linked through the matrix
+    cell_id = np.full(values.shape, -1)
+    cell_id[rows, cols] = np.arange(len(rows))
+    neighbour_id = cell_id[neighbour, cols[cell]]
+    known = ~np.isnan(neighbour_value) & (neighbour_id < 0)
+    known_total = np.bincount(cell[known], weights=neighbour_value[known], minlength=len(rows))
+    known_count = np.bincount(cell[known], minlength=len(rows)).astype(float)
+    linked = neighbour_id >= 0
+    links = sp.csr_matrix((np.ones(linked.sum()), (cell[linked], neighbour_id[linked])), shape=(len(rows), len(rows)))
+
+    current = np.full(len(rows), np.nan)
+    n_iter = 0
+    for n_iter in range(1, max_iter + 1):
+        present = ~np.isnan(current)
+        total = known_total + links @ np.where(present, current, 0)
+        count = known_count + links @ present.astype(float)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            update = np.where(count > 0, total / count, np.nan)
+
+        # A cell reached for the first time counts as changed; cells that stay NaN do not
+        changed = np.where(present, np.abs(update - current) > tol * scale, ~np.isnan(update))
+        current = update
+        if not changed.any():
+            break
+    values[rows, cols] = current
+    return values, n_iter
+
+def impute_suppressed(df, columns, path=COUNTIES_SHAPEFILE, cache_dir=ADJACENCY_CACHE_DIR, tol=1e-6, max_iter=500,
+                      row_column='CountyName', time_column='Year'):
+    """
+    Impute the suppressed cells of a county x year panel from neighbouring counties, all variables and years at once.
+
+    Imputed values are rounded like the other filled values of the pipeline. Counties missing from the
+    polygons are left unchanged.
+
+    Parameters:
+    - df (DataFrame): County x year panel as produced by expand_df.
+    - columns (list): Value columns to impute.
+    - path (str): County polygons used for the adjacency matrix.
+    - cache_dir (str): Adjacency cache directory, None disables the on-disk cache.
+    - tol (float): Convergence tolerance of impute_spatial.
+    - max_iter (int): Maximum number of iterations of impute_spatial.
+    - row_column (str): County column.
+    - time_column (str): Year column.
+
+    Returns:
+    - df (DataFrame): Copy of df with the suppressed cells imputed.
+    - imputed (DataFrame): Boolean frame with columns marking the imputed cells, aligned with df.
+    """
+    columns = list(columns)
+    df = df.copy()
+    names, adjacency = load_adjacency(path, cache_dir)
+    suppressed = suppressed_cells(df, columns, time_column)
+
+    matrices, times, (row_codes, time_codes) = panel_matrix(df, columns, row_column, time_column)
+    counties = pd.unique(df[row_column])
+    position = pd.Index(names).get_indexer(county_key(counties))
+    mapped = position >= 0
+
+    # Lay the panel out as counties x (variables * years) on the adjacency's county order
+    values = np.full((len(names), len(columns) * len(times)), np.nan)
+    values[position[mapped]] = matrices.transpose(1, 0, 2).reshape(len(counties), -1)[mapped]
+    unknown = np.zeros(values.shape, dtype=bool)
+    unknown_panel = np.zeros(matrices.shape, dtype=bool)
+    unknown_panel[:, row_codes, time_codes] = suppressed.to_numpy().T
+    unknown[position[mapped]] = unknown_panel.transpose(1, 0, 2).reshape(len(counties), -1)[mapped]
+
+    filled, _ = impute_spatial(values, unknown, adjacency, tol, max_iter)
+    filled = np.round(filled)
+
+    # Back to the rows of df
+    county_rows = np.where(mapped, position, 0)[row_codes]
+    offsets = np.arange(len(columns)) * len(times)
+    new_values = filled[county_rows[:, None], offsets + time_codes[:, None]]
+    imputed = suppressed.to_numpy() & mapped[row_codes][:, None] & ~np.isnan(new_values)
+    df[columns] = np.where(imputed, new_values, df[columns].to_numpy(dtype=float))
+    return df, pd.DataFrame(imputed, index=df.index, columns=columns)
@@ -1,6 +1,53 @@
 import pandas as pd
 import numpy as np
-from scipy.interpolate import interp1d
+from gap_filling import fill_panel, ffill_rows
+from Ns_functions import load_coefficients, manure_n, round_like_python
+
+# Livestock structure assumptions splitting the NASS categories into the manure groups of Ns_functions
+LIVESTOCK_RATIOS = {
+    'bulls_per_beef_cow': 0.05,  # bulls = beef cows * ratio
+    'dairy_150_share': 1 / 2,    # share of the dairy calves in dairy_150; dairy_400 gets the rest
+    'fin_cattle_divisor': 3,     # finishing cattle = (steers + on-feed sold) / divisor
+    'hogs_fin_divisor': 3,       # finishing hogs = (hogs + hogs sold) / divisor
+    'hogs_sow_divisor': 21,      # sows = breeding hogs / divisor; boars are the other breeding hogs
+}
+
+def cattle_identity(ratios=LIVESTOCK_RATIOS):
+    """
+    All cattle include the beef cows, milk cows, bulls and steers: (total column, {part column: weight}).
+    """
+    return ('cattle', {'beef': 1 + ratios['bulls_per_beef_cow'], 'milk': 1, 'steers': 1})
+
+CATTLE_IDENTITY = cattle_identity()
+
+def livestock_structure(get, ratios=LIVESTOCK_RATIOS):
+    """
+    Derive the manure animal groups from the NASS categories.
+
+    Works on a DataFrame's columns or on arrays alike; with arrays of ratios shaped (combinations, 1) and
+    columns shaped (cells,), every combination is derived at once by broadcasting.
+
+    Parameters:
+    - get (callable): Returns the values of a column (beef, milk, cattle, steers, onfeed_sold, hogs, hogs_sales, hogs_breeding).
+    - ratios (dict): Livestock structure ratios, see LIVESTOCK_RATIOS.
+
+    Returns:
+    - groups (dict): bulls, calves, beef_heifers, dairy_150, dairy_400, fin_cattle, hogs_fin, hogs_sow and hogs_boars.
+    """
+    beef, milk = get('beef'), get('milk')
+    groups = {}
+    groups['bulls'] = np.round(beef * ratios['bulls_per_beef_cow'])
+    groups['calves'] = np.round(get('cattle') - (beef + milk + groups['bulls'] + get('steers')))
+    groups['beef_heifers'] = np.round(groups['calves'] * beef / (beef + milk))
+    groups['dairy_150'] = np.round(ratios['dairy_150_share'] * groups['calves'] * milk / (beef + milk))
+    groups['dairy_400'] = np.round((1 - ratios['dairy_150_share']) * groups['calves'] * milk / (beef + milk))
+    groups['fin_cattle'] = np.round((get('steers') + get('onfeed_sold')) / ratios['fin_cattle_divisor'])
+
+    # Hog populations
+    groups['hogs_fin'] = np.round((get('hogs') + get('hogs_sales')) / ratios['hogs_fin_divisor'])
+    groups['hogs_sow'] = np.round(get('hogs_breeding') / ratios['hogs_sow_divisor'])
+    groups['hogs_boars'] = np.round(get('hogs_breeding') - groups['hogs_sow'])
+    return groups
 
 def expand_df(df, validation_df):
     """
@@ -19,18 +66,17 @@ def expand_df(df, validation_df):
     # Create a list of years from the minimum to the maximum year in the validation DataFrame
     years = list(range(validation_df['Year'].min(), validation_df['Year'].max() + 1))
 
-    # Create an empty DataFrame to store the expanded data
-    expanded_df = pd.DataFrame(columns=df.columns)
+    # Full county x year grid, minus the combinations already in the original DataFrame
+    grid = pd.MultiIndex.from_product([counties, years], names=['CountyName', 'Year'])
+    missing = grid[~grid.isin(pd.MultiIndex.from_frame(df[['CountyName', 'Year']]))]
 
-    # Iterate through each county and year, and add rows to the expanded DataFrame
-    for county in counties:
-        for year in years:
-            # Check if the county and year combination already exists in the original DataFrame
-            if not ((df['CountyName'] == county) & (df['Year'] == year)).any():
-                # Create a new row with NaN values for all columns
-                new_row = pd.DataFrame([[county, year] + [pd.NA] * (len(df.columns) - 2)], columns=df.columns)
-                # Append the new row to the expanded DataFrame
-                expanded_df = pd.concat([expanded_df, new_row], ignore_index=True)
+    # One row per missing combination, NaN elsewhere. Value columns get the dtype they end up with in the
+    # concatenation (float for integer columns), so no all-NA column takes part in picking the result dtype
+    index = range(len(missing))
+    expanded_df = pd.DataFrame({column: pd.Series(np.nan, index=index, dtype=df[column].dtype if df[column].dtype.kind in 'fO' else float)
+                                for column in df.columns})
+    expanded_df['CountyName'] = pd.Series(missing.get_level_values('CountyName'), dtype=object)
+    expanded_df['Year'] = pd.Series(missing.get_level_values('Year'), dtype=object)
 
     # Concatenate the original DataFrame and the expanded DataFrame
     new_df = pd.concat([df, expanded_df], ignore_index=True)
@@ -38,10 +84,10 @@ def expand_df(df, validation_df):
     # Sort the DataFrame by CountyName and Year
     new_df = new_df.sort_values(['CountyName', 'Year']).reset_index(drop=True)
 
-    # Fill any remaining NaN values with appropriate default values
-    new_df = new_df.fillna({'hogs': np.nan, 'hogs_sales': np.nan, 'hogs_breeding': np.nan, 'beef': np.nan, 'milk': np.nan,
-                            'cattle': np.nan, 'steers': np.nan, 'onfeed_sold': np.nan, 'corng_y': np.nan, 'corng_pa': np.nan, 
-                            'corng_ha': np.nan, 'soy_y': np.nan, 'soy_pa': np.nan, 'soy_ha': np.nan})
+    # Missing values are already NaN; object value columns are converted to numbers, as fillna(np.nan) used to
+    value_columns = [column for column in ['hogs', 'hogs_sales', 'hogs_breeding', 'beef', 'milk', 'cattle', 'steers', 'onfeed_sold',
+                                           'corng_y', 'corng_pa', 'corng_ha', 'soy_y', 'soy_pa', 'soy_ha'] if column in new_df.columns]
+    new_df[value_columns] = new_df[value_columns].infer_objects()
     
     # Drop duplicate rows if 'corng_y' is in the columns
     if 'corng_y' in new_df.columns:
@@ -52,57 +98,228 @@ def expand_df(df, validation_df):
 
     return new_df      
 
-def refine_animal_data(animal_df, animal_val):
+def reconcile_proportional(df, val_df, columns, interpolated, year_column='Year'):
+    """
+    Allocate the part of each state total not explained by known county values to the interpolated counties.
+
+    For every year and column, remaining = max(0, state total - sum of the non-interpolated values) is
+    shared among the interpolated entries in proportion to their interpolated values, or equally when
+    those sum to zero, and rounded to whole animals (half to even, like round()). Years whose state
+    total is missing or absent from val_df are left unchanged. All years and columns are handled in
+    one set of grouped array operations.
+
+    Parameters:
+    - df (DataFrame): County data with year_column and the value columns, gaps already interpolated.
+    - val_df (DataFrame): State totals with year_column and the same value columns.
+    - columns (list): Value columns to reconcile.
+    - interpolated (ndarray): Boolean matrix (rows of df x columns) marking the interpolated entries.
+    - year_column (str): Name of the year column in both frames.
+
+    Returns:
+    - values (ndarray): Reconciled values (rows of df x columns).
+    """
+    values = df[columns].to_numpy(dtype=float)
+    interpolated = np.asarray(interpolated, dtype=bool)
+    year_codes, state = _year_totals(df, val_df, columns, year_column)
+    rows, cols = _allocate_totals(values, interpolated, year_codes, state)
+    values[rows, cols] = np.round(values[rows, cols])
+    return values
+
+def _year_totals(df, val_df, columns, year_column='Year'):
+    """
+    Year code of every row of df and the state totals (years x columns) they point to, NaN where missing.
+    """
+    year_codes, years = pd.factorize(df[year_column])
+    state = val_df.drop_duplicates(year_column).set_index(year_column)[columns].reindex(years).to_numpy(dtype=float)
+    return year_codes, state
+
+def _allocate_totals(values, interpolated, year_codes, state):
+    """
+    Share max(0, state total - known values) of every year and column among its interpolated entries, in place.
+
+    Entries are shared in proportion to their current values, or equally when those sum to zero.
+
+    Returns:
+    - rows, cols (ndarray): Positions of the entries that were set.
+    """
+    n_columns = values.shape[1]
+
+    # One group per (year, column)
+    groups = year_codes[:, None] * n_columns + np.arange(n_columns)
+    n_groups = state.size
+    state = state.ravel()
+
+    known_total = np.bincount(groups.ravel(), weights=np.nan_to_num(values).ravel(), minlength=n_groups)
+    interpolated_total = np.bincount(groups[interpolated], weights=values[interpolated], minlength=n_groups)
+    interpolated_count = np.bincount(groups[interpolated], minlength=n_groups)
+
+    remaining = state - (known_total - interpolated_total)
+    remaining = np.where(remaining > 0, remaining, 0)
+
+    rows, cols = np.nonzero(interpolated & ~np.isnan(state)[groups])
+    group = groups[rows, cols]
+    total = interpolated_total[group]
+    with np.errstate(divide='ignore', invalid='ignore'):
+        share = np.where(total == 0,
+                         remaining[group] / interpolated_count[group],
+                         remaining[group] * (values[rows, cols] / total))
+    values[rows, cols] = share
+    return rows, cols
+
+def _enforce_identity(values, adjustable, total, parts, weights):
+    """
+    Make values[:, total] >= sum of weights * values[:, parts] in every row, moving only adjustable entries, in place.
+
+    When both sides can move, the total is scaled up by f and the adjustable parts down by f, with f chosen
+    so the two meet; otherwise the side that can move is set to meet the other.
+    """
+    weights = np.asarray(weights, dtype=float)
+    total_value = values[:, total]
+    part_values = values[:, parts] * weights
+    part_adjustable = adjustable[:, parts]
+    fixed_sum = np.where(part_adjustable, 0, part_values).sum(axis=1)
+    free_sum = np.where(part_adjustable, part_values, 0).sum(axis=1)
+    violated = total_value < fixed_sum + free_sum
+
+    total_free = adjustable[:, total]
+    with np.errstate(divide='ignore', invalid='ignore'):
+        # Both sides: total * f = fixed + free / f
+        f = (fixed_sum + np.sqrt(fixed_sum ** 2 + 4 * total_value * free_sum)) / (2 * total_value)
+        both = violated & total_free & (free_sum > 0) & (total_value > 0)
+        new_total = np.where(both, total_value * f, total_value)
+        part_scale = np.where(both, 1 / f, 1)
+
+        # Only the total can move (or it is zero): raise it to the parts
+        raise_total = violated & total_free & ~both
+        new_total = np.where(raise_total, fixed_sum + free_sum, new_total)
+
+        # Only the parts can move: shrink them to what the total leaves
+        shrink = violated & ~total_free & (free_sum > 0)
+        part_scale = np.where(shrink, np.maximum(total_value - fixed_sum, 0) / free_sum, part_scale)
+
+    values[:, total] = new_total
+    values[:, parts] = np.where(part_adjustable, values[:, parts] * part_scale[:, None], values[:, parts])
+
+def _identity_gap(values, total, parts, weights):
+    """
+    Shortfall max(0, weighted parts - total) of every row.
+    """
+    gap = values[:, parts] @ np.asarray(weights, dtype=float) - values[:, total]
+    return np.where(gap > 0, gap, 0)
+
+def reconcile_ipf(df, val_df, columns, interpolated, identity=None, year_column='Year', max_iter=100, tol=1e-6):
+    """
+    Fit the interpolated entries of all columns jointly to the state totals and to a within-county identity
+    by iterative proportional fitting (raking).
+
+    Each iteration shares the state totals among the interpolated entries as reconcile_proportional does,
+    then restores total >= weighted sum of parts in every county-year by scaling the interpolated entries
+    on either side. Known values are never changed. Iterations stop when the state totals are met to tol
+    (relative) and no county-year breaks the identity by more than tol (relative to the total), and the
+    result is rounded to whole animals like reconcile_proportional.
+
+    Parameters:
+    - df (DataFrame): County data with year_column and the value columns, gaps already interpolated.
+    - val_df (DataFrame): State totals with year_column and the same value columns.
+    - columns (list): Value columns to reconcile.
+    - interpolated (ndarray): Boolean matrix (rows of df x columns) marking the interpolated entries.
+    - identity (tuple): (total column, {part column: weight}); None fits the state totals only.
+    - year_column (str): Name of the year column in both frames.
+    - max_iter (int): Maximum number of raking iterations.
+    - tol (float): Relative tolerance on the state totals and the identity.
+
+    Returns:
+    - values (ndarray): Reconciled values (rows of df x columns).
+    - diagnostics (dict): iterations, converged, max_total_error (relative gap to the attainable state totals),
+      identity_violations (county-years still breaking the identity after rounding) and max_identity_gap.
+    """
+    values = df[columns].to_numpy(dtype=float)
+    interpolated = np.asarray(interpolated, dtype=bool)
+    year_codes, state = _year_totals(df, val_df, columns, year_column)
+    n_columns = len(columns)
+    groups = year_codes[:, None] * n_columns + np.arange(n_columns)
+
+    # Totals cannot go below the known values, which are kept
+    known_total = np.bincount(groups[~interpolated], weights=np.nan_to_num(values[~interpolated]), minlength=state.size)
+    target = np.maximum(state.ravel(), known_total)
+    checked = ~np.isnan(state.ravel()) & (np.bincount(groups[interpolated], minlength=state.size) > 0)
+
+    if identity is not None:
+        total_column, part_weights = identity
+        total = columns.index(total_column)
+        parts = [columns.index(part) for part in part_weights]
+        weights = list(part_weights.values())
+
+    converged, iterations, total_error = False, 0, 0.0
+    for iterations in range(1, max_iter + 1):
+        _allocate_totals(values, interpolated, year_codes, state)
+        if identity is None:
+            converged = True
+            break
+        _enforce_identity(values, interpolated, total, parts, weights)
+
+        fitted = np.bincount(groups.ravel(), weights=np.nan_to_num(values).ravel(), minlength=state.size)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            total_error = np.max(np.abs(fitted - target)[checked] / np.maximum(target[checked], 1), initial=0)
+            identity_error = np.nanmax(_identity_gap(values, total, parts, weights) / np.maximum(values[:, total], 1), initial=0)
+        if total_error <= tol and identity_error <= tol:
+            converged = True
+            break
+
+    unrounded = values.copy()
+    values[interpolated] = np.round(values[interpolated])
+    diagnostics = {'iterations': iterations, 'converged': converged, 'max_total_error': float(total_error),
+                   'identity_violations': 0, 'max_identity_gap': 0.0}
+    if identity is not None:
+        # Rounding can leave a total an animal short of its parts: lift an adjustable total, else round the parts down
+        parts_sum = values[:, parts] @ np.asarray(weights, dtype=float)
+        short = values[:, total] < parts_sum
+        lift = short & interpolated[:, total]
+        values[lift, total] = np.ceil(parts_sum[lift])
+        lower = (short & ~interpolated[:, total])[:, None] & interpolated[:, parts]
+        values[:, parts] = np.where(lower, np.floor(unrounded[:, parts]), values[:, parts])
+        gap = _identity_gap(values, total, parts, weights)
+        diagnostics['identity_violations'] = int((gap > 0).sum())
+        diagnostics['max_identity_gap'] = float(np.nanmax(gap, initial=0))
+    return values, diagnostics
+
+def refine_animal_data(animal_df, animal_val, methods='linear', imputed=None, reconcile='proportional', ratios=None):
     """
     Refine animal population data by interpolating missing values and proportionally distributing known values.
 
     Parameters:
     - animal_df (DataFrame): DataFrame containing animal population data.
     - animal_val (DataFrame): DataFrame containing validation data for animal populations.
+    - methods (str or dict): Gap-filling method of gap_filling.fill_gaps ('linear', 'pchip', 'spline', 'nearest'),
+      or a dict giving one per animal type.
+    - imputed (DataFrame): Boolean frame marking cells already estimated, e.g. by spatial_imputation.impute_suppressed;
+      they are reconciled with the state totals like interpolated values.
+    - reconcile (str): 'proportional' fits each animal type to its state totals independently (reconcile_proportional);
+      'ipf' fits all types jointly to the state totals and to CATTLE_IDENTITY (reconcile_ipf), so calves are never
+      negative where it can be avoided, and stores the convergence diagnostics in animal_nloss.attrs['ipf'].
+    - ratios (dict): Livestock structure ratios overriding entries of LIVESTOCK_RATIOS.
 
     Returns:
-    - animal_nloss (DataFrame): Refined animal population DataFrame.
+    - animal_nloss (DataFrame): Refined animal population DataFrame. animal_nloss.attrs['interpolated'] gives, for each
+      animal type and each group derived from them, the index labels of its interpolated or imputed cells.
     """
     animal_nloss = animal_df.copy()
     animal_val_nloss = animal_val.copy()
+    ratios = {**LIVESTOCK_RATIOS, **(ratios or {})}
+    cattle_total, cattle_parts = cattle_identity(ratios)
 
-    # Function to distribute population among all counties proportionally
-    def distribute_population_proportionally(remaining_population, counties_population):
-        if not counties_population:  # Check if counties_population is empty
-            return []
-        
-        total_known_population = sum(counties_population)
-        if total_known_population == 0:
-            equal_distribution = remaining_population / len(counties_population)
-            return [round(equal_distribution)] * len(counties_population)
-        else:
-            proportions = [pop / total_known_population for pop in counties_population]
-            distributed_population = [remaining_population * proportion for proportion in proportions]
-            return [round(pop) for pop in distributed_population]
-    
-    # Function to correct values in animal population data
-    def correct_values(animal_type, df, val_df, interpolated_indices):
-        for year in df['Year'].unique():
-            interpolated_population = df.loc[(df['Year'] == year) & df.index.isin(interpolated_indices), animal_type].tolist()
-            total_interpolated_population = sum(interpolated_population)
-            state_population = val_df.loc[val_df['Year'] == year, animal_type].values[0]
-            total_known_population = df.loc[df['Year'] == year, animal_type].sum()
-
-            if not np.isnan(state_population):
-                remaining_population = max(0, state_population - (total_known_population - total_interpolated_population))
-                corrected_population = distribute_population_proportionally(remaining_population, interpolated_population)
-                df.loc[(df['Year'] == year) & df.index.isin(interpolated_indices), animal_type] = corrected_population
-    
-    # Function to apply linear interpolation to specific columns
+    # Function to interpolate specific columns within each county, all counties and columns at once
     def apply_interpolation(df, columns):
-        interpolated_indices = {}
-        for column in columns:
-            # Record indices of NaN values before interpolation
-            interpolated_indices[column] = df[df[column].isna()].index.tolist()
-            
-            df[column] = df.groupby('CountyName')[column].transform(lambda x: x.interpolate().round())
-            df[column].fillna(method='ffill', inplace=True)
-            df[column].fillna(method='bfill', inplace=True)
+        columns = sorted(columns)
+        # Record indices of NaN values before interpolation
+        estimated = df[columns].isna()
+        if imputed is not None:
+            estimated |= imputed.reindex(index=df.index, columns=columns, fill_value=False)
+        interpolated_indices = {column: df.index[estimated[column]].tolist() for column in columns}
+
+        # Gaps after the last known year of a county repeat it; leading gaps are left to the fills below
+        df[columns] = np.round(fill_panel(df, columns, method=methods, extrapolate='forward'))
+        df[columns] = df[columns].ffill().bfill()
         return interpolated_indices
 
     common_animal_types = set(animal_nloss.columns) & set(animal_val_nloss.columns) - {'Year', 'CountyName'}
@@ -110,67 +327,104 @@ def refine_animal_data(animal_df, animal_val):
     # Apply linear interpolation first
     interpolated_indices = apply_interpolation(animal_nloss, common_animal_types)
 
-    # Correct only interpolated values with proportional allocation
-    for animal_type in common_animal_types:
-        correct_values(animal_type, animal_nloss, animal_val_nloss, interpolated_indices[animal_type])
-
-    # Additional calculations for animal populations
-    animal_nloss['bulls'] = round(animal_nloss['beef'] * 0.05)
-    animal_nloss['calves'] = round(animal_nloss['cattle'] - (animal_nloss['beef'] + animal_nloss['milk'] + animal_nloss['bulls'] + animal_nloss['steers']))
-    animal_nloss['beef_heifers'] = round(animal_nloss['calves'] * animal_nloss['beef'] / (animal_nloss['beef'] + animal_nloss['milk']))
-    animal_nloss['dairy_150'] = round((1 / 2) * animal_nloss['calves'] * animal_nloss['milk'] / (animal_nloss['beef'] + animal_nloss['milk']))
-    animal_nloss['dairy_400'] = round((1 / 2) * animal_nloss['calves'] * animal_nloss['milk'] / (animal_nloss['beef'] + animal_nloss['milk']))
-    animal_nloss['fin_cattle'] = round((animal_nloss['steers'] + animal_nloss['onfeed_sold']) / 3)
-    
-    # Additional calculations for hog populations
-    animal_nloss['hogs_fin'] = round((animal_nloss['hogs'] + animal_nloss['hogs_sales']) / 3)
-    animal_nloss['hogs_sow'] = round(animal_nloss['hogs_breeding'] / 21)
-    animal_nloss['hogs_boars'] = round(animal_nloss['hogs_breeding'] - animal_nloss['hogs_sow'])
+    common_animal_types = sorted(common_animal_types)
+    if reconcile == 'ipf':
+        # Fit all types jointly; types without interpolated values still constrain the identity
+        interpolated = np.column_stack([animal_nloss.index.isin(interpolated_indices[animal_type]) for animal_type in common_animal_types])
+        identity = (cattle_total, cattle_parts) if {cattle_total, *cattle_parts} <= set(common_animal_types) else None
+        values, diagnostics = reconcile_ipf(animal_nloss, animal_val_nloss, common_animal_types, interpolated, identity)
+        animal_nloss[common_animal_types] = values
+        animal_nloss.attrs['ipf'] = diagnostics
+    elif reconcile == 'proportional':
+        # Correct only interpolated values with proportional allocation
+        common_animal_types = [animal_type for animal_type in common_animal_types if interpolated_indices[animal_type]]
+        if common_animal_types:
+            interpolated = np.column_stack([animal_nloss.index.isin(interpolated_indices[animal_type]) for animal_type in common_animal_types])
+            animal_nloss[common_animal_types] = reconcile_proportional(animal_nloss, animal_val_nloss, common_animal_types, interpolated)
+    else:
+        raise ValueError(f'Unknown reconciliation {reconcile!r}, expected proportional or ipf')
+
+    # Additional calculations for animal and hog populations
+    for group, values in livestock_structure(animal_nloss.__getitem__, ratios).items():
+        animal_nloss[group] = values
+
+    # A derived group is estimated where any population it is computed from is, which livestock_structure itself
+    # finds when estimated cells are NaN
+    trace = lambda name: (np.where(animal_nloss.index.isin(interpolated_indices[name]), np.nan, 1.0)
+                          if name in interpolated_indices else np.ones(len(animal_nloss)))
+    for group, values in livestock_structure(trace, ratios).items():
+        interpolated_indices[group] = animal_nloss.index[np.isnan(values)].tolist()
+    animal_nloss.attrs['interpolated'] = interpolated_indices
 
     return animal_nloss
 
-def interpolation(ifews_df):
+def interpolation(ifews_df, methods='linear'):
     """
-    Interpolate missing data in the given DataFrame using linear interpolation.
+    Interpolate missing data in the given DataFrame, linearly by default.
 
     Parameters:
     - ifews_df (DataFrame): DataFrame containing data to be interpolated.
+    - methods (str or dict): Gap-filling method of gap_filling.fill_gaps ('linear', 'pchip', 'spline', 'nearest'),
+      or a dict giving one per crop column. Gaps outside the known years are always extrapolated linearly.
 
     Returns:
     - df (DataFrame): DataFrame with interpolated data.
     """
     df = ifews_df.copy()
-    county_names = df['CountyName'].unique()
     pop_names = ["corng_y", "corng_pa", "corng_ha", "soy_y", "soy_pa", "soy_ha"]
-        
-    # Loop through county names and populate data
-    for county_name in county_names:
-        for name in pop_names:
-            k = pop_names.copy()
-            k.remove(name)
 
-            # Filter the DataFrame for the specific county and population
-            county_df = df[(df['CountyName'] == county_name) & (df[name].notna())]
+    # Interpolate all counties and populations at once on county x year matrices; only filled gaps are rounded
+    known = df[pop_names].notna().to_numpy()
+    values = np.where(known, df[pop_names].to_numpy(dtype=float), np.round(fill_panel(df, pop_names, method=methods)))
 
-            # Extract x and y values
-            x = county_df['Year'].astype(float).to_numpy()
-            y = county_df[name].astype(float).to_numpy()
+    # Replace negative values with zero, then forward fill zeros with the last previous value (down the whole column)
+    values = np.where(values < 0, 0, values)
+    df[pop_names] = ffill_rows(np.where(values == 0, np.nan, values))
 
-            # Extract xnew values
-            xnew = df[(df['CountyName'] == county_name) & (df[name].isna())]['Year'].astype(float).to_numpy()
+    # Same treatment for the remaining columns
+    others = df.columns.drop(pop_names)
+    for col in others:
+        if pd.api.types.is_numeric_dtype(df[col]):
+            df[col] = df[col].mask(df[col] < 0, 0)
+    # Object columns from expand_df (e.g. Year) are converted first; ffill would otherwise downcast them itself
+    df[others] = df[others].apply(lambda x: x.infer_objects().mask(x == 0).ffill())
+    
+    return df
 
-            f = interp1d(x, y, kind='linear', fill_value="extrapolate")
-            ynew = f(xnew)
+def sweep_livestock_ratios(df, grid, coefficients=None, chunk_size=256):
+    """
+    Manure N of every county-year under many combinations of the livestock structure ratios.
 
-            # Update the DataFrame with interpolated values
-            df.loc[(df['CountyName'] == county_name) & (df[name].isna()), name] = np.round(ynew)
+    Each chunk of combinations is derived at once by broadcasting the ratios over the county-year columns and
+    fed to the manure N formula of Ns_functions, so thousands of combinations take seconds. The combination
+    equal to LIVESTOCK_RATIOS gives the MN of Ns_functions.calculate_n_budget on refine_animal_data's output.
 
-    # Replace negative values with zero in the entire DataFrame
-    for col in df.columns:
-        if pd.api.types.is_numeric_dtype(df[col]):
-            df[col] = df[col].apply(lambda x: 0 if x < 0 else x)
+    Parameters:
+    - df (DataFrame): Refined table with the NASS animal categories and the soy_pa and corng_pa columns.
+    - grid (dict or DataFrame): Ratio name -> values, swept as their full cartesian product; or one row per
+      combination. Ratios left out keep their LIVESTOCK_RATIOS value.
+    - coefficients (Series): Coefficients from Ns_functions.load_coefficients; the default version when None.
+    - chunk_size (int): Combinations evaluated together; bounds memory.
 
-    # Forward fill consecutive zeros with the last previous value
-    df = df.apply(lambda x: x.mask(x == 0).ffill())
-    
-    return df
\ No newline at end of file
+    Returns:
+    - combinations (DataFrame): One row per combination with every ratio.
+    - manure (DataFrame): MN in kg/ha, rows of df x combinations (columns numbered like combinations).
+    """
+    coefficients = load_coefficients() if coefficients is None else coefficients
+    if isinstance(grid, dict):
+        grid = pd.MultiIndex.from_product(list(grid.values()), names=list(grid)).to_frame(index=False)
+    unknown = set(grid.columns) - set(LIVESTOCK_RATIOS)
+    if unknown:
+        raise ValueError(f'Unknown livestock ratios: {sorted(unknown)}')
+    combinations = grid.reindex(columns=list(LIVESTOCK_RATIOS)).fillna(LIVESTOCK_RATIOS).reset_index(drop=True)
+
+    col = lambda name: df[name].to_numpy(dtype=float)
+    manure = np.empty((len(df), len(combinations)))
+    with np.errstate(divide='ignore', invalid='ignore'):
+        for start in range(0, len(combinations), chunk_size):
+            chunk = combinations.iloc[start:start + chunk_size]
+            ratios = {name: chunk[name].to_numpy(dtype=float)[:, None] for name in chunk.columns}
+            groups = livestock_structure(col, ratios)
+            get = lambda name: groups[name] if name in groups else col(name)
+            manure[:, start:start + len(chunk)] = round_like_python(manure_n(get, coefficients)).T
+    return combinations, pd.DataFrame(manure, index=df.index)
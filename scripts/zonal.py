@@ -0,0 +1,238 @@
+import os
+import math
+import time
+import numpy as np
+import scipy.sparse as sp
+import rasterio
+from affine import Affine
+from rasterio import features, windows
+from multiprocessing import shared_memory
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+"""
+Zonal means of polygons (e.g. counties) over many rasters that share a grid.
+
+The zones are rasterized once per raster grid into a sparse (zones x pixels) weight matrix. A pixel either
+belongs to the zone that contains its centre (weight 1, as rasterstats.zonal_stats does by default) or, with
+coverage=True, is weighted by the fraction of its area inside each zone. The mean of every zone in a raster
+is then one sparse matrix-vector product, and a stack of rasters one matrix-matrix product, with no
+intermediate files.
+
+Only the window of each raster that covers the zones is read, widened to whole blocks of a tiled raster, so
+memory and I/O depend on the size of the zones and not on the size of the (e.g. national) raster.
+
+Rasters are independent, so raster_zonal_means can spread them over a process pool. The weights are built
+once in the calling process and handed to the workers through one shared memory block; each task returns
+only the means of one raster.
+
+    weights = zone_weights(counties.to_crs(src.crs).geometry, src.transform, src.shape)
+    means = zonal_means(weights, src.read(1, masked=True))
+"""
+
+# Worker state, set once per process by _init_worker
+_BAND = 1
+_GRIDS = None
+_SHARED = None
+
+def grid_key(src):
+    """
+    Transform, shape and CRS of an open raster; rasters with the same key share their zone weights.
+    """
+    return src.transform, src.shape, src.crs.to_wkt() if src.crs else None
+
+def zone_weights(geometries, transform, shape, coverage=False, supersample=8):
+    """
+    Rasterize zones into a sparse weight matrix.
+
+    Parameters:
+    - geometries (GeoSeries): Zone polygons, in the CRS of the raster grid; zones should not overlap.
+    - transform (Affine): Transform of the raster grid.
+    - shape (tuple): (rows, columns) of the raster grid.
+    - coverage (bool): Weight pixels by the share of their area inside each zone, estimated on a grid
+      supersample times finer, instead of assigning each pixel to the zone containing its centre.
+    - supersample (int): Refinement of the grid used for coverage weights.
+
+    Returns:
+    - weights (csr_matrix): Weights of shape (zones, rows * columns); pixels outside every zone have none.
+    """
+    geometries = list(geometries)
+    factor = supersample if coverage else 1
+    labels = features.rasterize(((geometry, i + 1) for i, geometry in enumerate(geometries)),
+                                out_shape=(shape[0] * factor, shape[1] * factor),
+                                transform=transform * Affine.scale(1 / factor), fill=0, dtype='int32')
+    rows, cols = np.nonzero(labels)
+    # Fine cells are summed into the pixel that contains them
+    pixels = (rows // factor) * shape[1] + cols // factor
+    weights = sp.csr_matrix((np.full(len(rows), 1 / factor ** 2), (labels[rows, cols] - 1, pixels)),
+                            shape=(len(geometries), shape[0] * shape[1]))
+    weights.sum_duplicates()
+    return weights
+
+def zone_window(src, bounds, band=1):
+    """
+    Pixel window of an open raster that covers bounds, clipped to the raster.
+
+    The window is widened to block boundaries along the dimensions where the raster has more than one block
+    (both for tiles, rows for strips), so every block it touches is read whole, once.
+
+    Parameters:
+    - src (DatasetReader): Open raster.
+    - bounds (tuple): (left, bottom, right, top) in the CRS of the raster.
+    - band (int): Band whose block layout is used.
+
+    Returns:
+    - window (Window): Window to read; empty when bounds do not overlap the raster.
+    """
+    (row_start, row_stop), (col_start, col_stop) = windows.from_bounds(*bounds, transform=src.transform).toranges()
+    block_rows, block_cols = src.block_shapes[band - 1]
+    ranges = []
+    for start, stop, block, size in [(row_start, row_stop, block_rows, src.height), (col_start, col_stop, block_cols, src.width)]:
+        start, stop = math.floor(start), math.ceil(stop)
+        if block < size:
+            start, stop = start // block * block, -(-stop // block) * block
+        ranges.append((min(max(start, 0), size), min(max(stop, 0), size)))
+    return windows.Window.from_slices(*ranges)
+
+def zonal_means(weights, values):
+    """
+    Weighted mean of every zone, skipping masked and non-finite pixels.
+
+    Parameters:
+    - weights (csr_matrix): Output of zone_weights.
+    - values (ndarray): One raster (rows, columns) or a stack of rasters (layers, rows, columns) on the grid
+      of weights; masked arrays are accepted.
+
+    Returns:
+    - means (ndarray): Means of shape (zones,) or (layers, zones); NaN for zones without valid pixels.
+    """
+    values = np.ma.filled(np.ma.asarray(values, dtype=float), np.nan)
+    single = values.ndim == 2
+    # Pixels x layers, so that all layers are averaged in one product
+    values = values.reshape(-1, weights.shape[1]).T
+    valid = np.isfinite(values)
+    totals = weights @ np.where(valid, values, 0)
+    counts = weights @ valid.astype(float)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        means = np.where(counts > 0, totals / counts, np.nan).T
+    return means[0] if single else means
+
+def _share_grids(grids):
+    """
+    Copy the weights of every grid into one shared memory block.
+
+    Returns the block and, per grid, its window, weight shape and the (offset, dtype, size) of the data,
+    indices and indptr arrays; None for grids without weights.
+    """
+    layout, offset = [], 0
+    for window, weights in grids:
+        if weights is None:
+            layout.append(None)
+            continue
+        fields = {}
+        for name in ('data', 'indices', 'indptr'):
+            array = getattr(weights, name)
+            fields[name] = (offset, array.dtype.str, array.size)
+            # Keep every array 8-byte aligned
+            offset += -(-array.nbytes // 8) * 8
+        layout.append((window, weights.shape, fields))
+
+    shared = shared_memory.SharedMemory(create=True, size=max(offset, 1))
+    for (_, weights), grid in zip(grids, layout):
+        for name, (start, dtype, size) in (grid[2].items() if grid else []):
+            np.ndarray(size, dtype, buffer=shared.buf, offset=start)[:] = getattr(weights, name)
+    return shared, layout
+
+def _attach_grids(name, layout):
+    """
+    Weights of _share_grids as sparse matrices viewing the shared memory block, without copies.
+    """
+    shared = shared_memory.SharedMemory(name=name)
+    grids = []
+    for grid in layout:
+        if grid is None:
+            grids.append((None, None))
+            continue
+        window, shape, fields = grid
+        arrays = {field: np.ndarray(size, dtype, buffer=shared.buf, offset=start) for field, (start, dtype, size) in fields.items()}
+        grids.append((window, sp.csr_matrix((arrays['data'], arrays['indices'], arrays['indptr']), shape=shape, copy=False)))
+    return shared, grids
+
+def _init_worker(band, grids=None, shared=None):
+    """
+    Worker state: the band to read and the (window, weights) of every grid, given directly or as the
+    (name, layout) of a shared memory block.
+    """
+    global _BAND, _GRIDS, _SHARED
+    _BAND = band
+    if shared is not None:
+        _SHARED, _GRIDS = _attach_grids(*shared)
+    else:
+        _GRIDS = grids
+
+def _raster_means(path, grid):
+    """
+    Zone means of one raster on the grid of the worker, with the seconds taken.
+    """
+    start = time.perf_counter()
+    window, weights = _GRIDS[grid]
+    with rasterio.open(path) as src:
+        data = src.read(_BAND, window=window, masked=True)
+    return zonal_means(weights, data), time.perf_counter() - start
+
+def raster_zonal_means(paths, zones, coverage=False, band=1, max_workers=None, verbose=False):
+    """
+    Means of the zones in each raster; the window and weights are built once for every distinct grid among the
+    rasters, and only that window is read.
+
+    Parameters:
+    - paths (list): Raster files.
+    - zones (GeoDataFrame): Zone polygons, reprojected to the CRS of each grid.
+    - coverage (bool): Fractional pixel coverage weights, see zone_weights.
+    - band (int): Band to read.
+    - max_workers (int): Worker processes; 1 runs in the calling process.
+    - verbose (bool): Print the time taken by each raster as it completes.
+
+    Returns:
+    - means (ndarray): Means of shape (rasters, zones).
+    """
+    # Window and weights of every distinct grid; only the raster headers are read here
+    grid_ids, grids, raster_grids = {}, [], []
+    for path in paths:
+        with rasterio.open(path) as src:
+            key = grid_key(src)
+            if key not in grid_ids:
+                geometries = zones.to_crs(src.crs).geometry if src.crs and zones.crs else zones.geometry
+                window = zone_window(src, geometries.total_bounds, band)
+                # Rasters that do not overlap the zones leave their means NaN
+                overlaps = window.height > 0 and window.width > 0
+                grid_ids[key] = len(grids)
+                grids.append((window, zone_weights(geometries, src.window_transform(window), (window.height, window.width),
+                                                   coverage) if overlaps else None))
+        raster_grids.append(grid_ids[key])
+
+    means = np.full((len(paths), len(zones)), np.nan)
+    todo = [i for i, grid in enumerate(raster_grids) if grids[grid][1] is not None]
+    start = time.perf_counter()
+
+    def collect(results):
+        for done, (i, (values, seconds)) in enumerate(results, 1):
+            means[i] = values
+            if verbose:
+                print(f'{done}/{len(todo)} {os.path.basename(paths[i])}: {seconds:.2f} s', flush=True)
+
+    if max_workers == 1:
+        _init_worker(band, grids)
+        collect((i, _raster_means(paths[i], raster_grids[i])) for i in todo)
+    else:
+        shared, layout = _share_grids(grids)
+        try:
+            with ProcessPoolExecutor(max_workers=max_workers, initializer=_init_worker,
+                                     initargs=(band, None, (shared.name, layout))) as executor:
+                futures = {executor.submit(_raster_means, paths[i], raster_grids[i]): i for i in todo}
+                collect((futures[future], future.result()) for future in as_completed(futures))
+        finally:
+            shared.close()
+            shared.unlink()
+    if verbose:
+        print(f'{len(todo)} rasters in {time.perf_counter() - start:.1f} s')
+    return means